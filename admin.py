@@ -6,6 +6,7 @@ from flask_admin import Admin, AdminIndexView, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
 from werkzeug.utils import secure_filename
+from db_engine import replica_reads
 
 # Create a blueprint for admin routes
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -98,6 +99,7 @@ def init_admin(app, db, models):
 
     class CustomAdminIndexView(AdminIndexView):
         @expose('/')
+        @replica_reads
         def index(self):
             """Admin dashboard view - FIXED version"""
             if not current_user.is_authenticated:
@@ -367,14 +369,7 @@ def register_admin_routes(app, db, models):
         if not current_user.is_authenticated or not hasattr(current_user, 'is_admin') or not current_user.is_admin:
             return 'Admin access required', 403
         
-        expired_count = 0
-        expired_otps = EmailVerificationOTP.query.filter(EmailVerificationOTP.expires_at < datetime.utcnow()).all()
-        
-        for otp in expired_otps:
-            db.session.delete(otp)
-            expired_count += 1
-        
-        db.session.commit()
+        expired_count = purge_expired_auth_records(db, models)['otps']
         
         return f'Cleaned up {expired_count} expired OTPs'
 
@@ -384,14 +379,7 @@ def register_admin_routes(app, db, models):
         if not current_user.is_authenticated or not hasattr(current_user, 'is_admin') or not current_user.is_admin:
             return 'Admin access required', 403
         
-        expired_count = 0
-        expired_tokens = PasswordResetToken.query.filter(PasswordResetToken.expires_at < datetime.utcnow()).all()
-        
-        for token in expired_tokens:
-            db.session.delete(token)
-            expired_count += 1
-        
-        db.session.commit()
+        expired_count = purge_expired_auth_records(db, models)['tokens']
         
         return f'Cleaned up {expired_count} expired tokens'
 
@@ -496,6 +484,25 @@ def register_admin_routes(app, db, models):
         
         return jsonify({'success': True, 'count': count})
 
+def purge_expired_auth_records(db, models, grace=timedelta(0)):
+    """Delete expired email OTPs and password reset tokens in one transaction
+    
+    Also run periodically by the background scheduler (see jobs.py).
+    """
+    EmailVerificationOTP = models.get('EmailVerificationOTP')
+    PasswordResetToken = models.get('PasswordResetToken')
+    cutoff = datetime.utcnow() - grace
+    
+    otps = EmailVerificationOTP.query.filter(
+        EmailVerificationOTP.expires_at < cutoff
+    ).delete(synchronize_session=False)
+    tokens = PasswordResetToken.query.filter(
+        PasswordResetToken.expires_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    
+    return {'otps': otps, 'tokens': tokens}
+
 def add_admin_field_to_user(db):
     """Add is_admin field to User table if it doesn't exist"""
     from sqlalchemy import inspect, text
@@ -508,7 +515,8 @@ def add_admin_field_to_user(db):
             print("Adding 'is_admin' column to user table...")
             try:
                 # Use SQLAlchemy 2.0 compatible syntax
-                db.session.execute(text('ALTER TABLE user ADD COLUMN is_admin BOOLEAN DEFAULT FALSE'))
+                user_table = db.engine.dialect.identifier_preparer.quote('user')
+                db.session.execute(text(f'ALTER TABLE {user_table} ADD COLUMN is_admin BOOLEAN DEFAULT FALSE'))
                 db.session.commit()
                 print("✓ Added 'is_admin' column to user table")
             except Exception as e:
@@ -528,9 +536,9 @@ def create_default_admin_user(app, db, models=None):
             if models:
                 User = models.get('User')
             else:
-                # Try to import from app (fallback)
+                # Try to import from models (fallback)
                 try:
-                    from app import User
+                    from models import User
                 except ImportError:
                     print("❌ Could not import User model")
                     return
@@ -688,4 +696,4 @@ def register_file_routes(app):
         })
 
 # Make functions available
-__all__ = ['init_admin', 'add_admin_field_to_user', 'create_default_admin_user']
\ No newline at end of file
+__all__ = ['init_admin', 'add_admin_field_to_user', 'create_default_admin_user', 'purge_expired_auth_records']
\ No newline at end of file
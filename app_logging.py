@@ -0,0 +1,133 @@
+# app_logging.py - Structured logging written off the request path
+import atexit
+import itertools
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+# Filled in by init_logging()
+_handler = None
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records of high-volume events.
+
+    Records are matched on their ``event`` extra (``extra={'event': 'chat.sent'}``);
+    warnings and errors are never sampled. Kept records carry ``sample_rate``
+    so counts can be scaled back up downstream.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {event: int(rate) for event, rate in rates.items() if int(rate) > 1}
+        # next() on itertools.count is atomic under the GIL, so no lock is needed
+        self._counters = {event: itertools.count() for event in self.rates}
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if next(self._counters[record.event]) % rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """QueueHandler for a queue read in this process.
+
+    The stock prepare() formats the whole record (traceback included) on
+    the calling thread so it can be pickled; here only the message is
+    resolved, in case its args change later, and formatting happens on the
+    listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def init_logging(app, stream=None):
+    """Route all logging through one handler on the root logger.
+
+    With ``LOG_ASYNC`` (the default) records are put on an in-memory
+    queue and written by a QueueListener thread, so request and Socket.IO
+    threads never block on stdout.
+    """
+    global _handler, _listener
+
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_LEVELS', {})
+    app.config.setdefault('LOG_FORMAT', 'json')
+    app.config.setdefault('LOG_ASYNC', True)
+    app.config.setdefault('LOG_SAMPLING', {})
+
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if app.config['LOG_FORMAT'] == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    if app.config['LOG_ASYNC']:
+        _handler = _InProcessQueueHandler(queue.SimpleQueue())
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        _handler = output
+
+    # Sample before enqueueing so dropped records cost nothing downstream
+    if app.config['LOG_SAMPLING']:
+        _handler.addFilter(SamplingFilter(app.config['LOG_SAMPLING']))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    for name, level in app.config['LOG_LEVELS'].items():
+        logging.getLogger(name).setLevel(level)
+
+
+def shutdown_logging():
+    """Flush queued records and detach the handler (also runs at exit)"""
+    global _handler, _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+atexit.register(shutdown_logging)
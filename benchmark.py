@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for HabitHero's database hot paths.
+Usage: python benchmark.py <command> [options]
+"""
+
+import io
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app_logging import init_logging, shutdown_logging
+import message_ingest
+import message_search
+import typing_state
+import user_search
+from chat_service import MessageSendError, send_message
+from config import Config
+from db_engine import sqlite_pragma_values, write_transaction
+from factory import create_app
+from models import db, User, Friend, ChatMessage, Notification
+
+
+def make_app(workdir, web=False, **overrides):
+    """App on a throwaway SQLite database with two friends in it (web=True adds routes)"""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'SCHEDULER_ENABLED': False,
+    }
+    settings.update(overrides)
+    app = create_app(type('BenchmarkConfig', (Config,), settings), web=web)
+
+    with app.app_context():
+        db.create_all()
+        alice = User(username='bench_alice', email='alice@bench.local', password_hash='x', is_verified=True)
+        bob = User(username='bench_bob', email='bob@bench.local', password_hash='x', is_verified=True)
+        db.session.add_all([alice, bob])
+        db.session.commit()
+        db.session.add(Friend(user_id=alice.id, friend_id=bob.id, status='accepted'))
+        db.session.commit()
+        app.config['BENCH_USERS'] = (alice.id, bob.id)
+
+    return app
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_chat_load(app, writers, messages, readers):
+    """Send messages from ``writers`` threads while ``readers`` threads poll the conversation"""
+    sender_id, receiver_id = app.config['BENCH_USERS']
+    latencies = []
+    errors = []
+    reads = [0]
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def writer():
+        with app.app_context():
+            for i in range(messages):
+                started = time.perf_counter()
+                try:
+                    with write_transaction() as session:
+                        session.add(ChatMessage(sender_id=sender_id, receiver_id=receiver_id,
+                                                content=f'benchmark message {i}', status='sent'))
+                        session.add(Notification(user_id=receiver_id, text='💬 New message',
+                                                 link=f'/chat/{sender_id}'))
+                except OperationalError as e:
+                    with lock:
+                        errors.append(str(e.orig))
+                    continue
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            db.session.remove()
+
+    def reader():
+        with app.app_context():
+            while not done.is_set():
+                try:
+                    ChatMessage.query.filter_by(sender_id=sender_id, receiver_id=receiver_id) \
+                        .order_by(ChatMessage.timestamp.desc()).limit(50).all()
+                    with lock:
+                        reads[0] += 1
+                except OperationalError as e:
+                    with lock:
+                        errors.append(str(e.orig))
+                db.session.remove()
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    return {
+        'messages': len(latencies),
+        'elapsed': elapsed,
+        'errors': errors,
+        'reads': reads[0],
+        'latencies': latencies,
+    }
+
+
+@click.group()
+def cli():
+    """HabitHero benchmarks"""
+
+
+@cli.command('sqlite-writes')
+@click.option('--writers', default=8, help='Threads sending chat messages')
+@click.option('--messages', default=200, help='Messages per writer thread')
+@click.option('--readers', default=4, help='Threads polling the conversation meanwhile')
+def sqlite_writes(writers, messages, readers):
+    """Chat messages/sec with SQLite defaults vs. the tuned engine (db_engine.py)."""
+    click.echo(f"{writers} writers x {messages} messages, {readers} concurrent readers\n")
+
+    for label, tuning in [('default journal', False), ('WAL + pragmas', True)]:
+        workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+        try:
+            app = make_app(workdir, SQLITE_TUNING=tuning)
+            with app.app_context():
+                with db.engine.connect() as conn:
+                    pragmas = sqlite_pragma_values(conn)
+
+            result = run_chat_load(app, writers, messages, readers)
+
+            with app.app_context():
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        rate = result['messages'] / result['elapsed']
+        click.echo(f"{label}: journal_mode={pragmas['journal_mode']} synchronous={pragmas['synchronous']}")
+        click.echo(f"  {rate:8.0f} messages/sec   {result['reads'] / result['elapsed']:8.0f} reads/sec")
+        click.echo(f"  write latency p50 {statistics.median(result['latencies'] or [0]):.1f} ms, "
+                   f"p95 {percentile(result['latencies'], 95):.1f} ms, "
+                   f"max {max(result['latencies'] or [0]):.1f} ms")
+        click.echo(f"  'database is locked' errors: {sum('locked' in e for e in result['errors'])}\n")
+
+
+class SlowStream(io.TextIOBase):
+    """Stand-in for a stdout that takes ``delay`` seconds per write (busy terminal, full pipe)"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.writes += 1
+        return len(text)
+
+
+@cli.command('log-overhead')
+@click.option('--messages', default=300, help='Messages sent through POST /api/chat/send')
+@click.option('--write-ms', default=2.0, help='Simulated cost of one write to stdout')
+def log_overhead(messages, write_ms):
+    """Chat send latency with logs written inline vs. by the QueueListener thread (app_logging.py)."""
+    click.echo(f"{messages} sends, {write_ms} ms per stdout write, no log sampling\n")
+
+    for label, async_logging in [('synchronous handler', False), ('queue + listener thread', True)]:
+        workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+        try:
+            app = make_app(workdir, web=True, LOG_ASYNC=async_logging, LOG_SAMPLING={},
+                           QUERY_PROFILER_ENABLED=False)
+            stream = SlowStream(write_ms / 1000)
+            init_logging(app, stream=stream)
+            sender_id, receiver_id = app.config['BENCH_USERS']
+
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(sender_id)
+
+            latencies = []
+            started = time.perf_counter()
+            for i in range(messages):
+                sent = time.perf_counter()
+                response = client.post('/api/chat/send', json={'receiver_id': receiver_id,
+                                                               'content': f'benchmark message {i}'})
+                latencies.append((time.perf_counter() - sent) * 1000)
+                assert response.status_code == 200, response.get_data(as_text=True)
+            elapsed = time.perf_counter() - started
+
+            drained = time.perf_counter()
+            shutdown_logging()
+            drain_ms = (time.perf_counter() - drained) * 1000
+
+            with app.app_context():
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        click.echo(f"{label}:")
+        click.echo(f"  {messages / elapsed:8.0f} sends/sec, {stream.writes} log lines written")
+        click.echo(f"  send latency p50 {statistics.median(latencies):.1f} ms, "
+                   f"p95 {percentile(latencies, 95):.1f} ms, max {max(latencies):.1f} ms")
+        click.echo(f"  backlog flushed after the run in {drain_ms:.0f} ms\n")
+
+
+def legacy_send(sender, receiver_id, content):
+    """The pre-chat_service send: duplicate check, friendship and receiver lookups, then inserts"""
+    duplicate = ChatMessage.query.filter(
+        ChatMessage.sender_id == sender.id, ChatMessage.receiver_id == receiver_id,
+        ChatMessage.content == content,
+        ChatMessage.timestamp > datetime.utcnow() - timedelta(seconds=2)
+    ).first()
+    if duplicate:
+        return duplicate
+    Friend.query.filter(
+        ((Friend.user_id == sender.id) & (Friend.friend_id == receiver_id)) |
+        ((Friend.user_id == receiver_id) & (Friend.friend_id == sender.id))
+    ).filter_by(status='accepted').first()
+    receiver = db.session.get(User, receiver_id)
+    message = ChatMessage(sender_id=sender.id, receiver_id=receiver_id, content=content,
+                          status='delivered' if receiver.is_online else 'sent')
+    db.session.add(message)
+    db.session.add(Notification(user_id=receiver_id, text=f'💬 New message from {sender.username}',
+                                link=f'/chat/{sender.id}'))
+    db.session.commit()
+    return message.id
+
+
+@cli.command('send-pipeline')
+@click.option('--messages', default=2000, help='Messages sent per pipeline')
+def send_pipeline(messages):
+    """Messages/sec and SQL statements per send: old route code vs. chat_service.send_message."""
+    click.echo(f"{messages} sends, one conversation, SQLite WAL\n")
+
+    pipelines = [
+        ('legacy route code', lambda sender, receiver_id, i: legacy_send(sender, receiver_id, f'message {i}')),
+        ('chat_service', lambda sender, receiver_id, i: send_message(sender, receiver_id, f'message {i}',
+                                                                      client_id=f'bench-{i}')),
+    ]
+    for label, send in pipelines:
+        workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+        try:
+            app = make_app(workdir, web=True, LOG_SAMPLING={}, LOG_LEVEL='WARNING',
+                           QUERY_PROFILER_ENABLED=False, METRICS_ENABLED=False)
+            sender_id, receiver_id = app.config['BENCH_USERS']
+            statements = []
+            executed = [0]
+
+            def count(*args):
+                executed[0] += 1
+
+            with app.app_context():
+                event.listen(db.engine, 'before_cursor_execute', count)
+                latencies = []
+                started = time.perf_counter()
+                for i in range(messages):
+                    # A fresh session per send, like a request; loading the sender isn't counted
+                    db.session.remove()
+                    sender = db.session.get(User, sender_id)
+                    executed[0] = 0
+                    sent = time.perf_counter()
+                    send(sender, receiver_id, i)
+                    latencies.append((time.perf_counter() - sent) * 1000)
+                    statements.append(executed[0])
+                elapsed = time.perf_counter() - started
+                event.remove(db.engine, 'before_cursor_execute', count)
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        click.echo(f"{label}:")
+        click.echo(f"  {messages / elapsed:8.0f} messages/sec")
+        click.echo(f"  send latency p50 {statistics.median(latencies):.2f} ms, "
+                   f"p95 {percentile(latencies, 95):.2f} ms")
+        click.echo(f"  {statistics.mean(statements):.1f} SQL statements per send "
+                   f"(commit not counted)\n")
+
+
+
+def _group_commit_run(workdir, max_batch, writers, messages, results):
+    """One configuration of the group-commit benchmark (max_batch None: direct sends)"""
+    app = make_app(workdir, web=True, LOG_SAMPLING={}, LOG_LEVEL='WARNING', QUERY_PROFILER_ENABLED=False,
+                   METRICS_ENABLED=False, CHAT_GROUP_COMMIT=max_batch is not None,
+                   CHAT_GROUP_COMMIT_MAX_BATCH=max_batch or 1, CHAT_INGEST_LOG_DIR=os.path.join(workdir, 'ingest'))
+    sender_id, receiver_id = app.config['BENCH_USERS']
+    acks = []
+    lock = threading.Lock()
+
+    def writer(n):
+        with app.app_context():
+            sender = db.session.get(User, sender_id)
+            for i in range(messages):
+                started = time.perf_counter()
+                while True:
+                    try:
+                        send_message(sender, receiver_id, f'message {n}-{i}', client_id=f'bench-{n}-{i}')
+                        break
+                    except MessageSendError:
+                        time.sleep(0.001)  # queue full: back off like a client would
+                with lock:
+                    acks.append((time.perf_counter() - started) * 1000)
+            db.session.remove()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    message_ingest.drain(60)
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stored = ChatMessage.query.count()
+    results.put({'elapsed': elapsed, 'stored': stored, 'acks': acks, 'stats': dict(message_ingest.stats)})
+
+
+def _in_child(target, *args):
+    """Run ``target`` in a fresh process (message_ingest keeps one log per process) and return its result"""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=target, args=args + (results,))
+    process.start()
+    result = results.get(timeout=600)
+    process.join()
+    return result
+
+
+@cli.command('group-commit')
+@click.option('--writers', default=8, help='Threads sending chat messages')
+@click.option('--messages', default=500, help='Messages per writer thread')
+@click.option('--batches', default='1,8,64,256', help='CHAT_GROUP_COMMIT_MAX_BATCH values to try')
+def group_commit(writers, messages, batches):
+    """Messages/sec stored with direct sends vs. write-behind group commit (message_ingest.py)."""
+    total = writers * messages
+    click.echo(f"{writers} writers x {messages} messages, SQLite WAL\n")
+    click.echo(f"{'mode':<26}{'stored msg/s':>14}{'ack p50 ms':>12}{'ack p95 ms':>12}{'commits':>9}")
+
+    for max_batch in [None] + [int(size) for size in batches.split(',')]:
+        workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+        try:
+            result = _in_child(_group_commit_run, workdir, max_batch, writers, messages)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        label = 'direct' if max_batch is None else f'group commit, batch {max_batch}'
+        commits = total if max_batch is None else result['stats']['batches']
+        click.echo(f"{label:<26}{result['stored'] / result['elapsed']:>14.0f}"
+                   f"{statistics.median(result['acks']):>12.2f}{percentile(result['acks'], 95):>12.2f}"
+                   f"{commits:>9}")
+        if result['stored'] != total:
+            click.echo(f"  ⚠️ stored {result['stored']} of {total} messages")
+
+
+def _ingest_crash(workdir, count, results):
+    # A long interval and a large batch keep everything queued, then the process dies mid-flight
+    app = make_app(workdir, web=True, LOG_LEVEL='WARNING', CHAT_GROUP_COMMIT=True,
+                   CHAT_GROUP_COMMIT_INTERVAL_MS=600000, CHAT_GROUP_COMMIT_MAX_BATCH=count + 1,
+                   CHAT_INGEST_LOG_DIR=os.path.join(workdir, 'ingest'))
+    sender_id, receiver_id = app.config['BENCH_USERS']
+    with app.app_context():
+        sender = db.session.get(User, sender_id)
+        acked = [send_message(sender, receiver_id, f'message {i}')[0]['client_id'] for i in range(count)]
+        stored = ChatMessage.query.count()
+    results.put({'acked': acked, 'stored': stored})
+    results.close()
+    results.join_thread()
+    os._exit(1)
+
+
+def _ingest_restart(workdir, results):
+    app = create_app(type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'SCHEDULER_ENABLED': False, 'LOG_LEVEL': 'WARNING', 'CHAT_GROUP_COMMIT': True,
+        'CHAT_INGEST_LOG_DIR': os.path.join(workdir, 'ingest'),
+    }))
+    with app.app_context():
+        rows = db.session.query(ChatMessage.client_id).all()
+    results.put({'client_ids': [row.client_id for row in rows], 'replayed': message_ingest.stats['replayed']})
+
+
+@cli.command('ingest-recovery')
+@click.option('--messages', default=100, help='Messages acked but not yet stored when the process dies')
+def ingest_recovery(messages):
+    """Crash with acked-but-unstored messages, restart, and check the log replay stores each exactly once."""
+    workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+    log_dir = os.path.join(workdir, 'ingest')
+    ok = True
+    try:
+        crashed = _in_child(_ingest_crash, workdir, messages)
+        click.echo(f"crash: {len(crashed['acked'])} sends acked, {crashed['stored']} in the database")
+
+        # A write cut off by the crash; it was never acked, so it must be skipped
+        segments = sorted(name for name in os.listdir(log_dir) if name.startswith('segment-'))
+        with open(os.path.join(log_dir, segments[-1]), 'a', encoding='utf-8') as f:
+            f.write('{"sender_id": 1, "receiver_id": 2, "cont')
+        saved = os.path.join(workdir, 'saved')
+        shutil.copytree(log_dir, saved)
+
+        restarted = _in_child(_ingest_restart, workdir)
+        ok &= sorted(restarted['client_ids']) == sorted(crashed['acked'])
+        click.echo(f"restart: replayed {restarted['replayed']} log entries, "
+                   f"{len(restarted['client_ids'])} messages stored")
+
+        # Crash again before the log was cleaned up: the replay must not store anything twice
+        shutil.rmtree(log_dir)
+        shutil.copytree(saved, log_dir)
+        again = _in_child(_ingest_restart, workdir)
+        ok &= sorted(again['client_ids']) == sorted(crashed['acked'])
+        click.echo(f"second replay: {len(again['client_ids'])} messages stored")
+        ok &= not [name for name in os.listdir(log_dir) if name.startswith('segment-') and os.path.getsize(
+            os.path.join(log_dir, name))]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    click.echo("✅ every acked message stored exactly once" if ok else "❌ replay lost or duplicated messages")
+    if not ok:
+        raise SystemExit(1)
+
+
+
+@cli.command('typing-fanout')
+@click.option('--users', default=20, help='Users typing in the same chat room')
+@click.option('--seconds', default=3.0, help='How long they type')
+@click.option('--keystroke-ms', default=60, help='Time between one user\'s keystrokes')
+def typing_fanout(users, seconds, keystroke_ms):
+    """user_typing emits for a busy room of per-keystroke clients: every event vs. typing_state transitions."""
+    import random
+
+    workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+    try:
+        make_app(workdir, web=True, LOG_LEVEL='WARNING')
+        rng = random.Random(7)
+        next_key = [0.0] * users
+        started = time.monotonic()
+        while time.monotonic() - started < seconds:
+            now = time.monotonic() - started
+            for user in range(users):
+                if now >= next_key[user]:
+                    # Mostly keystrokes, sometimes a pause that the client ends with a stop
+                    is_typing = rng.random() > 0.05
+                    typing_state.update_typing(f'sid-{user}', user, f'user{user}', 'chat_bench', is_typing)
+                    next_key[user] = now + keystroke_ms / 1000 * (1 if is_typing else 20)
+            time.sleep(0.005)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = typing_state.stats
+    click.echo(f"{users} users, {keystroke_ms} ms between keystrokes, {seconds:.0f}s\n")
+    click.echo(f"typing events received: {stats['received']}")
+    click.echo(f"  emitted before (one per event): {stats['received']}")
+    click.echo(f"  emitted now (transitions):      {stats['forwarded']} "
+               f"({stats['received'] / max(stats['forwarded'], 1):.0f}x fewer, {stats['throttled']} throttled)")
+
+
+
+@cli.command('user-search')
+@click.option('--users', default=100000, help='Users in the table (try 1000000)')
+@click.option('--queries', default=200, help='Searches to time')
+def user_search_bench(users, queries):
+    """/api/users/search latency over a large user table (FTS5 trigram index, migration 0008)."""
+    import random
+
+    rng = random.Random(7)
+    syllables = ['ka', 'lo', 'mi', 'ra', 'sen', 'to', 'vi', 'zu', 'an', 'el', 'or', 'us', 'bri', 'dan', 'fe', 'jo']
+    words = ['runner', 'coffee', 'books', 'yoga', 'music', 'chess', 'hiking', 'code', 'art', 'travel']
+
+    def name(i):
+        return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) + str(i)
+
+    workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+    try:
+        app = make_app(workdir, web=True, LOG_LEVEL='WARNING', QUERY_PROFILER_ENABLED=False, METRICS_ENABLED=False)
+        me, _ = app.config['BENCH_USERS']
+        with app.app_context():
+            started = time.perf_counter()
+            with db.engine.begin() as conn:
+                conn.execute(User.__table__.insert(), [{
+                    'username': name(i), 'email': f'u{i}@bench.local', 'password_hash': 'x', 'is_verified': True,
+                    'bio': ' '.join(rng.sample(words, 3)), 'unread_notifications': 0,
+                } for i in range(users)])
+                # 200 friends, each with friends of their own, for the mutual-friend boost
+                conn.execute(Friend.__table__.insert(), [
+                    {'user_id': me, 'friend_id': 3 + i, 'status': 'accepted'} for i in range(200)
+                ] + [
+                    {'user_id': 3 + i, 'friend_id': 3 + rng.randrange(200, users), 'status': 'accepted'}
+                    for i in range(200) for _ in range(10)
+                ])
+            click.echo(f"{users} users indexed in {time.perf_counter() - started:.1f}s\n")
+
+            terms = [name(rng.randrange(users))[:length] for length in (1, 2, 3, 4, 6) for _ in range(queries // 5)]
+            by_length = {}
+            for term in terms:
+                sent = time.perf_counter()
+                results, _ = user_search.search_users(me, term)
+                by_length.setdefault(len(term), []).append((time.perf_counter() - sent) * 1000)
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for length, latencies in sorted(by_length.items()):
+        click.echo(f"{length}-character queries: p50 {statistics.median(latencies):.2f} ms, "
+                   f"p95 {percentile(latencies, 95):.2f} ms")
+
+
+@cli.command('message-search')
+@click.option('--messages', default=200000, help='Messages in the table')
+@click.option('--queries', default=100, help='Searches to time per mode')
+def message_search_bench(messages, queries):
+    """/api/chat/<id>/search latency: FTS5 index (migration 0009) vs. a LIKE scan of the conversation."""
+    import random
+
+    rng = random.Random(7)
+    words = ['coffee', 'habit', 'streak', 'run', 'tomorrow', 'gym', 'book', 'water', 'sleep', 'meeting',
+             'lunch', 'morning', 'yoga', 'music', 'walk', 'code', 'plan', 'weekend', 'call', 'done']
+    rare = [f'word{i}' for i in range(2000)]
+
+    workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+    try:
+        app = make_app(workdir, web=True, LOG_LEVEL='WARNING', QUERY_PROFILER_ENABLED=False, METRICS_ENABLED=False)
+        alice, bob = app.config['BENCH_USERS']
+        with app.app_context():
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            with db.engine.begin() as conn:
+                # Half the table is this conversation, the rest other chats
+                conn.execute(ChatMessage.__table__.insert(), [{
+                    'sender_id': alice if i % 4 == 0 else bob,
+                    'receiver_id': bob if i % 4 == 0 else alice,
+                    'content': ' '.join(rng.sample(words, 6) + [rng.choice(rare)]),
+                    'timestamp': now - timedelta(seconds=messages - i), 'status': 'sent',
+                } if i % 2 == 0 else {
+                    'sender_id': 1000 + i % 50, 'receiver_id': 2000 + i % 50,
+                    'content': ' '.join(rng.sample(words, 6) + [rng.choice(rare)]),
+                    'timestamp': now - timedelta(seconds=messages - i), 'status': 'sent',
+                } for i in range(messages)])
+            click.echo(f"{messages} messages indexed in {time.perf_counter() - started:.1f}s\n")
+
+            terms = {
+                'common word': [rng.choice(words) for _ in range(queries)],
+                'rare word': [rng.choice(rare) for _ in range(queries)],
+                'two words + prefix': [f'{rng.choice(words)} {rng.choice(words)[:3]}' for _ in range(queries)],
+            }
+            url = str(db.engine.url)
+            for mode, indexed in (('fts5', True), ('like scan', False)):
+                message_search._fts_ready[url] = indexed
+                for label, queries_ in terms.items():
+                    latencies = []
+                    for term in queries_:
+                        sent = time.perf_counter()
+                        message_search.search_messages(alice, bob, term)
+                        latencies.append((time.perf_counter() - sent) * 1000)
+                    click.echo(f"{mode:<10} {label:<20} p50 {statistics.median(latencies):7.2f} ms, "
+                               f"p95 {percentile(latencies, 95):7.2f} ms")
+            message_search._fts_ready.pop(url, None)
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@cli.command('prepared-statements')
+@click.option('--executes', default=2000, help='Statements executed per mode')
+def prepared_statements_bench(executes):
+    """Chat send / notification upserts: the Core ON CONFLICT construct vs. db_engine.prepared_statement."""
+    from chat_service import _build_send
+    from db_engine import prepared_statement
+    from notifications import _build_notify_grouped
+
+    workdir = tempfile.mkdtemp(prefix='habithero-bench-')
+    try:
+        app = make_app(workdir, web=True, LOG_LEVEL='WARNING', QUERY_PROFILER_ENABLED=False, METRICS_ENABLED=False)
+        alice, bob = app.config['BENCH_USERS']
+        statements = {
+            'chat send': ('chat_send', _build_send, lambda i: {
+                'sender_id': alice, 'receiver_id': bob, 'content': f'message {i}',
+                'timestamp': datetime.utcnow(), 'client_id': f'bench-{i}'}),
+            'grouped notification': ('notify_grouped', _build_notify_grouped, lambda i: {
+                'user_ids': [alice, bob], 'kind': 'bench', 'source_id': i, 'text': 'hi', 'link': None,
+                'timestamp': datetime.utcnow(), 'prefix': '', 'suffix': '', 'amount': 1}),
+        }
+        with app.app_context():
+            dialect = db.engine.dialect
+            for label, (key, build, params) in statements.items():
+                modes = [('core construct', lambda: build(dialect)),
+                         ('prepared', lambda: prepared_statement(key, build))]
+                for offset, (mode, make) in enumerate(modes):
+                    latencies = []
+                    for i in range(offset * executes, (offset + 1) * executes):
+                        sent = time.perf_counter()
+                        db.session.execute(make(), params(i))
+                        latencies.append((time.perf_counter() - sent) * 1000)
+                    db.session.rollback()
+                    click.echo(f"{label:<21} {mode:<15} p50 {statistics.median(latencies):6.2f} ms, "
+                               f"p95 {percentile(latencies, 95):6.2f} ms")
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    cli()
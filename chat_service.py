@@ -0,0 +1,435 @@
+# chat_service.py - The one chat send pipeline behind HTTP, Socket.IO and forwards
+import logging
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import (DateTime, Integer, String, Text, and_, bindparam, case, delete, exists, literal, or_,
+                        select, update)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db, socketio
+from db_engine import prepared_statement, write_transaction
+from message_ingest import IngestQueueFull, enqueue, ingest_enabled
+from models import ChatMessage, Friend, User
+from notifications import KIND_CHAT_FORWARD, KIND_CHAT_MESSAGE, notify_grouped, notify_grouped_many
+
+log = logging.getLogger(__name__)
+
+# Longest client-supplied idempotency key accepted (chat.js temp ids are ~30 chars)
+MAX_CLIENT_ID_LENGTH = 64
+
+_message = ChatMessage.__table__
+_RETURNED = (_message.c.id, _message.c.receiver_id, _message.c.content,
+             _message.c.timestamp, _message.c.status, _message.c.is_read)
+
+
+class MessageSendError(Exception):
+    """A send that was refused; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def clean_client_id(value):
+    """A usable idempotency key from request data, or None"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return value if 0 < len(value) <= MAX_CLIENT_ID_LENGTH else None
+
+
+def send_message(sender, receiver_id, content, client_id=None, via='http'):
+    """Store a chat message, notify the receiver and push it to them.
+
+    The friendship check, the receiver's online status (which picks
+    'delivered' or 'sent') and the insert are a single
+    ``INSERT ... SELECT ... WHERE EXISTS (friendship) RETURNING``, so the
+    common case costs one statement for the message and one upsert for the
+    grouped notification, in one transaction. A retried send with the same
+    ``client_id`` hits the unique (sender_id, client_id) index and gets the
+    stored message back without a second notification or push.
+
+    With group commit on (message_ingest), the send is only logged and
+    queued here and the payload has ``queued`` set and no id yet; the
+    writer stores it, then sends ``message_delivered`` (or
+    ``send_message_error``) to the sender's room.
+
+    Returns ``(message_data, created)``; raises MessageSendError when the
+    users aren't friends.
+    """
+    # Read before the commit expires ``sender``, so the payload needs no reload
+    sender_id, username = sender.id, sender.username
+    now = datetime.utcnow()
+    if ingest_enabled():
+        return _enqueue_send(sender_id, username, receiver_id, content, client_id, now, via), True
+
+    with write_transaction():
+        rows = _run_insert('chat_send', _build_send, {
+            'sender_id': sender_id, 'receiver_id': receiver_id, 'content': content,
+            'timestamp': now, 'client_id': client_id,
+        }, fallback_where=and_(_message.c.sender_id == sender_id, _message.c.receiver_id == receiver_id,
+                               _message.c.timestamp == now))
+        created = bool(rows)
+        if created:
+            _notify_chat(receiver_id, sender_id, username)
+
+    if not created:
+        # Either a retry of a stored send or not allowed; only the retry has a row
+        rows = db.session.execute(select(*_RETURNED).where(
+            _message.c.sender_id == sender_id, _message.c.client_id == client_id
+        )).all() if client_id else []
+        if not rows:
+            raise MessageSendError('Users are not friends', 403)
+        log.info('duplicate message dropped', extra={'event': 'chat.duplicate', 'via': via,
+                                                     'message_id': rows[0].id})
+        return message_data(sender_id, username, rows[0]), False
+
+    data = message_data(sender_id, username, rows[0])
+    log.info('message sent', extra={'event': 'chat.sent', 'via': via, 'message_id': data['id'],
+                                    'sender_id': sender_id, 'receiver_id': receiver_id,
+                                    'status': data['status']})
+    try:
+        socketio.emit('new_message', data, room=f'user_{receiver_id}')
+    except Exception as socket_error:
+        # The message is stored; the receiver picks it up on their next fetch
+        log.warning('socket emit failed: %s', socket_error, extra={'event': 'chat.emit_failed'})
+    return data, True
+
+
+def store_queued_messages(entries, replay=False):
+    """Store a batch of queued sends in one transaction (the group commit).
+
+    Each entry goes through the same prepared insert as a direct send, so
+    the friendship check and the client_id de-duplication are unchanged
+    and replaying a log entry that was already stored is a no-op. The
+    receivers' notifications are bumped once per sender with the batch's
+    count. After the commit the messages are pushed to their receivers
+    and, for live sends, acknowledged to their senders; replays have no
+    one waiting for an ack. Returns how many messages were inserted.
+    """
+    stored, missing = [], []
+    with write_transaction():
+        for entry in entries:
+            timestamp = datetime.fromisoformat(entry['timestamp'])
+            rows = _run_insert('chat_send', _build_send, {
+                'sender_id': entry['sender_id'], 'receiver_id': entry['receiver_id'],
+                'content': entry['content'], 'timestamp': timestamp, 'client_id': entry['client_id'],
+            }, fallback_where=and_(_message.c.sender_id == entry['sender_id'],
+                                   _message.c.client_id == entry['client_id']))
+            if rows:
+                stored.append((entry, rows[0]))
+            else:
+                missing.append(entry)
+
+        senders = Counter((entry['receiver_id'], entry['sender_id'], entry['username']) for entry, _ in stored)
+        for (receiver_id, sender_id, username), amount in senders.items():
+            _notify_chat(receiver_id, sender_id, username, amount)
+
+    for entry, row in stored:
+        data = message_data(entry['sender_id'], entry['username'], row)
+        _emit('new_message', data, f"user_{entry['receiver_id']}")
+        if not replay:
+            _emit_delivered(entry, data)
+
+    if missing and not replay:
+        # Already stored (a retried client_id) or not friends
+        existing = {row.client_id: row for row in db.session.execute(
+            select(_message.c.client_id, *_RETURNED).where(
+                or_(*[and_(_message.c.sender_id == entry['sender_id'], _message.c.client_id == entry['client_id'])
+                      for entry in missing]))
+        ).all()}
+        for entry in missing:
+            row = existing.get(entry['client_id'])
+            if row is not None:
+                _emit_delivered(entry, message_data(entry['sender_id'], entry['username'], row))
+            else:
+                report_failed_sends([entry], 'Users are not friends')
+
+    log.info('chat batch stored', extra={'event': 'chat.batch_stored', 'stored': len(stored),
+                                         'size': len(entries), 'replay': replay})
+    return len(stored)
+
+
+def report_failed_sends(entries, error='Message could not be saved'):
+    """Tell the senders of queued messages that were not stored"""
+    for entry in entries:
+        _emit('send_message_error', {'error': error, 'temp_id': entry['client_id']}, f"user_{entry['sender_id']}")
+
+
+def forward_message(sender, message_id, friend_ids):
+    """Forward a message the sender can see to any number of friends at once.
+
+    One ``INSERT ... SELECT`` writes a copy per recipient, keeping only
+    recipients who are friends and only if the sender is a party to the
+    original and hasn't deleted it, and one multi-row upsert bumps their grouped notifications.
+    Returns the new messages' data; raises MessageSendError when nothing
+    could be forwarded.
+    """
+    sender_id, username = sender.id, sender.username
+    friend_ids = [int(friend_id) for friend_id in dict.fromkeys(friend_ids)]
+    now = datetime.utcnow()
+
+    with write_transaction():
+        rows = _run_insert('chat_forward', _build_forward, {
+            'sender_id': sender_id, 'message_id': message_id, 'friend_ids': friend_ids, 'timestamp': now,
+        }, fallback_where=and_(_message.c.sender_id == sender_id, _message.c.original_message_id == message_id,
+                               _message.c.receiver_id.in_(friend_ids), _message.c.timestamp == now))
+        if rows:
+            notify_grouped_many(
+                [row.receiver_id for row in rows], KIND_CHAT_FORWARD, sender_id,
+                f"📨 {username} forwarded you a message",
+                f"📨 {username} forwarded you {{count}} messages",
+                link=f"/chat/{sender_id}"
+            )
+
+    if not rows:
+        visible = db.session.execute(select(ChatMessage.id).where(
+            ChatMessage.id == message_id, visible_to(sender_id)
+        )).first()
+        if visible is None:
+            raise MessageSendError('Message not found', 404)
+        raise MessageSendError('You can only forward to friends', 403)
+
+    forwarded = []
+    for row in rows:
+        data = dict(message_data(sender_id, username, row), is_forwarded=True)
+        socketio.emit('new_message', data, room=f'user_{row.receiver_id}')
+        forwarded.append(data)
+    log.info('message forwarded', extra={'event': 'chat.forwarded', 'message_id': message_id,
+                                         'sender_id': sender_id, 'count': len(forwarded)})
+    return forwarded
+
+
+def visible_to(user_id, columns=_message.c):
+    """Messages ``user_id`` sent or received and hasn't deleted for themselves"""
+    return or_(
+        and_(columns.sender_id == user_id, columns.deleted_for_sender.is_(False)),
+        and_(columns.receiver_id == user_id, columns.deleted_for_receiver.is_(False)),
+    )
+
+
+def visible_in_chat(user_id, other_id):
+    """Messages between ``user_id`` and ``other_id`` that ``user_id`` still sees.
+
+    Each side of the OR is answered by one of the partial indexes from
+    migration 0010, so deleted rows are never read. ``other_id`` may be a
+    column (``User.id`` in a join).
+    """
+    return or_(
+        and_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == other_id,
+             ChatMessage.deleted_for_sender.is_(False)),
+        and_(ChatMessage.receiver_id == user_id, ChatMessage.sender_id == other_id,
+             ChatMessage.deleted_for_receiver.is_(False)),
+    )
+
+
+def delete_for_user(user_id, message_ids):
+    """Delete messages for ``user_id`` only; returns how many were deleted.
+
+    One UPDATE sets deleted_for_sender or deleted_for_receiver, whichever
+    side of each message the user is on. Messages the user isn't a party
+    to, or already deleted, are skipped.
+    """
+    return _hide_for(user_id, ChatMessage.id.in_(message_ids), visible_to(user_id))
+
+
+def clear_chat_for_user(user_id, other_id):
+    """Delete a whole chat for ``user_id`` only, in one UPDATE; returns how many messages"""
+    return _hide_for(user_id, visible_in_chat(user_id, other_id))
+
+
+def delete_for_everyone(message):
+    """Delete a message for both sides; the row goes at the next purge_deleted_messages()"""
+    with write_transaction():
+        message.deleted_for_sender = True
+        message.deleted_for_receiver = True
+
+
+def purge_deleted_messages(batch_size=1000, max_batches=None):
+    """Remove messages deleted by both sides from the table, in bounded batches.
+
+    Deletes only ever set flags, so chats never pay for row deletes; this
+    is where the rows actually go. Candidates come off the partial
+    ``ix_message_purgeable`` index, which holds nothing else, lowest id
+    first, and each batch is one short ``DELETE ... WHERE id IN (...)``
+    transaction (the message_search triggers unindex them as well).
+    """
+    started = time.perf_counter()
+    metrics = {'deleted': 0, 'batches': 0}
+    candidates = select(ChatMessage.id).where(
+        ChatMessage.deleted_for_sender.is_(True), ChatMessage.deleted_for_receiver.is_(True)
+    ).order_by(ChatMessage.id).limit(batch_size)
+
+    while max_batches is None or metrics['batches'] < max_batches:
+        ids = db.session.execute(candidates).scalars().all()
+        if not ids:
+            break
+        with write_transaction():
+            metrics['deleted'] += db.session.execute(
+                delete(ChatMessage).where(ChatMessage.id.in_(ids)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+        metrics['batches'] += 1
+        if len(ids) < batch_size:
+            break
+
+    metrics['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return metrics
+
+
+def message_data(sender_id, username, row):
+    """The ``new_message`` payload for a stored message"""
+    return {
+        'id': row.id,
+        'sender_id': sender_id,
+        'sender_username': username,
+        'receiver_id': row.receiver_id,
+        'content': row.content,
+        'timestamp': row.timestamp.isoformat() + 'Z',
+        'is_read': row.is_read,
+        'status': row.status or 'sent'
+    }
+
+
+def _hide_for(user_id, *where):
+    stmt = update(ChatMessage).where(*where).values(
+        deleted_for_sender=case((ChatMessage.sender_id == user_id, True), else_=ChatMessage.deleted_for_sender),
+        deleted_for_receiver=case((ChatMessage.receiver_id == user_id, True), else_=ChatMessage.deleted_for_receiver),
+    )
+    with write_transaction():
+        deleted = db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount
+    log.info('messages deleted for user', extra={'event': 'chat.deleted_for_user', 'user_id': user_id,
+                                                 'count': deleted})
+    return deleted
+
+
+def _enqueue_send(sender_id, username, receiver_id, content, client_id, now, via):
+    # The client_id is what makes a replay after a crash idempotent
+    client_id = client_id or uuid.uuid4().hex
+    try:
+        enqueue({
+            'sender_id': sender_id, 'username': username, 'receiver_id': receiver_id,
+            'content': content, 'client_id': client_id, 'timestamp': now.isoformat(),
+        })
+    except IngestQueueFull:
+        log.warning('chat ingest queue full', extra={'event': 'chat.ingest_full', 'via': via})
+        raise MessageSendError('Server busy, try again', 503)
+    return {
+        'id': None,
+        'client_id': client_id,
+        'sender_id': sender_id,
+        'sender_username': username,
+        'receiver_id': receiver_id,
+        'content': content,
+        'timestamp': now.isoformat() + 'Z',
+        'is_read': False,
+        'status': 'sent',
+        'queued': True,
+    }
+
+
+def _notify_chat(receiver_id, sender_id, username, amount=1):
+    notify_grouped(
+        receiver_id, KIND_CHAT_MESSAGE, sender_id,
+        f"💬 New message from {username}",
+        f"💬 {{count}} new messages from {username}",
+        link=f"/chat/{sender_id}", amount=amount
+    )
+
+
+def _emit(event, data, room):
+    try:
+        socketio.emit(event, data, room=room)
+    except Exception as socket_error:
+        log.warning('socket emit failed: %s', socket_error, extra={'event': 'chat.emit_failed'})
+
+
+def _emit_delivered(entry, data):
+    _emit('message_delivered', {
+        'temp_id': entry['client_id'],
+        'message_id': data['id'],
+        'timestamp': data['timestamp'],
+        'status': data['status'],
+    }, f"user_{entry['sender_id']}")
+
+
+def _initial_status():
+    # 'delivered' when the receiver is online right now, read in the same statement
+    return case((User.is_online == True, 'delivered'), else_='sent')  # noqa: E712
+
+
+def _is_friend_of(user_id):
+    """EXISTS an accepted friendship between ``user_id`` and the selected User row"""
+    return exists().where(
+        Friend.status == 'accepted',
+        or_(and_(Friend.user_id == user_id, Friend.friend_id == User.id),
+            and_(Friend.user_id == User.id, Friend.friend_id == user_id))
+    )
+
+
+def _build_send(dialect):
+    sender_id = bindparam('sender_id', type_=Integer)
+    return _insert_from_select(dialect, select(
+        sender_id,
+        User.id,
+        bindparam('content', type_=Text),
+        _initial_status(),
+        literal(False),
+        bindparam('timestamp', type_=DateTime),
+        bindparam('client_id', type_=String),
+    ).where(
+        User.id == bindparam('receiver_id', type_=Integer),
+        _is_friend_of(sender_id),
+    ), ['sender_id', 'receiver_id', 'content', 'status', 'is_read', 'timestamp', 'client_id'])
+
+
+def _build_forward(dialect):
+    sender_id = bindparam('sender_id', type_=Integer)
+    original = ChatMessage.__table__.alias('original')
+    return _insert_from_select(dialect, select(
+        sender_id,
+        User.id,
+        literal('(Forwarded) ') + original.c.content,
+        _initial_status(),
+        literal(False),
+        bindparam('timestamp', type_=DateTime),
+        literal(True),
+        original.c.id,
+    ).where(
+        original.c.id == bindparam('message_id', type_=Integer),
+        visible_to(sender_id, original.c),
+        User.id.in_(bindparam('friend_ids', expanding=True, type_=Integer)),
+        _is_friend_of(sender_id),
+    ), ['sender_id', 'receiver_id', 'content', 'status', 'is_read', 'timestamp',
+        'is_forwarded', 'original_message_id'])
+
+
+def _insert_from_select(dialect, select_stmt, column_names):
+    # Column defaults (edited=False, ...) would be filled in per execution;
+    # the prepared statement has to carry them in the SELECT instead
+    defaults = [column for column in _message.c
+                if column.name not in column_names and column.default is not None and column.default.is_scalar]
+    select_stmt = select_stmt.add_columns(*[literal(column.default.arg, column.type) for column in defaults])
+    column_names = column_names + [column.name for column in defaults]
+
+    insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+    # A repeated client_id inserts nothing; NULL client_ids never conflict
+    stmt = insert(_message).from_select(column_names, select_stmt).on_conflict_do_nothing(
+        index_elements=[_message.c.sender_id, _message.c.client_id])
+    return stmt.returning(*_RETURNED) if dialect.insert_returning else stmt
+
+
+def _run_insert(key, build, params, fallback_where):
+    """Run a prepared INSERT ... SELECT and return the inserted rows' _RETURNED columns"""
+    result = db.session.execute(prepared_statement(key, build, _RETURNED), params)
+    if db.engine.dialect.insert_returning:
+        return result.all()
+
+    # Older SQLite: no RETURNING, so read back what was just written
+    if result.rowcount == 0:
+        return []
+    return db.session.execute(select(*_RETURNED).where(fallback_where)).all()
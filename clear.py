@@ -12,8 +12,11 @@ from datetime import datetime, timedelta
 # Add the app directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, db
-from app import ChatMessage, User
+# Only the models and engine - no routes, Socket.IO or background jobs
+from factory import create_app
+from models import db, ChatMessage, User
+
+app = create_app(web=False)
 
 @click.command()
 @click.option('--all', is_flag=True, help='Clear ALL chat messages')
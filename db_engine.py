@@ -0,0 +1,253 @@
+# db_engine.py - Connection tuning, read routing, short write transactions and RETURNING helpers
+import re
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import bindparam, create_engine, event, select, text
+
+# Filled in by init_db_engine()
+_db = None
+
+# (key, dialect name) -> text() statement, see prepared_statement()
+_prepared = {}
+# How SQLAlchemy 2.0 renders an expanding IN bind before execution; checked
+# in prepared_statement() so a different rendering fails loudly
+_EXPANDING = re.compile(r'\(__\[POSTCOMPILE_(\w+)\]\)')
+
+
+def init_db_engine(app, db):
+    """Apply connection pragmas to the app's SQLite engines"""
+    global _db
+    _db = db
+
+    app.config.setdefault('SQLITE_TUNING', True)
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    app.config.setdefault('SQLITE_CACHE_SIZE_KB', 20000)
+    app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+
+    if not app.config['SQLITE_TUNING']:
+        return
+
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+    for engine in engines:
+        event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+
+
+def init_read_replica(app, db):
+    """Create the engine that @replica_reads views query.
+
+    Uses ``SQLALCHEMY_REPLICA_URI`` when set. Otherwise, for a file-backed
+    SQLite database in WAL mode, a separate pool of read-only connections
+    to the same file: WAL readers see committed data without ever taking
+    the write lock, so heavy reads stop queueing behind chat sends.
+    """
+    app.config.setdefault('SQLALCHEMY_REPLICA_URI', None)
+    app.config.setdefault('DB_READ_ROUTING', True)
+    if not app.config['DB_READ_ROUTING']:
+        return None
+
+    with app.app_context():
+        primary = db.engine
+
+    replica_uri = app.config['SQLALCHEMY_REPLICA_URI']
+    if replica_uri:
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        if replica_uri.startswith('postgresql'):
+            # Like query_only on SQLite: a replica URL that points at the primary still can't write
+            options['connect_args'] = dict(options.get('connect_args', {}),
+                                           options='-c default_transaction_read_only=on')
+        replica = create_engine(replica_uri, **options)
+    elif (primary.dialect.name == 'sqlite' and app.config['SQLITE_TUNING']
+          and primary.url.database not in (None, '', ':memory:')):
+        replica = create_engine(f'sqlite:///file:{primary.url.database}?mode=ro&uri=true')
+        event.listen(replica, 'connect', _sqlite_pragmas(app.config, read_only=True))
+    else:
+        return None
+
+    app.extensions['db_replica'] = replica
+    return replica
+
+
+def _sqlite_pragmas(config, read_only=False):
+    pragmas = [
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+    if read_only:
+        pragmas.append('PRAGMA query_only=1')
+    else:
+        pragmas[:0] = [
+            # Readers no longer block the writer (and vice versa)
+            'PRAGMA journal_mode=WAL',
+            # Safe with WAL: only the last commits can be lost on power failure, never corrupted
+            'PRAGMA synchronous=NORMAL',
+        ]
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return on_connect
+
+
+class RoutingSession(Session):
+    """Session that sends the SELECTs of @replica_reads views to the replica engine.
+
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary,
+    and once a session has written, its later reads stay on the primary
+    too (read-your-writes within a request).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['db_wrote'] = True
+            elif not self.info.get('db_wrote') and _reads_from_replica():
+                replica = current_app.extensions.get('db_replica')
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica():
+    return has_app_context() and g.get('_db_reads') == 'replica'
+
+
+def replica_reads(view):
+    """Route a read-only view's queries to the replica (see RoutingSession)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get('_db_reads')
+        g._db_reads = 'replica'
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._db_reads = previous
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside a @replica_reads view.
+
+    The read-your-writes escape hatch: use it for data the user may have
+    just changed in another request, such as unread counts right after
+    opening a chat, which a lagging replica could still show as unread.
+    """
+    previous = g.get('_db_reads')
+    g._db_reads = 'primary'
+    try:
+        yield
+    finally:
+        g._db_reads = previous
+
+
+def sqlite_pragma_values(connection):
+    """Current pragma values on a connection, for health checks and the benchmark"""
+    names = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size')
+    return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+
+
+@contextmanager
+def write_transaction():
+    """Run a block of writes as one short transaction.
+
+    Do the reads first and only the INSERT/UPDATEs inside the block. The
+    ORM flushes them at commit on exit (or rolls back on error), and
+    pysqlite only opens the transaction at the first write, so SQLite's
+    write lock is held for the flush and commit alone. Other writers
+    wait on ``busy_timeout`` rather than failing with "database is locked".
+    """
+    try:
+        yield _db.session
+        _db.session.commit()
+    except Exception:
+        _db.session.rollback()
+        raise
+
+
+def _primary_key(table):
+    return next(iter(table.primary_key.columns))
+
+
+def insert_returning(stmt, *columns):
+    """Execute a single-row INSERT and return the requested columns of the new row.
+
+    Uses ``INSERT ... RETURNING`` (PostgreSQL, SQLite 3.35+) so that
+    server- and Python-side defaults such as ids and timestamps come back
+    in the same round trip; older SQLite falls back to a SELECT by key.
+    """
+    session = _db.session
+    if _db.engine.dialect.insert_returning:
+        return session.execute(stmt.returning(*columns)).one()
+
+    new_id = session.execute(stmt).inserted_primary_key[0]
+    return session.execute(select(*columns).where(_primary_key(stmt.table) == new_id)).one()
+
+
+def prepared_statement(key, build, columns=()):
+    """Compile ``build(dialect)`` once per dialect and reuse it as a text() statement.
+
+    SQLAlchemy 2.0 keeps dialect ``INSERT ... ON CONFLICT`` constructs out
+    of its compiled cache (they have no cache key), so they are recompiled
+    on every execute. With SQLAlchemy 2.0.23 on SQLite that is about
+    2.5 ms per chat send or notification upsert, against 0.2 ms for the
+    prepared statement (``benchmark.py prepared-statements``). ``build``
+    must take each per-call value as a named ``bindparam()``
+    (``expanding=True`` for IN lists); other binds keep their compiled
+    values. ``columns`` types the RETURNING rows.
+
+    Bind names come from the compiler's ``bind_names`` and expanding binds
+    are found by their rendered placeholder (_EXPANDING); if a SQLAlchemy
+    upgrade changes either, this raises RuntimeError rather than return
+    broken SQL (tests/test_db_engine.py).
+    """
+    dialect = _db.engine.dialect
+    stmt = _prepared.get((key, dialect.name))
+    if stmt is None:
+        # Named paramstyle so the SQL round-trips through text()
+        compiled = build(dialect).compile(dialect=type(dialect)(paramstyle='named'))
+        binds = {
+            name: bindparam(name, value=bind.value, type_=bind.type, expanding=bind.expanding)
+            for bind, name in compiled.bind_names.items()
+        }
+        sql = _EXPANDING.sub(r':\1', compiled.string)
+        missing = [name for name in binds if not re.search(rf':{name}\b', sql)]
+        if missing or 'POSTCOMPILE' in sql:
+            raise RuntimeError(f'prepared_statement({key!r}): binds {missing} not rendered as :name in {sql!r}')
+        stmt = text(sql).bindparams(*binds.values())
+        if columns:
+            stmt = stmt.columns(*columns)
+        _prepared[(key, dialect.name)] = stmt
+    return stmt
+
+
+def update_returning(stmt, *columns):
+    """Execute a bulk UPDATE and return the requested columns of every changed row.
+
+    ``columns`` must include the table's primary key. Uses
+    ``UPDATE ... RETURNING`` where supported, otherwise selects the
+    matching rows first and updates exactly those.
+    """
+    session = _db.session
+    options = {'synchronize_session': False}
+    if _db.engine.dialect.update_returning:
+        return session.execute(stmt.returning(*columns), execution_options=options).all()
+
+    pk = _primary_key(stmt.table)
+    rows = session.execute(select(*columns).where(stmt.whereclause)).all()
+    if rows:
+        ids = [getattr(row, pk.key) for row in rows]
+        session.execute(stmt.where(pk.in_(ids)), execution_options=options)
+    return rows
@@ -0,0 +1,14 @@
+# extensions.py - Flask extension instances, bound to the app in create_app()
+from flask_bcrypt import Bcrypt
+from flask_login import LoginManager
+from flask_mail import Mail
+from flask_socketio import SocketIO
+
+from models import db
+
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+mail = Mail()
+socketio = SocketIO()
+
+__all__ = ['db', 'bcrypt', 'login_manager', 'mail', 'socketio']
@@ -0,0 +1,80 @@
+# factory.py - Application factory
+import os
+import secrets
+
+from flask import Flask
+
+from db_engine import init_db_engine, init_read_replica
+from migrations import ensure_schema
+from models import db
+
+
+def create_app(config_object='config.Config', web=True):
+    """Build the Flask app.
+
+    With ``web=False`` only the config and database are set up, which is
+    all CLI scripts such as clear.py need. The web app additionally gets
+    its extensions, routes, Socket.IO handlers and background jobs, each
+    imported here rather than at module load.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.config['SECRET_KEY'] = secrets.token_hex(32)  # Add session secret key
+
+    db.init_app(app)
+    init_db_engine(app, db)
+    init_read_replica(app, db)
+
+    if not web:
+        return app
+
+    from app_logging import init_logging
+    from extensions import bcrypt, login_manager, mail, socketio
+    from helpers import register_template_helpers
+    from jobs import start_background_jobs
+    from media import init_media
+    from message_ingest import init_message_ingest
+    from metrics import init_metrics
+    from models import Snap
+    from notifications import init_notifications
+    from profiler import init_profiler
+    from rate_limit import init_rate_limit
+    from routes import register_routes
+    from status_batcher import init_status_batcher
+    from typing_state import init_typing_state
+    from username_index import init_username_index
+    from video_worker import init_video_worker, requeue_pending_videos
+
+    init_logging(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'login'
+    mail.init_app(app)
+    socketio.init_app(app, cors_allowed_origins="*")
+    init_metrics(app, socketio)
+    init_rate_limit(app)
+    init_status_batcher(app, socketio)
+    init_typing_state(app, socketio)
+    init_username_index(app, db)
+    init_notifications(app, db, socketio)
+    init_media(app)
+    init_profiler(app)
+
+    # Ensure upload directories exist
+    for subdir in ('', 'snaps', 'avatars', 'videos'):
+        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], subdir), exist_ok=True)
+
+    init_video_worker(app, db, {'Snap': Snap})
+
+    register_template_helpers(app)
+    register_routes(app)
+    import sockets  # noqa: F401 - registers the Socket.IO handlers
+
+    # One SELECT on schema_version; migrations only run when it is behind
+    ensure_schema(app, db)
+    # Replays any chat ingest log left by a crash, so it needs the schema
+    init_message_ingest(app)
+    requeue_pending_videos()
+
+    app.extensions['scheduler'] = start_background_jobs(app)
+    return app
@@ -0,0 +1,393 @@
+# helpers.py - Shared helpers, email senders and template filters
+import logging
+import os
+import secrets
+import random
+import string
+from datetime import datetime
+from flask import current_app, url_for, session
+from flask_login import current_user
+from flask_mail import Message
+from werkzeug.utils import secure_filename
+from extensions import mail
+from sqlalchemy import update
+from models import Friend, Snap, ChatMessage
+from db_engine import write_transaction, update_returning
+
+log = logging.getLogger(__name__)
+
+
+# Helper Functions
+def allowed_file(filename):
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'webm', 'avi'}
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def get_file_type(filename):
+    """Determine if file is image or video based on extension"""
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if ext in ['png', 'jpg', 'jpeg', 'gif']:
+        return 'image'
+    elif ext in ['mp4', 'mov', 'webm', 'avi']:
+        return 'video'
+    return 'text'
+
+
+def generate_otp():
+    return ''.join(random.choices(string.digits, k=6))
+
+
+def generate_reset_token():
+    return secrets.token_urlsafe(32)
+
+
+def validate_password(password):
+    """Validate password against rules"""
+    errors = []
+    if len(password) < 8:
+        errors.append("Password must be at least 8 characters long")
+    if not any(c.isupper() for c in password):
+        errors.append("Password must contain at least one uppercase letter")
+    if not any(c.islower() for c in password):
+        errors.append("Password must contain at least one lowercase letter")
+    if not any(c.isdigit() for c in password):
+        errors.append("Password must contain at least one number")
+    if not any(c in "!@#$%^&*()-_=+[]{}|;:,.<>?/" for c in password):
+        errors.append("Password must contain at least one special character")
+    return errors
+
+
+def save_snap_file(file, user_id):
+    """Save snap file with proper naming and path - UPDATED"""
+    if not file:
+        return None
+    
+    # Generate unique filename
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    original_filename = secure_filename(file.filename)
+    filename = f"snap_{user_id}_{timestamp}_{original_filename}"
+    
+    # Determine file type and subdirectory
+    file_type = get_file_type(original_filename)
+    if file_type == 'video':
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'videos')
+        relative_path = f'videos/{filename}'
+    elif file_type == 'image':
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'snaps')
+        relative_path = f'snaps/{filename}'
+    else:
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'snaps')
+        relative_path = f'snaps/{filename}'
+    
+    # Ensure directory exists
+    os.makedirs(upload_dir, exist_ok=True)
+    
+    # Save file
+    filepath = os.path.join(upload_dir, filename)
+    file.save(filepath)
+    
+    return relative_path
+
+
+def mark_messages_read(sender_id, receiver_id):
+    """Mark all unread messages from sender to receiver as read; returns their ids"""
+    with write_transaction():
+        rows = update_returning(
+            update(ChatMessage)
+            .where(ChatMessage.sender_id == sender_id,
+                   ChatMessage.receiver_id == receiver_id,
+                   ChatMessage.is_read == False)
+            .values(is_read=True, status='read'),
+            ChatMessage.id
+        )
+    return [row.id for row in rows]
+
+
+def get_saved_snaps_ids(user_id):
+    """Helper function to get saved snap IDs for a user"""
+    return session.get('saved_snaps', [])
+
+
+# Add this helper function to check if text contains emojis
+def contains_emoji(text):
+    """Check if text contains emoji characters"""
+    import re
+    # Regex pattern for emojis
+    emoji_pattern = re.compile(
+        "["
+        "\U0001F600-\U0001F64F"  # emoticons
+        "\U0001F300-\U0001F5FF"  # symbols & pictographs
+        "\U0001F680-\U0001F6FF"  # transport & map symbols
+        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+        "\U00002702-\U000027B0"
+        "\U000024C2-\U0001F251"
+        "]+", flags=re.UNICODE)
+    
+    return bool(emoji_pattern.search(text))
+
+
+def send_verification_email(email, otp):
+    """Send verification email - WORKING VERSION"""
+    try:
+        print(f"📧 Attempting to send verification email to: {email}")
+        
+        msg = Message(
+            'Verify Your HabitHero Account',
+            recipients=[email],
+            sender=current_app.config['MAIL_DEFAULT_SENDER']
+        )
+        
+        # Simple HTML email that definitely works
+        msg.html = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
+                .otp-code {{ 
+                    background-color: #4F46E5; 
+                    color: white; 
+                    padding: 15px; 
+                    font-size: 24px; 
+                    font-weight: bold; 
+                    text-align: center; 
+                    letter-spacing: 5px;
+                    border-radius: 5px;
+                    margin: 20px 0;
+                }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; color: #666; font-size: 12px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h2>HabitHero</h2>
+                    <p>Email Verification Required</p>
+                </div>
+                <div class="content">
+                    <h3>Hello!</h3>
+                    <p>Please use the verification code below to complete your registration:</p>
+                    
+                    <div class="otp-code">{otp}</div>
+                    
+                    <p>This verification code will expire in {current_app.config['OTP_EXPIRY_MINUTES']} minutes.</p>
+                    
+                    <p>If you didn't request this verification, please ignore this email.</p>
+                    
+                    <div class="footer">
+                        <p>This is an automated message from HabitHero. Please do not reply to this email.</p>
+                        <p>© {datetime.utcnow().year} HabitHero. All rights reserved.</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+        
+        # Plain text version for email clients that don't support HTML
+        msg.body = f"""HabitHero Email Verification
+
+Hello!
+
+Your verification code is: {otp}
+
+This code will expire in {current_app.config['OTP_EXPIRY_MINUTES']} minutes.
+
+If you didn't request this verification, please ignore this email.
+
+--
+This is an automated message from HabitHero.
+© {datetime.utcnow().year} HabitHero. All rights reserved.
+"""
+        
+        mail.send(msg)
+        print(f"✅ Verification email sent successfully to {email}")
+        return True
+        
+    except Exception:
+        # Never log the code itself
+        log.warning('verification email failed', exc_info=True,
+                    extra={'event': 'auth.otp_email_failed', 'email': email})
+        return False
+
+
+def send_password_reset_email(email, token, username=None):
+    """Send password reset email"""
+    try:
+        reset_url = url_for('reset_password', token=token, _external=True)
+        
+        msg = Message(
+            'Reset Your HabitHero Password',
+            recipients=[email],
+            sender=current_app.config['MAIL_DEFAULT_SENDER']
+        )
+        
+        msg.html = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background-color: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
+                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
+                .button {{ 
+                    background-color: #4F46E5; 
+                    color: white; 
+                    padding: 12px 24px; 
+                    text-decoration: none; 
+                    border-radius: 5px;
+                    display: inline-block;
+                    margin: 20px 0;
+                }}
+                .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; color: #666; font-size: 12px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h2>HabitHero</h2>
+                    <p>Password Reset Request</p>
+                </div>
+                <div class="content">
+                    <h3>Hello{' ' + username if username else ''}!</h3>
+                    <p>We received a request to reset your password. Click the button below to create a new password:</p>
+                    
+                    <p>
+                        <a href="{reset_url}" class="button">Reset Password</a>
+                    </p>
+                    
+                    <p>Or copy and paste this link into your browser:</p>
+                    <p><code>{reset_url}</code></p>
+                    
+                    <p>This link will expire in {current_app.config['PASSWORD_RESET_EXPIRY_MINUTES']} minutes.</p>
+                    
+                    <p>If you didn't request a password reset, please ignore this email.</p>
+                    
+                    <div class="footer">
+                        <p>This is an automated message from HabitHero. Please do not reply to this email.</p>
+                        <p>© {datetime.utcnow().year} HabitHero. All rights reserved.</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+        
+        msg.body = f"""HabitHero Password Reset
+
+Hello{' ' + username if username else ''}!
+
+We received a request to reset your password. Use the link below to create a new password:
+
+{reset_url}
+
+This link will expire in {current_app.config['PASSWORD_RESET_EXPIRY_MINUTES']} minutes.
+
+If you didn't request a password reset, please ignore this email.
+
+--
+This is an automated message from HabitHero.
+© {datetime.utcnow().year} HabitHero. All rights reserved.
+"""
+        
+        mail.send(msg)
+        print(f"✅ Password reset email sent to {email}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ERROR sending password reset email: {e}")
+        return False
+
+
+# Template filters
+def timesince_filter(dt):
+    now = datetime.utcnow()
+    diff = now - dt
+
+    if diff.days > 365:
+        years = diff.days // 365
+        return f'{years} year{"s" if years > 1 else ""} ago'
+    elif diff.days > 30:
+        months = diff.days // 30
+        return f'{months} month{"s" if months > 1 else ""} ago'
+    elif diff.days > 0:
+        return f'{diff.days} day{"s" if diff.days > 1 else ""} ago'
+    elif diff.seconds > 3600:
+        hours = diff.seconds // 3600
+        return f'{hours} hour{"s" if hours > 1 else ""} ago'
+    elif diff.seconds > 60:
+        minutes = diff.seconds // 60
+        return f'{minutes} minute{"s" if minutes > 1 else ""} ago'
+    else:
+        return 'just now'
+
+
+def register_template_helpers(app):
+    """Register Jinja filters and the context processor"""
+
+    app.add_template_filter(timesince_filter, 'timesince')
+
+    @app.template_filter('enumerate')
+    def enumerate_filter(sequence):
+        return list(enumerate(sequence))
+
+    @app.template_filter('filter_by')
+    def filter_by(sequence, attr_name, attr_value):
+        """Filter a sequence of objects by attribute value.
+    
+        Usage in templates: {{ users|filter_by('is_online', true) }}
+        """
+        try:
+            return [item for item in sequence if getattr(item, attr_name) == attr_value]
+        except (AttributeError, TypeError):
+            return []
+
+    # Add this template filter near other template filters (around line 1700-1800)
+    @app.template_filter('get_notification_icon')
+    def get_notification_icon(text):
+        """Get appropriate icon for notification type"""
+        if not text:
+            return 'bell'
+    
+        text_lower = text.lower()
+        if 'message' in text_lower or 'chat' in text_lower:
+            return 'comment'
+        elif 'friend' in text_lower or 'request' in text_lower:
+            return 'user-plus'
+        elif 'snap' in text_lower or 'camera' in text_lower:
+            return 'camera'
+        elif 'habit' in text_lower or 'streak' in text_lower:
+            return 'fire'
+        else:
+            return 'bell'
+
+    @app.context_processor
+    def inject_context():
+        if current_user.is_authenticated:
+            # Count unviewed snaps
+            unviewed_snaps_count = Snap.query.filter_by(
+                receiver_id=current_user.id,
+                is_viewed=False
+            ).count()
+        
+            # Count pending friend requests
+            pending_friend_requests = Friend.query.filter_by(
+                friend_id=current_user.id,
+                status='pending'
+            ).count()
+        
+            # Count unread notifications (including chat messages), kept by notifications.py
+            unread_notifications = current_user.unread_notifications
+        
+            return {
+                'unviewed_snaps_count': unviewed_snaps_count,
+                'pending_friend_requests': pending_friend_requests,
+                'unread_notifications': unread_notifications,
+                'now': datetime.utcnow()
+            }
+        return {}
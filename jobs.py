@@ -0,0 +1,97 @@
+# jobs.py - Periodic background jobs
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from extensions import db, socketio
+from models import User, Snap, SnapReaction, SavedSnap, EmailVerificationOTP, PasswordResetToken, JobLock
+from db_engine import write_transaction, update_returning
+from snap_reaper import reap_expired_snaps
+from scheduler import JobScheduler, scheduler_disabled
+from admin import purge_expired_auth_records
+from notifications import prune_notifications
+from chat_service import purge_deleted_messages
+
+
+def cleanup_idle_users():
+    """Mark users as offline if they haven't been seen in 30 seconds (reduced from 1 minute)"""
+    thirty_seconds_ago = datetime.utcnow() - timedelta(seconds=30)
+    
+    # One UPDATE ... RETURNING flips them offline and returns who they were
+    with write_transaction():
+        idle_users = update_returning(
+            update(User)
+            .where(User.is_online == True, User.last_seen < thirty_seconds_ago)
+            .values(is_online=False),
+            User.id, User.username, User.last_seen
+        )
+    
+    for user in idle_users:
+        # FIXED: Use to=None instead of broadcast=True
+        socketio.emit('user_status', {
+            'user_id': user.id,
+            'status': 'offline',
+            'username': user.username,
+            'timestamp': datetime.utcnow().isoformat(),
+            'reason': 'idle',
+            'instant': True
+        }, to=None)  # Changed from broadcast=True
+        
+        print(f"⏰ Marked idle user {user.username} as offline (last seen: {user.last_seen})")
+
+
+def snap_models():
+    """Models used by the snap reaper"""
+    return {'Snap': Snap, 'SnapReaction': SnapReaction, 'SavedSnap': SavedSnap}
+
+
+def reap_snaps_job():
+    """Scheduled run of the expired-snap reaper"""
+    reap_expired_snaps(current_app, db, snap_models(),
+                       batch_size=current_app.config['SNAP_REAPER_BATCH_SIZE'])
+
+
+def purge_auth_records_job():
+    """Scheduled cleanup of expired OTPs and password reset tokens"""
+    purge_expired_auth_records(db, {
+        'EmailVerificationOTP': EmailVerificationOTP,
+        'PasswordResetToken': PasswordResetToken
+    }, grace=timedelta(hours=1))
+
+
+def prune_notifications_job():
+    """Scheduled deletion of notifications past their retention"""
+    config = current_app.config
+    metrics = prune_notifications(
+        read_retention=timedelta(days=config['NOTIFICATION_RETENTION_DAYS']),
+        unread_retention=timedelta(days=config['NOTIFICATION_UNREAD_RETENTION_DAYS']),
+        batch_size=config['NOTIFICATION_PRUNE_BATCH_SIZE']
+    )
+    if metrics['deleted']:
+        print(f"🧹 Pruned {metrics['deleted']} old notifications "
+              f"({metrics['unread_deleted']} unread) in {metrics['duration_ms']}ms")
+
+
+def purge_deleted_messages_job():
+    """Scheduled removal of chat messages deleted on both sides"""
+    metrics = purge_deleted_messages(batch_size=current_app.config['MESSAGE_PURGE_BATCH_SIZE'])
+    if metrics['deleted']:
+        print(f"🧹 Purged {metrics['deleted']} deleted messages in {metrics['duration_ms']}ms")
+
+
+def start_background_jobs(app):
+    """Create the job scheduler and start it unless this process opted out"""
+    # One scheduler thread per process, one leader per job
+    scheduler = JobScheduler(app, db, JobLock)
+    scheduler.add_job('idle_users', cleanup_idle_users, interval=60, leader_only=False)
+    scheduler.add_job('expired_snaps', reap_snaps_job, interval=app.config['SNAP_REAPER_INTERVAL'])
+    scheduler.add_job('expired_auth_records', purge_auth_records_job,
+                      interval=app.config['AUTH_RECORD_CLEANUP_INTERVAL'])
+    scheduler.add_job('notification_retention', prune_notifications_job,
+                      interval=app.config['NOTIFICATION_PRUNE_INTERVAL'])
+    scheduler.add_job('deleted_message_purge', purge_deleted_messages_job,
+                      interval=app.config['MESSAGE_PURGE_INTERVAL'])
+
+    # CLI entry points set HABITHERO_DISABLE_SCHEDULER=1 or use create_app(web=False)
+    if app.config['SCHEDULER_ENABLED'] and not scheduler_disabled():
+        scheduler.start()
+    return scheduler
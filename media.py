@@ -0,0 +1,153 @@
+# media.py - Conditional, range-aware serving of uploaded snap media
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request, send_file, url_for, abort
+from werkzeug.security import safe_join
+
+# How many file hashes to keep in memory (keyed by path, invalidated by mtime/size)
+ETAG_CACHE_SIZE = 4096
+HASH_CHUNK_SIZE = 1024 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def init_media(app):
+    """Register media defaults and template helpers on the app"""
+    app.config.setdefault('MEDIA_ACCEL_MODE', None)  # None, 'nginx' or 'sendfile'
+    app.config.setdefault('MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+    app.config.setdefault('MEDIA_MAX_AGE', 300)
+
+    app.add_template_global(media_url, 'media_url')
+
+
+def file_etag(full_path, stat=None):
+    """Strong ETag for a file, derived from a SHA-256 of its content.
+
+    Hashes are cached per path and recomputed only when the file's
+    mtime or size changes, so a video is hashed once, not per request.
+    """
+    stat = stat or os.stat(full_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _etag_lock:
+        cached = _etag_cache.get(full_path)
+        if cached and cached[0] == signature:
+            _etag_cache.move_to_end(full_path)
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:32]
+
+    with _etag_lock:
+        _etag_cache[full_path] = (signature, etag)
+        _etag_cache.move_to_end(full_path)
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+
+    return etag
+
+
+def file_version(full_path, stat=None):
+    """Short URL version for a file, from its mtime and size; a stat, no read"""
+    stat = stat or os.stat(full_path)
+    return hashlib.sha256(f'{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()[:16]
+
+
+def forget_etag(full_path):
+    """Drop a cached hash, e.g. after a file is replaced or deleted"""
+    with _etag_lock:
+        _etag_cache.pop(full_path, None)
+
+
+def resolve_upload(relative_path):
+    """Absolute path of an upload, or None if it escapes the upload folder"""
+    if not relative_path:
+        return None
+    return safe_join(current_app.config['UPLOAD_FOLDER'], relative_path)
+
+
+def media_url(relative_path):
+    """Versioned URL for an upload (``/uploads/<path>?v=<version>``).
+
+    The version comes from the file's mtime and size, so rendering a page
+    of snaps costs one stat per file rather than hashing every video.
+    Uploads are never rewritten in place, so the version changes whenever
+    the bytes do and responses for these URLs can be cached as immutable
+    by the browser.
+    """
+    if not relative_path:
+        return ''
+
+    full_path = resolve_upload(relative_path)
+    try:
+        version = file_version(full_path)
+    except (OSError, TypeError):
+        return url_for('uploaded_file', filename=relative_path)
+
+    return url_for('uploaded_file', filename=relative_path, v=version)
+
+
+def send_media(relative_path, as_attachment=False, download_name=None, mimetype=None):
+    """Serve an upload with a strong ETag, 304 handling and byte ranges.
+
+    When ``MEDIA_ACCEL_MODE`` is set the body is left to the front proxy
+    (nginx ``X-Accel-Redirect`` or Apache/lighttpd ``X-Sendfile``); the
+    app still answers conditional requests itself.
+    """
+    full_path = resolve_upload(relative_path)
+    if not full_path or not os.path.isfile(full_path):
+        abort(404)
+
+    stat = os.stat(full_path)
+    etag = file_etag(full_path, stat)
+    mimetype = mimetype or mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    accel_mode = current_app.config.get('MEDIA_ACCEL_MODE')
+
+    if accel_mode in ('nginx', 'sendfile'):
+        response = current_app.response_class(mimetype=mimetype)
+        if accel_mode == 'nginx':
+            prefix = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{relative_path.lstrip('/')}"
+        else:
+            response.headers['X-Sendfile'] = full_path
+        if as_attachment:
+            response.headers.set('Content-Disposition', 'attachment',
+                                 filename=download_name or os.path.basename(full_path))
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+    else:
+        response = send_file(
+            full_path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=stat.st_mtime,
+        )
+
+    # Uploads sit behind login, so only the browser may cache them
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if request.args.get('v') == file_version(full_path, stat):
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE']
+    response.expires = None
+
+    return response
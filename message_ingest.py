@@ -0,0 +1,258 @@
+# message_ingest.py - Write-behind chat ingestion: append-only log, bounded queue, group commit
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_queue = None
+_lock = threading.Lock()        # orders log appends with queue puts; guards the segments
+_writer_thread = None
+
+# Log segments: the open one plus sealed ones waiting for their messages to commit
+_segment = None                 # (path, file, max seq)
+_sealed = []                    # [(path, max seq)]
+_seq = 0
+_lock_file = None
+
+# Filled in by init_message_ingest()
+_app = None
+_config = {}
+
+# Counters for the benchmark and logs; updated from request threads and the writer
+_stats_lock = threading.Lock()
+stats = {'enqueued': 0, 'stored': 0, 'dropped': 0, 'batches': 0, 'max_batch': 0, 'retries': 0, 'replayed': 0}
+
+
+class IngestQueueFull(Exception):
+    """The write-behind queue is at CHAT_INGEST_QUEUE_SIZE; the send should be retried"""
+
+
+def init_message_ingest(app):
+    """Enable group-commit ingestion when ``CHAT_GROUP_COMMIT`` is set.
+
+    Sends are appended to a local log and queued, and the sender is
+    acknowledged right away. A writer thread stores whatever accumulated
+    over ``CHAT_GROUP_COMMIT_INTERVAL_MS`` (up to
+    ``CHAT_GROUP_COMMIT_MAX_BATCH`` messages) in one transaction, so a
+    burst of sends costs one commit (one fsync on SQLite) instead of one
+    each. Log entries that never made it into the database, e.g. after a
+    crash, are replayed here on the next start; replays are idempotent
+    through the messages' client_id key.
+
+    Call after the schema is current. One process per log directory.
+    """
+    global _app, _config, _queue, _lock_file
+
+    app.config.setdefault('CHAT_GROUP_COMMIT', False)
+    app.config.setdefault('CHAT_GROUP_COMMIT_INTERVAL_MS', 5)
+    app.config.setdefault('CHAT_GROUP_COMMIT_MAX_BATCH', 256)
+    app.config.setdefault('CHAT_INGEST_QUEUE_SIZE', 10000)
+    app.config.setdefault('CHAT_INGEST_LOG_DIR', os.path.join(app.instance_path, 'chat_ingest'))
+    app.config.setdefault('CHAT_INGEST_SEGMENT_BYTES', 4 * 1024 * 1024)
+    app.config.setdefault('CHAT_INGEST_FSYNC', False)
+    if not app.config['CHAT_GROUP_COMMIT']:
+        return
+
+    _app = app
+    _config = {key: app.config[key] for key in app.config if key.startswith(('CHAT_GROUP_COMMIT', 'CHAT_INGEST'))}
+    log_dir = _config['CHAT_INGEST_LOG_DIR']
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Replaying or truncating another live process's log would lose its messages
+    _lock_file = open(os.path.join(log_dir, 'lock'), 'w')
+    try:
+        fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        _lock_file.close()
+        _lock_file = None
+        log.warning('chat ingest log %s is in use by another process; group commit disabled', log_dir)
+        return
+
+    recover()
+    _queue = queue.Queue(maxsize=_config['CHAT_INGEST_QUEUE_SIZE'])
+    _open_segment()
+    _start_writer()
+
+
+def ingest_enabled():
+    return _queue is not None
+
+
+def enqueue(entry):
+    """Log ``entry`` (a JSON-safe dict) and queue it for the writer; returns it with its seq"""
+    global _seq
+    with _lock:
+        if _queue.full():
+            raise IngestQueueFull()
+        _seq += 1
+        entry = dict(entry, seq=_seq)
+        _append(entry)
+        _queue.put_nowait(entry)
+    with _stats_lock:
+        stats['enqueued'] += 1
+    return entry
+
+
+def drain(timeout=10.0):
+    """Wait until everything queued so far is stored; True if it was in time"""
+    deadline = time.monotonic() + timeout
+    while _queue is not None and _queue.unfinished_tasks:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def recover():
+    """Store log entries left by a previous run, then delete their segments"""
+    from chat_service import store_queued_messages  # chat_service imports this module
+
+    entries = []
+    paths = _segment_paths()
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Torn final write from the crash; it was never acknowledged
+                    log.warning('skipping unreadable chat ingest log line in %s', path)
+
+    batch_size = _config['CHAT_GROUP_COMMIT_MAX_BATCH']
+    with _app.app_context():
+        for start in range(0, len(entries), batch_size):
+            store_queued_messages(entries[start:start + batch_size], replay=True)
+
+    for path in paths:
+        os.remove(path)
+    if entries:
+        with _stats_lock:
+            stats['replayed'] += len(entries)
+        log.info('replayed chat ingest log', extra={'event': 'chat.ingest_replay', 'count': len(entries)})
+
+
+def shutdown_ingest(timeout=5.0):
+    """Give the writer a moment to store what's queued; anything left is replayed next start"""
+    if _queue is not None:
+        drain(timeout)
+
+
+def _segment_paths():
+    log_dir = _config['CHAT_INGEST_LOG_DIR']
+    names = [name for name in os.listdir(log_dir) if name.startswith('segment-') and name.endswith('.log')]
+    names.sort(key=lambda name: int(name[len('segment-'):-len('.log')]))
+    return [os.path.join(log_dir, name) for name in names]
+
+
+def _open_segment():
+    global _segment
+    path = os.path.join(_config['CHAT_INGEST_LOG_DIR'], f'segment-{_seq + 1}.log')
+    _segment = (path, open(path, 'a', encoding='utf-8'), _seq)
+
+
+def _append(entry):
+    global _segment
+    path, f, _ = _segment
+    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    # Reaching the OS survives a process crash; fsync also survives power loss
+    f.flush()
+    if _config['CHAT_INGEST_FSYNC']:
+        os.fsync(f.fileno())
+    _segment = (path, f, entry['seq'])
+
+
+def _checkpoint(committed_seq):
+    """Drop log data for messages up to ``committed_seq``, which are now in the database"""
+    global _sealed
+    with _lock:
+        path, f, max_seq = _segment
+        if max_seq <= committed_seq:
+            # Everything in the open segment is stored: start it over
+            f.seek(0)
+            f.truncate()
+        elif f.tell() >= _config['CHAT_INGEST_SEGMENT_BYTES']:
+            f.close()
+            _sealed.append((path, max_seq))
+            _open_segment()
+
+        done = [path for path, max_seq in _sealed if max_seq <= committed_seq]
+        _sealed = [(path, max_seq) for path, max_seq in _sealed if max_seq > committed_seq]
+    for path in done:
+        os.remove(path)
+
+
+def _start_writer():
+    global _writer_thread
+    _writer_thread = threading.Thread(target=_writer_loop, name='chat-ingest-writer', daemon=True)
+    _writer_thread.start()
+
+
+def _writer_loop():
+    interval = _config['CHAT_GROUP_COMMIT_INTERVAL_MS'] / 1000
+    max_batch = _config['CHAT_GROUP_COMMIT_MAX_BATCH']
+
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + interval
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            _store(batch)
+            _checkpoint(batch[-1]['seq'])
+        except Exception:
+            # A dead writer would leave every later send queued until restart
+            log.exception('chat ingest writer failed on a batch of %d', len(batch))
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def _store(batch):
+    from chat_service import report_failed_sends, store_queued_messages
+
+    # Only rows actually inserted count as stored: retried client_ids and
+    # sends between non-friends are skipped, failed entries are dropped
+    stored = 0
+    failed = []
+    with _app.app_context():
+        for attempt in range(3):
+            try:
+                stored = store_queued_messages(batch)
+                break
+            except Exception:
+                with _stats_lock:
+                    stats['retries'] += 1
+                log.exception('chat ingest batch of %d failed (attempt %d)', len(batch), attempt + 1)
+                time.sleep(0.05 * (attempt + 1))
+        else:
+            # Store what can be stored one by one; the rest is reported to the senders
+            for entry in batch:
+                try:
+                    stored += store_queued_messages([entry])
+                except Exception:
+                    failed.append(entry)
+                    log.exception('dropping queued chat message', extra={'event': 'chat.ingest_dropped'})
+
+    with _stats_lock:
+        stats['stored'] += stored
+        stats['dropped'] += len(failed)
+        stats['batches'] += 1
+        stats['max_batch'] = max(stats['max_batch'], len(batch))
+    if failed:
+        # Only once every entry has been tried, so a failing report can't skip any
+        with _app.app_context():
+            report_failed_sends(failed)
+
+
+atexit.register(shutdown_ingest)
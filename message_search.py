@@ -0,0 +1,147 @@
+# message_search.py - Full-text search within one chat, newest match first
+import re
+
+from markupsafe import escape
+from sqlalchemy import DateTime, Integer, Text, column, text
+
+from extensions import db
+
+# Words of the query that are searched for; the last one also matches as a prefix
+_WORD = re.compile(r'\w+')
+MAX_TERMS = 8
+
+# snippet()/_make_snippet() mark hits with these; the text is escaped before
+# they become <mark> tags, so message content can't inject markup
+_OPEN, _CLOSE = '\x02', '\x03'
+SNIPPET_TOKENS = 12
+
+# Typed so SQLite timestamps come back as datetimes
+_COLUMNS = (column('id', Integer), column('sender_id', Integer), column('timestamp', DateTime), column('snippet', Text))
+
+_VISIBLE = """
+    ((m.sender_id = :user_id AND m.deleted_for_sender IS false)
+     OR (m.receiver_id = :user_id AND m.deleted_for_receiver IS false))
+"""
+
+# One side per OR branch, like chat_service.visible_in_chat, so each can use
+# its partial index from migration 0010
+_CONVERSATION = """
+    ((m.sender_id = :user_id AND m.receiver_id = :other_id AND m.deleted_for_sender IS false)
+     OR (m.sender_id = :other_id AND m.receiver_id = :user_id AND m.deleted_for_receiver IS false))
+"""
+
+# Walks the FTS index by rowid from the cursor down, so a page stops after
+# :limit visible hits instead of sorting every match in the conversation
+_FTS_PAGE = text(f"""
+    SELECT m.id, m.sender_id, m.timestamp,
+           snippet(message_search, 0, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet
+    FROM message_search JOIN message m ON m.id = message_search.rowid
+    WHERE message_search MATCH :match AND message_search.rowid < :before AND {_VISIBLE}
+    ORDER BY message_search.rowid DESC
+    LIMIT :limit
+""").columns(*_COLUMNS)
+
+# ts_headline() would treat "<b>" in a message as markup and drop it, so the
+# snippet is cut in Python from the content, as for the LIKE fallback
+_PG_PAGE = text(f"""
+    SELECT m.id, m.sender_id, m.timestamp, m.content AS snippet
+    FROM message m
+    WHERE {_CONVERSATION}
+      AND to_tsvector('simple', m.content) @@ to_tsquery('simple', :tsquery)
+      AND m.id < :before
+    ORDER BY m.id DESC
+    LIMIT :limit
+""").columns(*_COLUMNS)
+
+_LIKE_PAGE = f"""
+    SELECT m.id, m.sender_id, m.timestamp, m.content AS snippet
+    FROM message m
+    WHERE {_CONVERSATION}
+      AND {{conditions}} AND m.id < :before
+    ORDER BY m.id DESC
+    LIMIT :limit
+"""
+
+_fts_ready = {}     # engine url -> whether the message_search table exists
+
+
+def search_messages(user_id, other_id, query, cursor=None, limit=20):
+    """One page of messages between ``user_id`` and ``other_id`` matching ``query``.
+
+    Every word must appear (the last one as a prefix, for search-as-you-type);
+    case is ignored, and on SQLite accents too. Messages the user deleted
+    for themselves are left out. Uses the index from migration 0009 (FTS5
+    on SQLite, a tsvector GIN index on PostgreSQL), or a LIKE scan of the
+    conversation on a schema that predates it.
+
+    Returns ``(results, next_cursor)``, newest first; each result's
+    ``snippet`` is HTML with the hits in <mark>. ``cursor`` is the opaque
+    string returned with the previous page; a malformed one raises ValueError.
+    """
+    terms = _WORD.findall(query)[:MAX_TERMS]
+    if not terms:
+        return [], None
+    before = int(cursor) if cursor else 2 ** 62
+    params = {'user_id': user_id, 'other_id': other_id, 'before': before, 'limit': limit + 1}
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and _has_fts_table():
+        low, high = sorted((user_id, other_id))
+        words = ' '.join(f'"{term}"' for term in terms) + '*'
+        match = f'conversation : "c{low}x{high}" AND content : ({words})'
+        rows = db.session.execute(_FTS_PAGE, dict(params, match=match)).all()
+    elif dialect == 'postgresql':
+        rows = [(row.id, row.sender_id, row.timestamp, _make_snippet(row.snippet, terms, words=True))
+                for row in db.session.execute(_PG_PAGE, dict(params, tsquery=' & '.join(terms) + ':*'))]
+    else:
+        rows = _like_page(params, terms)
+
+    results = [{
+        'id': message_id,
+        'sender_id': sender_id,
+        'is_own': sender_id == user_id,
+        'timestamp': timestamp.isoformat() + 'Z',
+        'snippet': _highlight(snippet),
+    } for message_id, sender_id, timestamp, snippet in rows[:limit]]
+    next_cursor = str(results[-1]['id']) if len(rows) > limit else None
+    return results, next_cursor
+
+
+def _like_page(params, terms):
+    conditions = []
+    for i, term in enumerate(terms):
+        params[f'term{i}'] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(f"m.content LIKE :term{i} ESCAPE '\\'")
+    query = text(_LIKE_PAGE.format(conditions=' AND '.join(conditions))).columns(*_COLUMNS)
+    return [(row.id, row.sender_id, row.timestamp, _make_snippet(row.snippet, terms))
+            for row in db.session.execute(query, params)]
+
+
+def _make_snippet(content, terms, words=False):
+    """Roughly what snippet() returns: a window of ``content`` around the first hit, hits marked
+
+    With ``words``, whole words starting with a term are marked, as a
+    tsquery matches them; otherwise any substring, as LIKE does.
+    """
+    alternatives = '|'.join(re.escape(term) for term in terms)
+    pattern = re.compile(rf'\b(?:{alternatives})\w*' if words else alternatives, re.IGNORECASE)
+    content = content.replace(_OPEN, '').replace(_CLOSE, '')
+    first = pattern.search(content)
+    start = max(0, first.start() - 40) if first else 0
+    window = content[start:start + 120]
+    marked = pattern.sub(lambda hit: f'{_OPEN}{hit.group(0)}{_CLOSE}', window)
+    return ('…' if start else '') + marked + ('…' if start + 120 < len(content) else '')
+
+
+def _highlight(snippet):
+    html = str(escape(snippet or ''))
+    return html.replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def _has_fts_table():
+    url = str(db.engine.url)
+    if url not in _fts_ready:
+        _fts_ready[url] = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_search'"
+        )).first() is not None
+    return _fts_ready[url]
@@ -0,0 +1,332 @@
+# metrics.py - Request, Socket.IO, DB pool and job metrics served from /metrics
+import hmac
+import inspect
+import threading
+import time
+import weakref
+from functools import wraps
+
+from flask import Response, current_app, g, request
+
+# Latency buckets in seconds (Prometheus histogram convention)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ShardedValues:
+    """Per-thread value shards, summed when scraped.
+
+    Each thread only ever writes to its own dict, so the hot path takes no
+    lock: ``shard[key] += 1`` on a dict nobody else writes is safe under the
+    GIL. The lock is only taken when a thread writes its first sample and
+    at scrape time, when shards of finished threads are folded into
+    ``_retired`` so per-request threads don't pile up.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []   # (weakref to owning thread, values)
+        self._retired = {}
+
+    def shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), values))
+                if len(self._shards) > 256:
+                    self._fold_dead()
+            return values
+
+    def _fold_dead(self):
+        alive = []
+        for owner, values in self._shards:
+            thread = owner()
+            if thread is not None and thread.is_alive():
+                alive.append((owner, values))
+            else:
+                _merge(self._retired, values)
+        self._shards = alive
+
+    def snapshot(self):
+        with self._lock:
+            self._fold_dead()
+            totals = {key: list(value) for key, value in self._retired.items()}
+            for _, values in self._shards:
+                _merge(totals, values)
+        return totals
+
+
+def _merge(into, values):
+    # dict.items() -> list is a single step under the GIL, so owners can keep writing
+    for key, value in list(values.items()):
+        current = into.get(key)
+        if current is None:
+            into[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                current[i] += v
+
+
+_values = _ShardedValues()
+_metrics = {}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _slot(self, labelvalues, size):
+        shard = _values.shard()
+        key = (self.name, labelvalues)
+        slot = shard.get(key)
+        if slot is None:
+            slot = shard[key] = [0] * size
+        return slot
+
+    def samples(self, snapshot):
+        """(suffix, labels, value) tuples for the text exposition"""
+        for (name, labelvalues), value in snapshot.items():
+            if name == self.name:
+                yield '', dict(zip(self.labelnames, labelvalues)), value[0]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        self._slot(labelvalues, 1)[0] += amount
+
+
+class Gauge(_Metric):
+    """Gauge built from per-thread deltas; inc() and dec() may happen on different threads"""
+    kind = 'gauge'
+
+    def inc(self, *labelvalues, amount=1):
+        self._slot(labelvalues, 1)[0] += amount
+
+    def dec(self, *labelvalues, amount=1):
+        self._slot(labelvalues, 1)[0] -= amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        # Slot layout: one count per bucket, then +Inf (= count), then sum
+        slot = self._slot(labelvalues, len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                slot[i] += 1
+                break
+        slot[-2] += 1
+        slot[-1] += value
+
+    def samples(self, snapshot):
+        for (name, labelvalues), value in snapshot.items():
+            if name != self.name:
+                continue
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets, value):
+                cumulative += count
+                yield '_bucket', dict(labels, le=repr(float(bound))), cumulative
+            yield '_bucket', dict(labels, le='+Inf'), value[-2]
+            yield '_count', labels, value[-2]
+            yield '_sum', labels, value[-1]
+
+
+http_requests = Counter(
+    'habithero_http_requests_total', 'HTTP requests by endpoint, method and status',
+    ('endpoint', 'method', 'status'))
+http_latency = Histogram(
+    'habithero_http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ('endpoint', 'method'))
+socket_events = Counter(
+    'habithero_socketio_events_total', 'Socket.IO events handled, by event name', ('event',))
+socket_errors = Counter(
+    'habithero_socketio_event_errors_total', 'Socket.IO handlers that raised, by event name', ('event',))
+socket_latency = Histogram(
+    'habithero_socketio_event_duration_seconds', 'Socket.IO handler latency by event name', ('event',))
+socket_connected = Gauge(
+    'habithero_socketio_connected', 'Currently connected Socket.IO clients')
+
+
+def init_metrics(app, socketio):
+    """Time every request and Socket.IO handler and register /metrics"""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    instrument_socketio(socketio)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text exposition of all metrics"""
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            # Closed until a token is configured; the metrics name every endpoint
+            return Response('Set METRICS_TOKEN to enable /metrics\n', status=403, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(current_app), mimetype='text/plain; version=0.0.4')
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        # Unmatched URLs share one label so 404 scans can't blow up cardinality
+        endpoint = request.endpoint or 'unmatched'
+        http_latency.observe(time.perf_counter() - started, endpoint, request.method)
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+
+def instrument_socketio(socketio):
+    """Make ``@socketio.on`` time each handler it registers.
+
+    Must run before the handlers are registered (before ``import sockets``).
+    """
+    if getattr(socketio, '_metrics_instrumented', False):
+        return
+    register = socketio.on
+
+    def on(message, namespace=None):
+        def decorator(handler):
+            register(message, namespace)(_timed_handler(message, handler))
+            return handler
+        return decorator
+
+    socketio.on = on
+    socketio._metrics_instrumented = True
+
+
+def _timed_handler(message, handler):
+    # Flask-SocketIO calls connect handlers as handler(auth), then handler() on
+    # TypeError; check the arity up front so that probe isn't timed as an event
+    signature = inspect.signature(handler) if message == 'connect' else None
+
+    @wraps(handler)
+    def timed(*args):
+        if signature is not None:
+            signature.bind(*args)
+        started = time.perf_counter()
+        try:
+            result = handler(*args)
+        except Exception:
+            socket_errors.inc(message)
+            raise
+        finally:
+            socket_latency.observe(time.perf_counter() - started, message)
+            socket_events.inc(message)
+
+        if message == 'connect' and result is not False:
+            socket_connected.inc()
+        elif message == 'disconnect':
+            socket_connected.dec()
+        return result
+
+    return timed
+
+
+def render_metrics(app):
+    """All metrics in the Prometheus text format"""
+    snapshot = _values.snapshot()
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        samples = list(metric.samples(snapshot))
+        if not samples and not metric.labelnames:
+            samples = [('', {}, 0)]
+        for suffix, labels, value in samples:
+            lines.append(_sample(metric.name + suffix, labels, value))
+
+    lines.extend(_pool_metrics(app))
+    lines.extend(_job_metrics(app))
+    return '\n'.join(lines) + '\n'
+
+
+def _sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f'{name}{{{rendered}}} {value}'
+    return f'{name} {value}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _pool_metrics(app):
+    """Connection pool stats for the primary and (if any) replica engine"""
+    from extensions import db
+
+    with app.app_context():
+        engines = {'primary': db.engine}
+    if app.extensions.get('db_replica') is not None:
+        engines['replica'] = app.extensions['db_replica']
+
+    stats = {
+        'habithero_db_pool_size': ('gauge', 'Configured pool size', 'size'),
+        'habithero_db_pool_checked_out': ('gauge', 'Connections currently in use', 'checkedout'),
+        'habithero_db_pool_checked_in': ('gauge', 'Idle connections in the pool', 'checkedin'),
+        'habithero_db_pool_overflow': ('gauge', 'Connections open beyond pool_size', 'overflow'),
+    }
+    lines = []
+    for name, (kind, documentation, method) in stats.items():
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for label, engine in engines.items():
+            # StaticPool/NullPool (in-memory SQLite, tests) don't track these
+            getter = getattr(engine.pool, method, None)
+            if getter is not None:
+                # QueuePool.overflow() counts up from -pool_size
+                lines.append(_sample(name, {'engine': label}, max(getter(), 0)))
+    return lines
+
+
+def _job_metrics(app):
+    """Run counts and durations from the background job scheduler"""
+    scheduler = app.extensions.get('scheduler')
+    jobs = scheduler.stats() if scheduler is not None else []
+    timings = {job['name']: scheduler.jobs[job['name']] for job in jobs}
+
+    series = [
+        ('habithero_job_runs_total', 'counter', 'Background job runs',
+         lambda stats, job: stats['runs']),
+        ('habithero_job_failures_total', 'counter', 'Background job runs that raised',
+         lambda stats, job: stats['failures']),
+        ('habithero_job_skipped_total', 'counter', 'Runs skipped because another worker holds the lease',
+         lambda stats, job: stats['skipped']),
+        ('habithero_job_duration_seconds_total', 'counter', 'Total time spent running each job',
+         lambda stats, job: job.total_duration_ms / 1000),
+        ('habithero_job_last_duration_seconds', 'gauge', 'Duration of the most recent run',
+         lambda stats, job: (stats['last_duration_ms'] or 0) / 1000),
+        ('habithero_job_max_duration_seconds', 'gauge', 'Longest run since startup',
+         lambda stats, job: stats['max_duration_ms'] / 1000),
+    ]
+    lines = []
+    for name, kind, documentation, value in series:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for stats in jobs:
+            lines.append(_sample(name, {'job': stats['name']}, value(stats, timings[stats['name']])))
+    return lines
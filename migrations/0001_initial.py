@@ -0,0 +1,153 @@
+# 0001_initial.py - Baseline schema, including columns older databases lack
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text,
+                        UniqueConstraint)
+
+from migrations import add_missing_columns
+
+VERSION = 1
+DESCRIPTION = 'Create tables and add columns previously patched in at startup'
+
+# The schema as this migration shipped it, frozen here rather than taken
+# from models.py: later columns and indexes come from their own migrations
+metadata = MetaData()
+
+Table(
+    'user', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), nullable=False),
+    Column('password_hash', String(200), nullable=False),
+    Column('is_verified', Boolean),
+    Column('bio', Text),
+    Column('avatar', String(200)),
+    Column('created_at', DateTime),
+    Column('last_seen', DateTime),
+    Column('is_online', Boolean),
+)
+
+Table(
+    'habit', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('name', String(100), nullable=False),
+    Column('description', Text),
+    Column('frequency', String(20)),
+    Column('streak_count', Integer),
+    Column('best_streak', Integer),
+    Column('last_completed', DateTime),
+    Column('created_at', DateTime),
+)
+
+Table(
+    'habit_log', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('habit_id', Integer, ForeignKey('habit.id'), nullable=False),
+    Column('completed_at', DateTime),
+    Column('note', Text),
+)
+
+Table(
+    'friend', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('friend_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('status', String(20)),
+    Column('created_at', DateTime),
+    UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+)
+
+Table(
+    'snap', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('sender_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('receiver_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('habit_id', Integer, ForeignKey('habit.id')),
+    Column('content_type', String(20)),
+    Column('content', Text),
+    Column('caption', String(200)),
+    Column('is_viewed', Boolean),
+    Column('expires_at', DateTime, nullable=False),
+    Column('created_at', DateTime),
+    Column('transcode_status', String(20)),
+    Column('poster', String(200)),
+)
+
+Table(
+    'snap_reaction', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('snap_id', Integer, ForeignKey('snap.id'), nullable=False),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('emoji', String(10), nullable=False),
+    Column('created_at', DateTime),
+)
+
+Table(
+    'saved_snap', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('snap_id', Integer, ForeignKey('snap.id'), nullable=False),
+    Column('saved_at', DateTime),
+    UniqueConstraint('user_id', 'snap_id', name='unique_saved_snap'),
+)
+
+Table(
+    'email_verification_otp', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(120), nullable=False),
+    Column('otp', String(6), nullable=False),
+    Column('is_verified', Boolean),
+    Column('created_at', DateTime),
+    Column('expires_at', DateTime, nullable=False),
+)
+
+Table(
+    'password_reset_token', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('token', String(100), unique=True, nullable=False),
+    Column('created_at', DateTime),
+    Column('expires_at', DateTime, nullable=False),
+)
+
+Table(
+    'job_lock', metadata,
+    Column('name', String(100), primary_key=True),
+    Column('owner', String(100), nullable=False),
+    Column('expires_at', DateTime, nullable=False),
+)
+
+Table(
+    'message', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('sender_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('receiver_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('timestamp', DateTime),
+    Column('is_read', Boolean),
+    Column('status', String(20)),
+    Column('edited', Boolean),
+    Column('is_forwarded', Boolean),
+    Column('original_message_id', Integer),
+    Column('deleted_for_sender', Boolean),
+    Column('deleted_for_receiver', Boolean),
+)
+
+Table(
+    'notification', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('text', String(500), nullable=False),
+    Column('link', String(200)),
+    Column('is_read', Boolean),
+    Column('timestamp', DateTime),
+)
+
+
+def upgrade(conn):
+    # Existing databases keep their tables; only missing ones are created
+    metadata.create_all(conn, checkfirst=True)
+
+    add_missing_columns(conn, 'user', [('bio', 'TEXT'), ('avatar', 'VARCHAR(200)')])
+    add_missing_columns(conn, 'snap', [('transcode_status', 'VARCHAR(20)'), ('poster', 'VARCHAR(200)')])
+    add_missing_columns(conn, 'message', [('status', "VARCHAR(20) DEFAULT 'sent'")])
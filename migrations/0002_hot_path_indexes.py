@@ -0,0 +1,35 @@
+# 0002_hot_path_indexes.py - Indexes for chat, notification, snap and friend lookups
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, String, Table
+
+from migrations import create_index_online
+
+VERSION = 2
+DESCRIPTION = 'Add indexes for conversations, unread counts, snaps, friends and habit logs'
+
+# Built one at a time with CREATE INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+# Just the indexed columns, as they were when this migration shipped
+metadata = MetaData()
+message = Table('message', metadata, Column('sender_id', Integer), Column('receiver_id', Integer),
+                Column('timestamp', DateTime), Column('is_read', Boolean))
+notification = Table('notification', metadata, Column('user_id', Integer), Column('is_read', Boolean))
+snap = Table('snap', metadata, Column('receiver_id', Integer), Column('is_viewed', Boolean),
+             Column('expires_at', DateTime))
+friend = Table('friend', metadata, Column('friend_id', Integer), Column('status', String(20)))
+habit_log = Table('habit_log', metadata, Column('user_id', Integer), Column('completed_at', DateTime))
+
+INDEXES = [
+    Index('ix_message_conversation', message.c.sender_id, message.c.receiver_id, message.c.timestamp),
+    Index('ix_message_unread', message.c.receiver_id, message.c.is_read),
+    Index('ix_notification_user_unread', notification.c.user_id, notification.c.is_read),
+    Index('ix_snap_receiver_viewed', snap.c.receiver_id, snap.c.is_viewed),
+    Index('ix_snap_expires_at', snap.c.expires_at),
+    Index('ix_friend_friend_status', friend.c.friend_id, friend.c.status),
+    Index('ix_habit_log_user_completed', habit_log.c.user_id, habit_log.c.completed_at),
+]
+
+
+def upgrade(conn):
+    for index in INDEXES:
+        create_index_online(conn, index)
@@ -0,0 +1,20 @@
+# 0003_notification_unread_counts.py - Per-user unread notification counter
+from sqlalchemy import Boolean, Integer, column, func, select, table, update
+
+from migrations import add_missing_columns
+
+VERSION = 3
+DESCRIPTION = 'Add user.unread_notifications and backfill it from the notification table'
+
+user = table('user', column('id', Integer), column('unread_notifications', Integer))
+notification = table('notification', column('id', Integer), column('user_id', Integer), column('is_read', Boolean))
+
+
+def upgrade(conn):
+    add_missing_columns(conn, 'user', [('unread_notifications', 'INTEGER NOT NULL DEFAULT 0')])
+
+    unread = select(func.count(notification.c.id)).where(
+        notification.c.user_id == user.c.id,
+        notification.c.is_read == False  # noqa: E712
+    ).scalar_subquery()
+    conn.execute(update(user).values(unread_notifications=unread))
@@ -0,0 +1,73 @@
+# 0004_grouped_notifications.py - One rolling notification per (user, kind, source)
+from sqlalchemy import Boolean, Integer, String, column, delete, func, select, table, update
+
+from migrations import add_missing_columns
+
+VERSION = 4
+DESCRIPTION = 'Add notification kind/source_id/count and collapse old chat notifications'
+
+# notifications.KIND_CHAT_MESSAGE / KIND_CHAT_FORWARD when this shipped
+KIND_CHAT_MESSAGE = 'chat_message'
+KIND_CHAT_FORWARD = 'chat_forward'
+
+user = table('user', column('id', Integer), column('unread_notifications', Integer))
+notification = table(
+    'notification', column('id', Integer), column('user_id', Integer), column('text', String),
+    column('link', String), column('is_read', Boolean), column('kind', String), column('source_id', Integer),
+    column('count', Integer),
+)
+
+# Legacy texts, matched by prefix/suffix; the username sits in between
+LEGACY_TEXTS = {
+    KIND_CHAT_MESSAGE: ('💬 New message from ', '', '💬 {count} new messages from {username}'),
+    KIND_CHAT_FORWARD: ('📨 ', ' forwarded you a message', '📨 {username} forwarded you {count} messages'),
+}
+
+
+def upgrade(conn):
+    add_missing_columns(conn, 'notification', [
+        ('kind', 'VARCHAR(30)'),
+        ('source_id', 'INTEGER'),
+        ('count', 'INTEGER NOT NULL DEFAULT 1'),
+    ])
+
+    groups = {}
+    rows = conn.execute(
+        select(notification.c.id, notification.c.user_id, notification.c.text, notification.c.link, notification.c.is_read)
+        .where(notification.c.kind.is_(None), notification.c.link.like('/chat/%'))
+        .order_by(notification.c.id)
+    )
+    for row in rows:
+        for kind, (prefix, suffix, _) in LEGACY_TEXTS.items():
+            if row.text.startswith(prefix) and row.text.endswith(suffix):
+                break
+        else:
+            continue
+        source_id = row.link[len('/chat/'):]
+        if not source_id.isdigit():
+            continue
+        groups.setdefault((row.user_id, kind, int(source_id)), []).append(row)
+
+    # Keep the newest row of each group, counting the unread ones it stands for
+    for (user_id, kind, source_id), group in groups.items():
+        prefix, suffix, grouped_text = LEGACY_TEXTS[kind]
+        latest = group[-1]
+        unread = sum(1 for row in group if not row.is_read)
+        username = latest.text[len(prefix):len(latest.text) - len(suffix)]
+
+        conn.execute(update(notification).where(notification.c.id == latest.id).values(
+            kind=kind,
+            source_id=source_id,
+            count=max(unread, 1),
+            is_read=unread == 0,
+            text=grouped_text.format(count=unread, username=username) if unread > 1 else latest.text,
+        ))
+        stale = [row.id for row in group[:-1]]
+        for start in range(0, len(stale), 500):
+            conn.execute(delete(notification).where(notification.c.id.in_(stale[start:start + 500])))
+
+    unread = select(func.count(notification.c.id)).where(
+        notification.c.user_id == user.c.id,
+        notification.c.is_read == False  # noqa: E712
+    ).scalar_subquery()
+    conn.execute(update(user).values(unread_notifications=unread))
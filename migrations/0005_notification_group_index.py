@@ -0,0 +1,19 @@
+# 0005_notification_group_index.py - Unique key the grouped notification upsert targets
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table
+
+from migrations import create_index_online
+
+VERSION = 5
+DESCRIPTION = 'Add unique index on notification (user_id, kind, source_id)'
+
+# CREATE UNIQUE INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+notification = Table('notification', MetaData(), Column('user_id', Integer), Column('kind', String(30)),
+                     Column('source_id', Integer))
+INDEX = Index('ux_notification_user_kind_source', notification.c.user_id, notification.c.kind,
+              notification.c.source_id, unique=True)
+
+
+def upgrade(conn):
+    create_index_online(conn, INDEX)
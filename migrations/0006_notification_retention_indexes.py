@@ -0,0 +1,22 @@
+# 0006_notification_retention_indexes.py - Indexes for paged notification feeds and retention pruning
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table
+
+from migrations import create_index_online
+
+VERSION = 6
+DESCRIPTION = 'Add notification (user_id, timestamp, id) and (timestamp) indexes'
+
+# CREATE INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+notification = Table('notification', MetaData(), Column('id', Integer), Column('user_id', Integer),
+                     Column('timestamp', DateTime))
+INDEXES = [
+    Index('ix_notification_user_timestamp', notification.c.user_id, notification.c.timestamp, notification.c.id),
+    Index('ix_notification_timestamp', notification.c.timestamp),
+]
+
+
+def upgrade(conn):
+    for index in INDEXES:
+        create_index_online(conn, index)
@@ -0,0 +1,19 @@
+# 0007_message_client_id.py - Idempotency key for chat sends
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table
+
+from migrations import add_missing_columns, create_index_online
+
+VERSION = 7
+DESCRIPTION = 'Add message.client_id with a unique (sender_id, client_id) index'
+
+# CREATE UNIQUE INDEX CONCURRENTLY on PostgreSQL; existing rows have NULL
+# client_id, which never conflicts
+TRANSACTIONAL = False
+
+message = Table('message', MetaData(), Column('sender_id', Integer), Column('client_id', String(64)))
+INDEX = Index('ux_message_sender_client', message.c.sender_id, message.c.client_id, unique=True)
+
+
+def upgrade(conn):
+    add_missing_columns(conn, 'message', [('client_id', 'VARCHAR(64)')])
+    create_index_online(conn, INDEX)
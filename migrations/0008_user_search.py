@@ -0,0 +1,55 @@
+# 0008_user_search.py - Substring search index over usernames and bios
+from sqlalchemy import Column, Index, MetaData, String, Table, text
+
+from migrations import create_index_online
+
+VERSION = 8
+DESCRIPTION = 'Add the user search index (FTS5 trigram on SQLite, pg_trgm on PostgreSQL) and user.email index'
+
+# CREATE INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+user = Table('user', MetaData(), Column('email', String(120)))
+EMAIL_INDEX = Index('ix_user_email', user.c.email)
+
+# External-content FTS5 table: it stores only the index and reads rows from
+# "user"; the triggers keep it in step (updates only when username/bio change)
+SQLITE_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "username, bio, content='user', content_rowid='id', tokenize='trigram')",
+
+    'CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON "user" BEGIN '
+    "INSERT INTO user_search (rowid, username, bio) VALUES (new.id, new.username, new.bio); END",
+
+    'CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON "user" BEGIN '
+    "INSERT INTO user_search (user_search, rowid, username, bio) "
+    "VALUES ('delete', old.id, old.username, old.bio); END",
+
+    'CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username, bio ON "user" BEGIN '
+    "INSERT INTO user_search (user_search, rowid, username, bio) "
+    "VALUES ('delete', old.id, old.username, old.bio); "
+    "INSERT INTO user_search (rowid, username, bio) VALUES (new.id, new.username, new.bio); END",
+
+    # Index the users that already exist
+    "INSERT INTO user_search (user_search) VALUES ('rebuild')",
+]
+
+POSTGRESQL_STATEMENTS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_username_trgm ON "user" USING gin (username gin_trgm_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_bio_trgm ON "user" USING gin (bio gin_trgm_ops)',
+]
+
+
+def upgrade(conn):
+    create_index_online(conn, EMAIL_INDEX)
+
+    if conn.dialect.name == 'postgresql':
+        statements = POSTGRESQL_STATEMENTS
+    elif conn.dialect.name == 'sqlite':
+        statements = SQLITE_STATEMENTS
+    else:
+        return
+    for statement in statements:
+        conn.execute(text(statement))
+    print("   + user search index")
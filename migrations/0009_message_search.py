@@ -0,0 +1,56 @@
+# 0009_message_search.py - Full-text index over chat messages
+from sqlalchemy import text
+
+VERSION = 9
+DESCRIPTION = 'Add the chat message search index (FTS5 on SQLite, tsvector GIN on PostgreSQL)'
+
+# CREATE INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+# The conversation key ("c<lower id>x<higher id>") is indexed next to the
+# content so a search stays inside one chat without a join. FTS5 reads
+# external content through the view; the triggers keep the index in step
+# (edits only touch it when the content changes). Delete-for-me flags are
+# applied at query time, see message_search.py.
+_CONVERSATION = "'c' || min({0}.sender_id, {0}.receiver_id) || 'x' || max({0}.sender_id, {0}.receiver_id)"
+
+SQLITE_STATEMENTS = [
+    "CREATE VIEW IF NOT EXISTS message_search_source AS "
+    f"SELECT id, content, {_CONVERSATION.format('message')} AS conversation FROM message",
+
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+    "content, conversation, content='message_search_source', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS message_search_insert AFTER INSERT ON message BEGIN "
+    f"INSERT INTO message_search (rowid, content, conversation) VALUES (new.id, new.content, {_CONVERSATION.format('new')}); END",
+
+    "CREATE TRIGGER IF NOT EXISTS message_search_delete AFTER DELETE ON message BEGIN "
+    "INSERT INTO message_search (message_search, rowid, content, conversation) "
+    f"VALUES ('delete', old.id, old.content, {_CONVERSATION.format('old')}); END",
+
+    "CREATE TRIGGER IF NOT EXISTS message_search_update AFTER UPDATE OF content ON message BEGIN "
+    "INSERT INTO message_search (message_search, rowid, content, conversation) "
+    f"VALUES ('delete', old.id, old.content, {_CONVERSATION.format('old')}); "
+    f"INSERT INTO message_search (rowid, content, conversation) VALUES (new.id, new.content, {_CONVERSATION.format('new')}); END",
+
+    # Index the messages that already exist
+    "INSERT INTO message_search (message_search) VALUES ('rebuild')",
+]
+
+POSTGRESQL_STATEMENTS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_content_fts "
+    "ON message USING gin (to_tsvector('simple', content))",
+]
+
+
+def upgrade(conn):
+    if conn.dialect.name == 'postgresql':
+        statements = POSTGRESQL_STATEMENTS
+    elif conn.dialect.name == 'sqlite':
+        statements = SQLITE_STATEMENTS
+    else:
+        return
+    for statement in statements:
+        conn.execute(text(statement))
+    print("   + message search index")
@@ -0,0 +1,43 @@
+# 0010_message_soft_delete.py - Partial indexes for per-user soft-deleted chat messages
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, Table, text
+
+from migrations import create_index_online
+
+VERSION = 10
+DESCRIPTION = 'Backfill message.deleted_for_*, add partial indexes on visible and purgeable messages, ' \
+              'drop ix_message_conversation'
+
+# CREATE/DROP INDEX CONCURRENTLY on PostgreSQL
+TRANSACTIONAL = False
+
+message = Table('message', MetaData(), Column('id', Integer), Column('sender_id', Integer),
+                Column('receiver_id', Integer), Column('timestamp', DateTime),
+                Column('deleted_for_sender', Boolean), Column('deleted_for_receiver', Boolean))
+_sent_visible = message.c.deleted_for_sender.is_(False)
+_received_visible = message.c.deleted_for_receiver.is_(False)
+_purgeable = message.c.deleted_for_sender.is_(True) & message.c.deleted_for_receiver.is_(True)
+
+INDEXES = [
+    Index('ix_message_sent_visible', message.c.sender_id, message.c.receiver_id, message.c.timestamp,
+          sqlite_where=_sent_visible, postgresql_where=_sent_visible),
+    Index('ix_message_received_visible', message.c.receiver_id, message.c.sender_id, message.c.timestamp,
+          sqlite_where=_received_visible, postgresql_where=_received_visible),
+    Index('ix_message_purgeable', message.c.id, sqlite_where=_purgeable, postgresql_where=_purgeable),
+]
+
+
+def upgrade(conn):
+    # Reads filter on "IS false", which a NULL flag would fail; the ORM
+    # writes False, but rows inserted some other way may have NULLs
+    for column in ('deleted_for_sender', 'deleted_for_receiver'):
+        conn.execute(text(f'UPDATE message SET {column} = false WHERE {column} IS NULL'))
+
+    for index in INDEXES:
+        create_index_online(conn, index)
+
+    # Same columns as the visible-message indexes, over every row: SQLite
+    # would pick it for chat reads as often as not, and it's one more
+    # index to write per message
+    concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+    conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS ix_message_conversation'))
+    print("   - index ix_message_conversation")
@@ -0,0 +1,180 @@
+# migrations/__init__.py - Versioned schema migrations and their runner
+#
+# Each module in this package named NNNN_description.py defines VERSION,
+# DESCRIPTION and upgrade(conn). Applied versions are recorded in the
+# schema_version table, so startup only needs one SELECT to know whether
+# the schema is current. Run pending migrations offline with:
+#
+#     python migrate_database.py upgrade
+import importlib
+import pkgutil
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+    Column('duration_ms', Integer),
+)
+
+_migrations = None
+
+
+def load_migrations():
+    """Migration modules in version order"""
+    global _migrations
+    if _migrations is None:
+        modules = [
+            importlib.import_module(f'{__name__}.{info.name}')
+            for info in pkgutil.iter_modules(__path__)
+            if info.name[:4].isdigit()
+        ]
+        modules.sort(key=lambda module: module.VERSION)
+        versions = [module.VERSION for module in modules]
+        if len(set(versions)) != len(versions):
+            raise RuntimeError(f'Duplicate migration versions: {versions}')
+        _migrations = modules
+    return _migrations
+
+
+def latest_version():
+    migrations = load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+
+def current_version(engine):
+    """Highest applied version, 0 for an empty schema_version, None if it doesn't exist"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except DBAPIError:
+        return None
+
+
+def pending_migrations(engine, target=None):
+    version = current_version(engine) or 0
+    return [
+        module for module in load_migrations()
+        if module.VERSION > version and (target is None or module.VERSION <= target)
+    ]
+
+
+def upgrade(engine, target=None, verbose=True):
+    """Apply every pending migration up to ``target`` (default: latest)"""
+    schema_version.create(engine, checkfirst=True)
+    applied = []
+
+    for module in pending_migrations(engine, target):
+        if verbose:
+            print(f"⬆️  Migration {module.VERSION:04d}: {module.DESCRIPTION}")
+        started = time.perf_counter()
+
+        if getattr(module, 'TRANSACTIONAL', True):
+            with engine.begin() as conn:
+                module.upgrade(conn)
+        else:
+            # e.g. CREATE INDEX CONCURRENTLY, which can't run inside a transaction
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                module.upgrade(conn)
+
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        try:
+            with engine.begin() as conn:
+                conn.execute(schema_version.insert().values(
+                    version=module.VERSION,
+                    description=module.DESCRIPTION,
+                    duration_ms=duration_ms,
+                ))
+        except IntegrityError:
+            # Another process applied it at the same time; migrations are idempotent
+            pass
+        applied.append(module.VERSION)
+
+    if verbose:
+        print(f"✓ Database schema at version {current_version(engine)}")
+    return applied
+
+
+def ensure_schema(app, db):
+    """Startup check: one SELECT, migrating only when the schema is behind"""
+    with app.app_context():
+        engine = db.engine
+        version = current_version(engine)
+        latest = latest_version()
+        if version is not None and version >= latest:
+            return version
+
+        if not app.config.get('MIGRATE_ON_STARTUP', True):
+            print(f"⚠️ Database schema is at version {version or 0}, code expects {latest}. "
+                  f"Run: python migrate_database.py upgrade")
+            return version
+
+        upgrade(engine)
+        return latest_version()
+
+
+# Helpers for migration modules
+
+def add_missing_columns(conn, table_name, columns):
+    """ALTER TABLE ... ADD COLUMN for each (name, type) the table doesn't have yet.
+
+    Identifiers are quoted by the dialect (``user`` is reserved on
+    PostgreSQL); column types must be SQL both SQLite and PostgreSQL accept.
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        return
+
+    existing = {col['name'] for col in inspector.get_columns(table_name)}
+    quote = conn.dialect.identifier_preparer.quote
+
+    for column_name, column_type in columns:
+        if column_name not in existing:
+            conn.execute(text(
+                f'ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} {column_type}'
+            ))
+            print(f"   + {table_name}.{column_name}")
+
+
+def create_index_online(conn, index):
+    """Build an index without blocking writers where the database allows it.
+
+    PostgreSQL uses ``CREATE INDEX CONCURRENTLY`` (the migration must set
+    ``TRANSACTIONAL = False``) and rebuilds an index left invalid by an
+    earlier interrupted build. SQLite has no online index builds, so it
+    is a plain ``CREATE INDEX IF NOT EXISTS``; writers wait on
+    ``busy_timeout`` for the duration of the build. A partial index keeps
+    its ``sqlite_where`` / ``postgresql_where`` clause.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    name = quote(index.name)
+    columns = ', '.join(quote(column.name) for column in index.columns)
+    unique = 'UNIQUE ' if index.unique else ''
+    concurrently = ''
+
+    if conn.dialect.name == 'postgresql':
+        concurrently = 'CONCURRENTLY '
+        invalid = conn.execute(text(
+            'SELECT NOT i.indisvalid FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name'
+        ), {'name': index.name}).scalar()
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+    # Partial indexes: the index's sqlite_where / postgresql_where, rendered
+    # the way CREATE INDEX wants it (bare column names, literal values)
+    where = index.dialect_options[conn.dialect.name]['where'] if conn.dialect.name in ('sqlite', 'postgresql') else None
+    if where is not None:
+        compiler = conn.dialect.ddl_compiler(conn.dialect, None).sql_compiler
+        where = ' WHERE ' + compiler.process(where, include_table=False, literal_binds=True)
+
+    conn.execute(text(
+        f'CREATE {unique}INDEX {concurrently}IF NOT EXISTS {name} '
+        f'ON {quote(index.table.name)} ({columns}){where or ""}'
+    ))
+    print(f"   + index {index.name}")
@@ -0,0 +1,210 @@
+# models.py - Database models (schema changes live in migrations/)
+from datetime import datetime
+
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+
+from db_engine import RoutingSession
+
+# Importing this module is all a CLI needs to work with the database
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), nullable=False)  # Changed from unique=True to allow multiple accounts
+    password_hash = db.Column(db.String(200), nullable=False)
+    is_verified = db.Column(db.Boolean, default=False)
+    bio = db.Column(db.Text, default='')  # Add this back
+    avatar = db.Column(db.String(200), default=None)  # Add this back
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    is_online = db.Column(db.Boolean, default=False)
+    # Kept in step with the notification table by notifications.py
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    saved_snaps = db.relationship('SavedSnap', backref='saving_user', lazy=True)
+    
+    # Relationships
+    habits = db.relationship('Habit', backref='user', lazy=True, cascade='all, delete-orphan')
+    habit_logs = db.relationship('HabitLog', backref='user', lazy=True, cascade='all, delete-orphan')
+    sent_snaps = db.relationship('Snap', foreign_keys='Snap.sender_id', backref='sender', lazy=True)
+    received_snaps = db.relationship('Snap', foreign_keys='Snap.receiver_id', backref='receiver', lazy=True)
+    sent_friend_requests = db.relationship('Friend', foreign_keys='Friend.user_id', backref='sender', lazy=True)
+    received_friend_requests = db.relationship('Friend', foreign_keys='Friend.friend_id', backref='receiver', lazy=True)
+    snap_reactions = db.relationship('SnapReaction', backref='user', lazy=True)
+
+    # Friend search by email address (the search index itself is migration 0008)
+    __table_args__ = (db.Index('ix_user_email', 'email'),)
+
+
+class Habit(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    frequency = db.Column(db.String(20), default='daily')
+    streak_count = db.Column(db.Integer, default=0)
+    best_streak = db.Column(db.Integer, default=0)
+    last_completed = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    logs = db.relationship('HabitLog', backref='habit', lazy=True, cascade='all, delete-orphan')
+    snaps = db.relationship('Snap', backref='habit', lazy=True)
+
+
+class HabitLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=False)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    note = db.Column(db.Text)
+    
+    __table_args__ = (db.Index('ix_habit_log_user_completed', 'user_id', 'completed_at'),)
+
+
+class Friend(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    friend_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, accepted, blocked
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+        db.Index('ix_friend_friend_status', 'friend_id', 'status'),
+    )
+
+
+class Snap(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=True)
+    content_type = db.Column(db.String(20))  # image, video, text
+    content = db.Column(db.Text)  # file path or text
+    caption = db.Column(db.String(200))
+    is_viewed = db.Column(db.Boolean, default=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    transcode_status = db.Column(db.String(20))  # video only, see video_worker.py
+    poster = db.Column(db.String(200))  # poster frame path for videos
+    
+    __table_args__ = (
+        db.Index('ix_snap_receiver_viewed', 'receiver_id', 'is_viewed'),
+        db.Index('ix_snap_expires_at', 'expires_at'),
+    )
+    
+    # Relationships
+    reactions = db.relationship('SnapReaction', backref='snap', lazy=True, cascade='all, delete-orphan')
+
+
+class SnapReaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    snap_id = db.Column(db.Integer, db.ForeignKey('snap.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    emoji = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SavedSnap(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    snap_id = db.Column(db.Integer, db.ForeignKey('snap.id'), nullable=False)
+    saved_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'snap_id', name='unique_saved_snap'),)
+    
+    # Relationships
+    user = db.relationship('User', backref='saved_snap_entries')
+    snap = db.relationship('Snap', backref='saved_by_users')
+
+
+class EmailVerificationOTP(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False)
+    otp = db.Column(db.String(6), nullable=False)
+    is_verified = db.Column(db.Boolean, default=False)  # Add this
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class PasswordResetToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    token = db.Column(db.String(100), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class JobLock(db.Model):
+    """Lease row used by scheduler.py so only one worker runs each job"""
+    __tablename__ = 'job_lock'
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class ChatMessage(db.Model):
+    __tablename__ = 'message'
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    is_read = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), default='sent')
+
+    edited = db.Column(db.Boolean, default=False)
+    is_forwarded = db.Column(db.Boolean, default=False)
+    original_message_id = db.Column(db.Integer, nullable=True)  
+    deleted_for_sender = db.Column(db.Boolean, default=False)
+    deleted_for_receiver = db.Column(db.Boolean, default=False)
+    # Client-generated idempotency key (chat.js temp_id); a retried send
+    # with the same key returns the stored message (chat_service.send_message)
+    client_id = db.Column(db.String(64))
+    
+    __table_args__ = (
+        db.Index('ix_message_unread', 'receiver_id', 'is_read'),
+        db.Index('ux_message_sender_client', 'sender_id', 'client_id', unique=True),
+        # Chat reads go through these (chat_service.visible_in_chat): one per
+        # side of a conversation, holding only the rows that side still sees.
+        # They replaced ix_message_conversation (migration 0010)
+        db.Index('ix_message_sent_visible', 'sender_id', 'receiver_id', 'timestamp',
+                 sqlite_where=deleted_for_sender.is_(False), postgresql_where=deleted_for_sender.is_(False)),
+        db.Index('ix_message_received_visible', 'receiver_id', 'sender_id', 'timestamp',
+                 sqlite_where=deleted_for_receiver.is_(False), postgresql_where=deleted_for_receiver.is_(False)),
+        # Rows deleted on both sides, for chat_service.purge_deleted_messages
+        db.Index('ix_message_purgeable', 'id',
+                 sqlite_where=deleted_for_sender.is_(True) & deleted_for_receiver.is_(True),
+                 postgresql_where=deleted_for_sender.is_(True) & deleted_for_receiver.is_(True)),
+    )
+    
+    sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
+    receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+
+
+class Notification(db.Model):
+    __tablename__ = 'notification'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    text = db.Column(db.String(500), nullable=False)
+    link = db.Column(db.String(200))
+    is_read = db.Column(db.Boolean, default=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Grouped notifications (see notifications.notify_grouped): one row per
+    # (user, kind, source) whose count and timestamp roll forward
+    kind = db.Column(db.String(30))
+    source_id = db.Column(db.Integer)
+    count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __table_args__ = (
+        db.Index('ix_notification_user_unread', 'user_id', 'is_read'),
+        db.Index('ux_notification_user_kind_source', 'user_id', 'kind', 'source_id', unique=True),
+        # Keyset pages of a user's feed, and oldest-first retention pruning
+        db.Index('ix_notification_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_notification_timestamp', 'timestamp'),
+    )
+    
+    user = db.relationship('User', backref='notifications')
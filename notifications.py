@@ -0,0 +1,336 @@
+# notifications.py - Notification delivery with incremental unread counts pushed over Socket.IO
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import (DateTime, Integer, String, bindparam, case, cast, delete, event, func, inspect, literal,
+                        or_, select, tuple_, update)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db_engine import prepared_statement, update_returning
+from models import Notification, User
+
+# Kinds of grouped notifications; source_id is the other user's id
+KIND_CHAT_MESSAGE = 'chat_message'
+KIND_CHAT_FORWARD = 'chat_forward'
+CHAT_KINDS = (KIND_CHAT_MESSAGE, KIND_CHAT_FORWARD)
+
+# Filled in by init_notifications()
+_db = None
+_socketio = None
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Metrics from the most recent prune, for the admin endpoint and logs
+last_prune_metrics = {}
+
+
+def init_notifications(app, db, socketio):
+    """Keep ``User.unread_notifications`` current and push it on every change.
+
+    Any Notification the ORM inserts, marks read/unread or deletes adjusts
+    the recipient's counter in the same flush (so it commits or rolls back
+    with the change), and once the transaction commits the new count goes
+    out as ``notification_count_update`` to the user's room. Bulk
+    ``UPDATE``/``DELETE`` statements bypass the ORM events, so those go
+    through notify_grouped(), mark_grouped_read(), mark_all_read() or
+    recount() here, which adjust the counter themselves.
+    """
+    global _db, _socketio
+    _db = db
+    _socketio = socketio
+
+    if not event.contains(db.session, 'after_flush', _count_changes):
+        event.listen(db.session, 'after_flush', _count_changes)
+        event.listen(db.session, 'after_commit', _push_counts)
+        event.listen(db.session, 'after_rollback', _discard_counts)
+
+
+def notify(user_id, text, link=None):
+    """Add a notification to the current transaction; the count is pushed on commit"""
+    notification = Notification(user_id=user_id, text=text, link=link)
+    _db.session.add(notification)
+    return notification
+
+
+def notify_grouped(user_id, kind, source_id, text, grouped_text, link=None, amount=1):
+    """Upsert the one rolling notification for (user, kind, source).
+
+    The first event inserts ``text``; later ones while it is still unread
+    bump its count and timestamp and switch to ``grouped_text`` with
+    ``{count}`` filled in ("💬 3 new messages from bob"). Once read, the
+    next event starts it over at 1. A 200-message conversation therefore
+    keeps a single notification row instead of 200. ``amount`` counts
+    several events at once (a group-committed batch).
+    """
+    return notify_grouped_many([user_id], kind, source_id, text, grouped_text, link, amount).get(user_id)
+
+
+def notify_grouped_many(user_ids, kind, source_id, text, grouped_text, link=None, amount=1):
+    """notify_grouped() for several recipients in one statement; returns {user_id: notification id}"""
+    session = _db.session
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    prefix, _, suffix = grouped_text.partition('{count}')
+    if amount > 1:
+        text = f'{prefix}{amount}{suffix}'
+    table = Notification.__table__
+    columns = (table.c.id, table.c.user_id, table.c.count)
+    result = session.execute(prepared_statement('notify_grouped', _build_notify_grouped, columns), {
+        'user_ids': user_ids, 'kind': kind, 'source_id': source_id, 'text': text, 'link': link,
+        'timestamp': datetime.utcnow(), 'prefix': prefix, 'suffix': suffix, 'amount': amount,
+    })
+    if _db.engine.dialect.insert_returning:
+        rows = result.all()
+    else:
+        rows = session.execute(select(*columns).where(
+            table.c.user_id.in_(user_ids), table.c.kind == kind, table.c.source_id == source_id
+        )).all()
+
+    # count == amount means it was created or reopened, i.e. one more unread for the badge
+    _adjust_unread(session, {row.user_id: 1 for row in rows if row.count == amount})
+    return {row.user_id: row.id for row in rows}
+
+
+def _build_notify_grouped(dialect):
+    """INSERT ... SELECT FROM user WHERE id IN (...) ON CONFLICT bump, for prepared_statement()"""
+    table = Notification.__table__
+    insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert(table).from_select(
+        ['user_id', 'kind', 'source_id', 'text', 'link', 'is_read', 'count', 'timestamp'],
+        select(
+            User.id,
+            bindparam('kind', type_=String),
+            bindparam('source_id', type_=Integer),
+            bindparam('text', type_=String),
+            bindparam('link', type_=String),
+            literal(False),
+            bindparam('amount', type_=Integer),
+            bindparam('timestamp', type_=DateTime),
+        ).where(User.id.in_(bindparam('user_ids', expanding=True, type_=Integer)))
+    )
+
+    restart = table.c.is_read == True  # noqa: E712
+    amount = bindparam('amount', type_=Integer)
+    new_count = case((restart, amount), else_=table.c.count + amount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.kind, table.c.source_id],
+        set_={
+            'count': new_count,
+            'text': case((restart, stmt.excluded.text),
+                         else_=bindparam('prefix', type_=String) + cast(new_count, String)
+                         + bindparam('suffix', type_=String)),
+            'link': stmt.excluded.link,
+            'timestamp': stmt.excluded.timestamp,
+            'is_read': False,
+        }
+    )
+    if dialect.insert_returning:
+        stmt = stmt.returning(table.c.id, table.c.user_id, table.c.count)
+    return stmt
+
+
+def mark_grouped_read(user_id, kinds, source_id):
+    """Mark a user's grouped notifications from one source read, by exact key"""
+    session = _db.session
+    rows = update_returning(
+        update(Notification)
+        .where(Notification.user_id == user_id,
+               Notification.kind.in_(kinds),
+               Notification.source_id == source_id,
+               Notification.is_read == False)  # noqa: E712
+        .values(is_read=True),
+        Notification.id
+    )
+    if rows:
+        _adjust_unread(session, {user_id: -len(rows)})
+    return len(rows)
+
+
+def mark_all_read(user_id):
+    """Mark all of a user's notifications read with one UPDATE and zero the counter"""
+    session = _db.session
+    session.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)  # noqa: E712
+        .values(is_read=True),
+        execution_options={'synchronize_session': False}
+    )
+    session.execute(
+        update(User).where(User.id == user_id).values(unread_notifications=0),
+        execution_options={'synchronize_session': False}
+    )
+    _pending(session)[user_id] = 0
+
+
+def recount(user_ids):
+    """Reset counters from the notification table, e.g. after a bulk DELETE"""
+    session = _db.session
+    counts = {}
+    for user_id in set(user_ids):
+        count = session.execute(
+            select(func.count(Notification.id)).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False  # noqa: E712
+            )
+        ).scalar()
+        session.execute(
+            update(User).where(User.id == user_id).values(unread_notifications=count),
+            execution_options={'synchronize_session': False}
+        )
+        counts[user_id] = count
+    _pending(session).update(counts)
+    return counts
+
+
+def page_notifications(user_id, cursor=None, limit=30):
+    """One page of a user's notifications, newest first, and the cursor for the next.
+
+    Keyset pagination on (timestamp, id) walks ``ix_notification_user_timestamp``
+    from the cursor, so every page costs the same however many notifications
+    the account has. ``cursor`` is the opaque string returned with the
+    previous page; a malformed one raises ValueError.
+    """
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if cursor:
+        timestamp, notification_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Notification.timestamp, Notification.id) < (timestamp, notification_id))
+
+    rows = query.order_by(Notification.timestamp.desc(), Notification.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def encode_cursor(notification):
+    micros = (notification.timestamp - _EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{notification.id}'
+
+
+def decode_cursor(cursor):
+    """``(timestamp, id)`` from an encode_cursor() string; ValueError if it's malformed or out of range"""
+    micros, _, notification_id = cursor.partition('-')
+    notification_id = int(notification_id)
+    if not 0 <= notification_id < 2 ** 63:
+        raise ValueError(f'notification id out of range: {notification_id}')
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), notification_id
+    except OverflowError:
+        raise ValueError(f'cursor timestamp out of range: {micros}') from None
+
+
+def prune_notifications(read_retention, unread_retention, batch_size=1000, max_batches=None):
+    """Delete notifications past their retention in bounded batches.
+
+    Read notifications go after ``read_retention`` and unread ones after
+    ``unread_retention`` (both timedeltas, measured from the latest
+    activity, since grouped rows roll their timestamp forward). Candidates
+    come off ``ix_notification_timestamp`` oldest first, and each batch is
+    one short ``DELETE ... WHERE id IN (...)`` transaction that also takes
+    the deleted unread rows off their owners' counters.
+    """
+    global last_prune_metrics
+
+    session = _db.session
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    read_before = now - read_retention
+    unread_before = now - max(unread_retention, read_retention)
+    metrics = {'deleted': 0, 'unread_deleted': 0, 'batches': 0}
+
+    candidates = select(Notification.id, Notification.user_id, Notification.is_read).where(
+        Notification.timestamp < read_before,
+        or_(Notification.is_read == True, Notification.timestamp < unread_before)  # noqa: E712
+    ).order_by(Notification.timestamp).limit(batch_size)
+
+    while max_batches is None or metrics['batches'] < max_batches:
+        rows = session.execute(candidates).all()
+        if not rows:
+            break
+
+        unread = Counter(row.user_id for row in rows if not row.is_read)
+        try:
+            metrics['deleted'] += session.execute(
+                delete(Notification).where(Notification.id.in_([row.id for row in rows])),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            _adjust_unread(session, {user_id: -count for user_id, count in unread.items()})
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        metrics['unread_deleted'] += sum(unread.values())
+        metrics['batches'] += 1
+        if len(rows) < batch_size:
+            break
+
+    metrics['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    last_prune_metrics = dict(metrics, finished_at=datetime.utcnow().isoformat())
+    return metrics
+
+
+def _pending(session):
+    return session.info.setdefault('notification_counts', {})
+
+
+def _count_changes(session, flush_context):
+    deltas = Counter()
+    stale = set()
+
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            deltas[obj.user_id] += 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Notification):
+            continue
+        history = inspect(obj).attrs.is_read.history
+        if not history.has_changes():
+            continue
+        if not history.deleted:
+            # Previous value was never loaded; count from the table instead
+            stale.add(obj.user_id)
+        elif bool(history.deleted[0]) != bool(obj.is_read):
+            deltas[obj.user_id] += -1 if obj.is_read else 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and not obj.is_read:
+            deltas[obj.user_id] -= 1
+
+    _adjust_unread(session, {user_id: delta for user_id, delta in deltas.items() if user_id not in stale})
+    if stale:
+        recount(stale)
+
+
+def _adjust_unread(session, deltas):
+    """Apply {user_id: delta} to the counters and remember the new values for the push"""
+    # One UPDATE per distinct delta, so fanning out to many users stays one statement
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(user_id)
+
+    for delta, user_ids in by_delta.items():
+        rows = update_returning(
+            update(User).where(User.id.in_(user_ids))
+            .values(unread_notifications=User.unread_notifications + delta),
+            User.id, User.unread_notifications
+        )
+        for row in rows:
+            _pending(session)[row.id] = max(row.unread_notifications, 0)
+
+
+def _push_counts(session):
+    counts = session.info.pop('notification_counts', None)
+    if not counts or _socketio is None:
+        return
+    for user_id, count in counts.items():
+        _socketio.emit('notification_count_update', {'count': count}, room=f'user_{user_id}')
+
+
+def _discard_counts(session):
+    session.info.pop('notification_counts', None)
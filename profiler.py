@@ -0,0 +1,220 @@
+# profiler.py - Per-request SQL query profiler and N+1 detector
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, jsonify, render_template, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Collapse "IN (?, ?, ?)" / "IN (%(p_1)s, ...)" lists so batch sizes don't split shapes
+_IN_LIST = re.compile(r'\(\s*(?:\?|%\([^)]*\)s|:\w+)(?:\s*,\s*(?:\?|%\([^)]*\)s|:\w+))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_enabled = False
+_lock = threading.Lock()
+
+# endpoint -> aggregate stats, plus the slowest recent requests
+_endpoints = {}
+_recent = deque(maxlen=50)
+
+# Filled in by init_profiler()
+_config = {}
+
+
+def init_profiler(app):
+    """Register request hooks and the /admin/perf page; start enabled if configured"""
+    app.config.setdefault('QUERY_PROFILER_ENABLED', False)
+    app.config.setdefault('QUERY_PROFILER_N_PLUS_ONE', 5)
+    app.config.setdefault('QUERY_PROFILER_SERVER_TIMING', True)
+    _config.update(
+        n_plus_one=app.config['QUERY_PROFILER_N_PLUS_ONE'],
+        server_timing=app.config['QUERY_PROFILER_SERVER_TIMING'],
+    )
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    register_profiler_routes(app)
+
+    if app.config['QUERY_PROFILER_ENABLED']:
+        enable()
+
+
+def enable():
+    """Attach the cursor listeners; until then the profiler costs nothing per query"""
+    global _enabled
+    with _lock:
+        if not _enabled:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _enabled = True
+
+
+def disable():
+    global _enabled
+    with _lock:
+        if _enabled:
+            event.remove(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.remove(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+        _recent.clear()
+
+
+def statement_shape(statement):
+    """Normalize a SQL statement so repeated queries with different values compare equal"""
+    return _IN_LIST.sub('(?...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_profile' in g:
+        conn.info['profiler_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('profiler_started', None)
+    if started is None or not has_request_context() or 'query_profile' not in g:
+        return
+    elapsed = time.perf_counter() - started
+    profile = g.query_profile
+    profile['queries'] += 1
+    profile['db_time'] += elapsed
+    profile['shapes'][statement_shape(statement)] += 1
+
+
+def _start_request():
+    if _enabled:
+        g.query_profile = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'db_time': 0.0,
+            'shapes': Counter(),
+        }
+
+
+def _finish_request(response):
+    profile = g.pop('query_profile', None)
+    if profile is None:
+        return response
+
+    total_ms = (time.perf_counter() - profile['started']) * 1000
+    db_ms = profile['db_time'] * 1000
+    suspects = {
+        shape: count for shape, count in profile['shapes'].items()
+        if count >= _config['n_plus_one']
+    }
+
+    if _config['server_timing']:
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{profile["queries"]} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms - db_ms:.1f}')
+        if suspects:
+            response.headers.add('Server-Timing', f'n1;desc="{len(suspects)} repeated statements"')
+
+    _record(request.endpoint or request.path, request.method, request.path,
+            profile['queries'], db_ms, total_ms, suspects)
+    return response
+
+
+def _record(endpoint, method, path, queries, db_ms, total_ms, suspects):
+    with _lock:
+        stats = _endpoints.get(endpoint)
+        if stats is None:
+            stats = _endpoints[endpoint] = {
+                'endpoint': endpoint,
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_ms': 0.0,
+                'total_ms': 0.0,
+                'n_plus_one': Counter(),
+            }
+        stats['requests'] += 1
+        stats['queries'] += queries
+        stats['max_queries'] = max(stats['max_queries'], queries)
+        stats['db_ms'] += db_ms
+        stats['total_ms'] += total_ms
+        for shape, count in suspects.items():
+            stats['n_plus_one'][shape] = max(stats['n_plus_one'][shape], count)
+
+        _recent.append({
+            'endpoint': endpoint,
+            'method': method,
+            'path': path,
+            'queries': queries,
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+            'n_plus_one': len(suspects),
+            'at': time.time(),
+        })
+
+
+def report():
+    """Per-endpoint aggregates, worst DB time first"""
+    with _lock:
+        endpoints = [
+            {
+                'endpoint': stats['endpoint'],
+                'requests': stats['requests'],
+                'avg_queries': round(stats['queries'] / stats['requests'], 1),
+                'max_queries': stats['max_queries'],
+                'avg_db_ms': round(stats['db_ms'] / stats['requests'], 1),
+                'avg_total_ms': round(stats['total_ms'] / stats['requests'], 1),
+                'n_plus_one': [
+                    {'statement': shape, 'max_repeats': count}
+                    for shape, count in stats['n_plus_one'].most_common(5)
+                ],
+            }
+            for stats in _endpoints.values()
+        ]
+        recent = list(_recent)
+
+    endpoints.sort(key=lambda e: e['avg_db_ms'] * e['requests'], reverse=True)
+    return {
+        'enabled': _enabled,
+        'n_plus_one_threshold': _config['n_plus_one'],
+        'endpoints': endpoints,
+        'recent': sorted(recent, key=lambda r: r['total_ms'], reverse=True)[:20],
+    }
+
+
+def register_profiler_routes(app):
+    """Register the /admin/perf page and its toggle"""
+
+    @app.route('/admin/perf')
+    @login_required
+    def admin_perf():
+        """Query counts, DB time and N+1 suspects per endpoint"""
+        if not getattr(current_user, 'is_admin', False):
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+
+        data = report()
+        if request.args.get('format') == 'json':
+            return jsonify(data)
+        return render_template('admin/perf.html', **data)
+
+    @app.route('/admin/perf/toggle', methods=['POST'])
+    @login_required
+    def admin_perf_toggle():
+        """Turn the profiler on or off at runtime (per process)"""
+        if not getattr(current_user, 'is_admin', False):
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+
+        action = request.form.get('action') or (request.get_json(silent=True) or {}).get('action')
+        if action == 'reset':
+            reset()
+        elif action == 'enable' or (action is None and not _enabled):
+            enable()
+        else:
+            disable()
+
+        return jsonify({'success': True, 'enabled': _enabled})
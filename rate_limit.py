@@ -0,0 +1,190 @@
+# rate_limit.py - Token-bucket rate limits for routes and Socket.IO handlers
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+from flask_login import current_user
+from flask_socketio import emit
+
+from metrics import Counter
+
+log = logging.getLogger(__name__)
+
+rate_limit_rejections = Counter(
+    'habithero_rate_limit_rejections_total', 'Requests and Socket.IO events refused by a rate limit', ('limit',))
+
+# Filled in by init_rate_limit(); without it the decorators let everything through
+_store = None
+_limits = {}
+
+
+class MemoryBucketStore:
+    """Token buckets in this process; enough for a single worker"""
+
+    backend = 'memory'
+
+    def __init__(self):
+        self._buckets = {}  # key -> [tokens, last update, time it's full again] (monotonic)
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, rate, capacity, cost=1):
+        """Take ``cost`` tokens; returns (allowed, seconds until they'd be available)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            bucket[:] = [tokens, now, now + (capacity - tokens) / rate]
+
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                self._prune(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as no bucket
+        full = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in full:
+            del self._buckets[key]
+
+
+# KEYS[1] = bucket; ARGV = rate, capacity, cost. Uses the server clock so
+# workers on different hosts agree; returns {allowed, retry_after}
+_REDIS_TAKE = """
+local rate, capacity, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed, retry = 0, 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets in Redis (or anything speaking its protocol), shared by all workers"""
+
+    backend = 'redis'
+
+    def __init__(self, url, prefix='habithero:ratelimit:'):
+        import redis  # optional: only needed for RATE_LIMIT_STORAGE_URL=redis://...
+
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self._prefix = prefix
+
+    def take(self, key, rate, capacity, cost=1):
+        try:
+            allowed, retry = self._take(keys=[self._prefix + key], args=[rate, capacity, cost])
+        except Exception as e:
+            # Losing the limiter shouldn't take the site down with it
+            log.warning('rate limit store unavailable: %s', e, extra={'event': 'rate_limit.store_error'})
+            return True, 0.0
+        return bool(allowed), float(retry)
+
+
+def init_rate_limit(app):
+    """Pick the bucket store and load the limits.
+
+    RATE_LIMITS maps a limit name to ``(requests, per_seconds)``; the
+    bucket holds ``requests`` tokens and refills at requests/per_seconds.
+    Buckets live in this process unless RATE_LIMIT_STORAGE_URL points at a
+    Redis-compatible server, which several workers need to share limits.
+    """
+    global _store, _limits
+    app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    app.config.setdefault('RATE_LIMIT_STORAGE_URL', None)
+    app.config.setdefault('RATE_LIMITS', {})
+    if not app.config['RATE_LIMIT_ENABLED']:
+        _store = None
+        return
+
+    _limits = dict(app.config['RATE_LIMITS'])
+    url = app.config['RATE_LIMIT_STORAGE_URL']
+    if url:
+        try:
+            _store = RedisBucketStore(url)
+        except ImportError:
+            log.warning('RATE_LIMIT_STORAGE_URL is set but the redis package is missing; '
+                        'using per-process rate limits')
+            _store = MemoryBucketStore()
+    else:
+        _store = MemoryBucketStore()
+
+
+def check_limit(name, identity, cost=1):
+    """Take from the ``name`` bucket of ``identity``; returns (allowed, retry_after seconds)"""
+    limit = _limits.get(name)
+    if _store is None or limit is None:
+        return True, 0.0
+    requests, per_seconds = limit
+    allowed, retry_after = _store.take(f'{name}:{identity}', requests / per_seconds, requests, cost)
+    if not allowed:
+        rate_limit_rejections.inc(name)
+        log.info('rate limited', extra={'event': 'rate_limit.rejected', 'limit': name, 'key': identity})
+    return allowed, retry_after
+
+
+def rate_limit(name, key='user'):
+    """Refuse a Flask route with 429 once the caller's ``name`` bucket is empty.
+
+    ``key`` is 'user' (the logged-in user, else the client IP) or 'ip'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def limited(*args, **kwargs):
+            allowed, retry_after = check_limit(name, _identity(key))
+            if not allowed:
+                response = jsonify({'success': False, 'message': 'Too many requests, please slow down'})
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response, 429
+            return view(*args, **kwargs)
+        return limited
+    return decorator
+
+
+def socket_rate_limit(name, error_event=None, key='user'):
+    """Drop a Socket.IO event once the caller's ``name`` bucket is empty.
+
+    With ``error_event`` the client is told, echoing the event's temp_id
+    so it can mark that message failed.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def limited(data=None, *args):
+            allowed, retry_after = check_limit(name, _identity(key))
+            if not allowed:
+                if error_event:
+                    emit(error_event, {
+                        'error': 'Too many requests, please slow down',
+                        'temp_id': data.get('temp_id') if isinstance(data, dict) else None,
+                        'retry_after': round(retry_after, 1)
+                    })
+                return
+            return handler(data, *args)
+        return limited
+    return decorator
+
+
+def _identity(key):
+    if key == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
@@ -0,0 +1,49 @@
+# routes/__init__.py - Registers every HTTP route on the app
+import os
+
+from flask import render_template, send_from_directory
+from flask_login import login_required
+
+from extensions import db
+from media import send_media
+
+
+def register_routes(app):
+    """Import the route modules and register their routes on the app"""
+    from routes.auth import register_auth_routes
+    from routes.main import register_main_routes
+    from routes.friends import register_friend_routes
+    from routes.snaps import register_snap_routes
+    from routes.chat import register_chat_routes
+
+    register_auth_routes(app)
+    register_main_routes(app)
+    register_friend_routes(app)
+    register_snap_routes(app)
+    register_chat_routes(app)
+
+    # Serve uploaded files
+    @app.route('/uploads/<path:filename>')
+    @login_required
+    def uploaded_file(filename):
+        """Serve uploads with ETag/304 and byte-range support (see media.py)"""
+        return send_media(filename)
+
+    @app.route('/favicon.ico')
+    def favicon():
+        """Serve the favicon"""
+        return send_from_directory(
+            os.path.join(app.root_path, 'static'),
+            'favicon.ico',
+            mimetype='image/vnd.microsoft.icon'
+        )
+
+    # Error Handlers
+    @app.errorhandler(404)
+    def not_found_error(error):
+        return render_template('errors/404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        return render_template('errors/500.html'), 500
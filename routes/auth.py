@@ -0,0 +1,738 @@
+# routes/auth.py - Login, registration, email verification and password reset
+import logging
+import re
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, redirect, url_for, flash, session
+from flask_login import login_user, login_required, logout_user, current_user
+from extensions import db, bcrypt, login_manager
+from models import User, EmailVerificationOTP, PasswordResetToken
+from rate_limit import rate_limit
+from username_index import suggest_usernames, username_taken
+from helpers import generate_otp, generate_reset_token, validate_password, send_verification_email, send_password_reset_email
+
+log = logging.getLogger(__name__)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    if not user_id or user_id == 'None' or user_id == 'null':
+        return None
+    
+    try:
+        return User.query.get(int(user_id))
+    except (ValueError, TypeError):
+        return None
+
+def register_auth_routes(app):
+    """Register authentication routes"""
+
+    @app.route('/login', methods=['GET', 'POST'])
+    def login():
+        # If already logged in, go to dashboard
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+
+        if request.method == 'POST':
+            email = request.form.get('email')
+            password = request.form.get('password')
+            account_id = request.form.get('account_id')
+            remember = True if request.form.get('remember') else False
+
+            # STEP 1: If account_id is NOT provided → go to account selection
+            if not account_id:
+                if not email:
+                    flash('Email is required.', 'danger')
+                    return redirect(url_for('login'))
+
+                accounts = User.query.filter_by(email=email).all()
+
+                if not accounts:
+                    flash('No account found with this email.', 'danger')
+                    return redirect(url_for('login'))
+
+                # Redirect to account selection
+                return redirect(url_for('login_select', email=email))
+
+            # STEP 2: Account-specific login
+            user = User.query.filter_by(id=account_id, email=email).first()
+
+            if not user:
+                flash('Account not found.', 'danger')
+                return redirect(url_for('login'))
+
+            # STEP 3: Check password
+            if not bcrypt.check_password_hash(user.password_hash, password):
+                flash('Invalid password.', 'danger')
+                return redirect(
+                    url_for('login_account_page', account_id=account_id, email=email)
+                )
+
+            # STEP 4: Check verification
+            if not user.is_verified:
+                flash('Please verify your email before logging in.', 'warning')
+                return redirect(url_for('login'))
+
+            # STEP 5: Login user
+            login_user(user, remember=remember)
+
+            user.last_seen = datetime.utcnow()
+            user.is_online = True
+            db.session.commit()
+
+            # Optional (safe)
+            session['login_email'] = email
+
+            flash('Login successful!', 'success')
+            return redirect(url_for('dashboard'))
+
+        # GET request → show login page
+        return render_template('auth/login.html')
+
+    @app.route('/login/select')
+    def login_select():
+        """Page to select account when multiple accounts exist for an email"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = request.args.get('email')
+        if not email:
+            return redirect(url_for('login'))
+    
+        # Get existing accounts for this email
+        existing_accounts = User.query.filter_by(email=email).all()
+    
+        if not existing_accounts:
+            return redirect(url_for('login'))
+    
+        return render_template('auth/login_select.html', 
+                             email=email, 
+                             accounts=existing_accounts)
+
+    @app.route('/login-account/<int:account_id>')
+    def login_account_page(account_id):
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+
+        email = request.args.get('email')
+        if not email:
+            return redirect(url_for('login'))
+
+        account = User.query.filter_by(id=account_id, email=email).first()
+        if not account:
+            flash('Account not found.', 'danger')
+            return redirect(url_for('login'))
+
+        return render_template(
+            'auth/login_account.html',
+            email=email,
+            account=account
+        )
+
+    @app.route('/register', methods=['GET', 'POST'])
+    def register():
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+
+        if request.method == 'POST':
+            email = request.form.get('email')
+            username = request.form.get('username')
+
+            if not email or not username:
+                flash('Email and username are required.', 'danger')
+                return redirect(url_for('register'))
+
+            if username_taken(username):
+                flash('Username already taken.', 'danger')
+                return redirect(url_for('register'))
+
+            # Save registration context
+            session['reg_email'] = email
+            session['reg_username'] = username
+
+            # Go directly to create account page
+            return redirect(url_for('create_account_page'))
+
+        return render_template('auth/register.html')
+
+    @app.route('/register/complete')
+    def register_complete():
+        """Handle post-verification account selection or creation"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = session.get('reg_email')
+        if not email:
+            return redirect(url_for('register'))
+    
+        # Check if OTP was verified
+        otp_record = EmailVerificationOTP.query.filter_by(email=email).first()
+        if not otp_record:
+            flash('Please verify your email first.', 'warning')
+            return redirect(url_for('register'))
+    
+        # Check for existing accounts
+        existing_accounts = User.query.filter_by(email=email).all()
+    
+        return render_template('auth/register_complete.html', 
+                             email=email, 
+                             accounts=existing_accounts)
+
+    @app.route('/create-account-page')
+    def create_account_page():
+        """Create account page - handles both registration and login flows"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        # Get email from wherever it's stored
+        email = session.get('reg_email') or request.args.get('email')
+    
+        if not email:
+            return redirect(url_for('register'))
+    
+        # Check if this is the first account for this email
+        existing_accounts = User.query.filter_by(email=email).count()
+    
+        # If it's the first account, ensure OTP verification was completed
+        if existing_accounts == 0:
+            otp_record = EmailVerificationOTP.query.filter_by(email=email).first()
+            if not otp_record:
+                # No OTP record - redirect to verification
+                flash('Please verify your email first.', 'warning')
+                return redirect(url_for('register'))
+    
+        # All good - show create account page
+        return render_template(
+            'auth/create_account.html',
+            email=email
+        )
+
+    @app.route('/create-account-from-login')
+    def create_account_page_from_login():
+        """Create account page when coming from login flow"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = request.args.get('email')
+        if not email:
+            flash('Email is required to create a new account.', 'danger')
+            return redirect(url_for('login'))
+    
+        existing_accounts = User.query.filter_by(email=email).count()
+        if existing_accounts >= 10:
+            flash('Maximum of 10 accounts per email address reached.', 'danger')
+            return redirect(url_for('login_select', email=email))
+    
+        session['reg_email'] = email
+    
+        return render_template(
+            'auth/create_account.html',
+            email=email
+        )
+
+    @app.route('/create-account', methods=['POST'])
+    def create_account():
+        try:
+            data = request.get_json()
+            email = data.get('email')
+            username = data.get('username')
+            password = data.get('password')
+        
+            print(f"🔍 Create account request:")
+            print(f"   Email: {email}")
+            print(f"   Username: {username}")
+        
+            if not email or not username or not password:
+                return jsonify({'success': False, 'message': 'Missing data'})
+        
+            # Validate username format
+            if len(username) < 3 or len(username) > 20:
+                return jsonify({'success': False, 'message': 'Username must be 3-20 characters'})
+        
+            if not re.match(r'^[a-zA-Z0-9_]+$', username):
+                return jsonify({'success': False, 'message': 'Username can only contain letters, numbers, and underscores'})
+        
+            # Check if username already exists
+            if username_taken(username):
+                return jsonify({'success': False, 'message': 'Username already taken'})
+        
+            # Check if email already has 10 accounts (max limit)
+            existing_accounts = User.query.filter_by(email=email).count()
+            if existing_accounts >= 10:
+                return jsonify({'success': False, 'message': 'Maximum of 10 accounts per email address reached'})
+        
+            # Validate password
+            errors = validate_password(password)
+            if errors:
+                return jsonify({'success': False, 'message': errors[0]})
+        
+            # ✅ FIXED: Check OTP verification status
+            if existing_accounts == 0:
+                # First account needs OTP verification
+                print(f"📊 Checking OTP verification for {email}")
+                print(f"   Existing accounts: {existing_accounts} (first account)")
+            
+                # Check if OTP was verified (look for verified record)
+                otp_record = EmailVerificationOTP.query.filter_by(email=email).first()
+            
+                if not otp_record:
+                    print(f"❌ No OTP record found for {email}")
+                    return jsonify({'success': False, 'message': 'Email not verified. Please verify your email first.'})
+            
+                # Check if OTP is verified
+                if not otp_record.is_verified:
+                    print(f"❌ OTP not verified for {email}")
+                    # Also check if OTP has expired
+                    if datetime.utcnow() > otp_record.expires_at:
+                        db.session.delete(otp_record)
+                        db.session.commit()
+                        return jsonify({'success': False, 'message': 'Verification expired. Please request a new OTP.'})
+                    return jsonify({'success': False, 'message': 'Email not verified. Please verify your email first.'})
+            
+                print(f"✅ OTP verified for {email}")
+            
+                # Clean up OTP record after successful account creation
+                db.session.delete(otp_record)
+        
+            # Generate password hash
+            hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        
+            # Create user
+            user = User(
+                email=email,
+                username=username,
+                password_hash=hashed_password,
+                is_verified=True  # Always verified since email is confirmed
+            )
+        
+            db.session.add(user)
+            db.session.commit()
+        
+            print(f"✅ User created: {username} ({email})")
+        
+            # Login the user after creating account
+            login_user(user)
+        
+            # Cleanup session data
+            session.pop('reg_email', None)
+            session.pop('reg_username', None)
+            session.pop('verified_email', None)
+            session.pop('otp_verified', None)
+        
+            # Update user status
+            user.last_seen = datetime.utcnow()
+            user.is_online = True
+            db.session.commit()
+        
+            return jsonify({
+                'success': True,
+                'message': 'Account created successfully!',
+                'redirect': url_for('dashboard')
+            })
+        
+        except Exception as e:
+            print(f"❌ Error creating account: {e}")
+            import traceback
+            traceback.print_exc()
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Server error. Please try again.'})
+
+    @app.route('/select-account')
+    def select_account():
+        """Page to select existing account or create new one"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = session.get('reg_email')
+        if not email:
+            return redirect(url_for('register'))
+    
+        existing_accounts = User.query.filter_by(email=email).all()
+    
+        return render_template('auth/select_account.html', 
+                             email=email, 
+                             accounts=existing_accounts,
+                             can_create_new=len(existing_accounts) < 10)
+
+    @app.route('/create-account-form')
+    def create_account_form():
+        """Serve the create account form page"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = session.get('reg_email')
+        username = session.get('reg_username')
+    
+        if not email or not username:
+            return redirect(url_for('register'))
+    
+        return render_template('auth/create_account.html',
+                             email=email,
+                             username=username)
+
+    @app.route('/login-account/<int:account_id>')
+    def login_account(account_id):
+        """Direct login to existing account"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        email = session.get('reg_email')
+        if not email:
+            return redirect(url_for('register'))
+    
+        # Verify the account belongs to this email
+        account = User.query.filter_by(id=account_id, email=email).first()
+        if not account:
+            flash('Account not found.', 'danger')
+            return redirect(url_for('select_account'))
+    
+        # Show login form for this account
+        return render_template('auth/login_account.html', 
+                             email=email, 
+                             account=account)
+
+    @app.route('/verify-email', methods=['POST'])
+    @rate_limit('verify_email', key='ip')
+    def verify_email():
+        try:
+            data = request.get_json()
+            email = data.get('email')
+            username = data.get('username')
+        
+            print(f"📧 Verify email request for: {email}, username: {username}")
+        
+            if not email or not username:
+                return jsonify({'success': False, 'message': 'Email and username are required'})
+        
+            # Validate email format
+            import re
+            if not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', email):
+                return jsonify({'success': False, 'message': 'Invalid email format'})
+        
+            # Check if username already exists
+            if username_taken(username):
+                return jsonify({'success': False, 'message': 'Username already taken'})
+        
+            # Check if email has too many accounts
+            existing_accounts = User.query.filter_by(email=email).count()
+            if existing_accounts >= 10:
+                return jsonify({'success': False, 'message': 'Maximum of 10 accounts per email address reached'})
+        
+            # Generate OTP
+            otp = generate_otp()
+            expiry = datetime.utcnow() + timedelta(minutes=app.config['OTP_EXPIRY_MINUTES'])
+        
+            # Clean up old OTPs for this email
+            EmailVerificationOTP.query.filter_by(email=email).delete()
+        
+            # Store new OTP
+            otp_record = EmailVerificationOTP(
+                email=email, 
+                otp=otp, 
+                expires_at=expiry,
+                is_verified=False
+            )
+            db.session.add(otp_record)
+            db.session.commit()
+        
+            log.info('verification code issued', extra={'event': 'auth.otp_issued', 'email': email})
+        
+            # Send email
+            email_sent = send_verification_email(email, otp)
+        
+            if email_sent:
+                return jsonify({
+                    'success': True, 
+                    'message': 'Verification code sent to your email!',
+                    'email': email,
+                    'otp': otp  # Include for debugging
+                })
+            else:
+                # Still return success but with OTP shown
+                return jsonify({
+                    'success': True, 
+                    'message': f'Email failed. Use OTP: {otp}',
+                    'email': email,
+                    'otp': otp,
+                    'debug': True
+                })
+            
+        except Exception as e:
+            print(f"❌ Error in verify_email: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'success': False, 'message': 'Server error. Please try again.'}), 500
+
+    @app.route('/debug/otp-status')
+    def debug_otp_status():
+        """Debug endpoint to check OTP records"""
+        email = request.args.get('email')
+        if not email:
+            return "Email parameter required", 400
+    
+        otp_records = EmailVerificationOTP.query.filter_by(email=email).all()
+    
+        result = f"OTP Records for {email}: {len(otp_records)} found\n\n"
+        for record in otp_records:
+            result += f"ID: {record.id}\n"
+            result += f"OTP: {record.otp}\n"
+            result += f"Created: {record.created_at}\n"
+            result += f"Expires: {record.expires_at}\n"
+            result += f"Verified: {record.is_verified}\n"
+            result += f"Expired: {'YES' if datetime.utcnow() > record.expires_at else 'NO'}\n"
+            result += "-" * 40 + "\n"
+    
+        return f"<pre>{result}</pre>"
+
+    @app.route('/verify-otp', methods=['POST'])
+    def verify_otp():
+        try:
+            data = request.get_json()
+            email = data.get('email')
+            otp = data.get('otp')
+        
+            if not email or not otp:
+                return jsonify({'success': False, 'message': 'Email and OTP are required'}), 400
+        
+            # Find the most recent valid OTP
+            otp_record = EmailVerificationOTP.query.filter_by(
+                email=email,
+                otp=otp
+            ).order_by(EmailVerificationOTP.created_at.desc()).first()
+        
+            if not otp_record:
+                log.info('invalid verification code', extra={'event': 'auth.otp_invalid', 'email': email})
+                return jsonify({'success': False, 'message': 'Invalid OTP'})
+        
+            # Check if OTP is expired
+            if datetime.utcnow() > otp_record.expires_at:
+                log.info('expired verification code', extra={'event': 'auth.otp_expired', 'email': email})
+                # Clean up expired OTP
+                db.session.delete(otp_record)
+                db.session.commit()
+                return jsonify({'success': False, 'message': 'OTP expired. Please request a new one.'})
+        
+            # Mark as verified
+            otp_record.is_verified = True
+            db.session.commit()
+        
+            # Store in session
+            session['verified_email'] = email
+            session['otp_verified'] = True
+        
+            # Check if user has existing accounts
+            existing_accounts = User.query.filter_by(email=email).all()
+            log.info('email verified', extra={'event': 'auth.otp_verified', 'email': email,
+                                              'existing_accounts': len(existing_accounts)})
+        
+            response_data = {
+                'success': True, 
+                'message': 'Email verified successfully!',
+                'has_existing_accounts': len(existing_accounts) > 0,
+                'account_count': len(existing_accounts)
+            }
+        
+            # If no existing accounts, redirect to create account page
+            if len(existing_accounts) == 0:
+                response_data['redirect'] = url_for('create_account_page')
+        
+            return jsonify(response_data)
+        
+        except Exception:
+            log.exception('error verifying code')
+            return jsonify({'success': False, 'message': 'Server error. Please try again.'}), 500
+
+    @app.route('/api/check-existing-accounts')
+    def check_existing_accounts():
+        """Check if email has existing accounts"""
+        email = request.args.get('email')
+    
+        if not email:
+            return jsonify({'success': False, 'message': 'Email required'})
+    
+        existing_accounts = User.query.filter_by(email=email).count()
+    
+        return jsonify({
+            'success': True,
+            'hasExistingAccounts': existing_accounts > 0,
+            'count': existing_accounts
+        })
+
+    @app.route('/forgot-password', methods=['GET', 'POST'])
+    def forgot_password():
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        if request.method == 'POST':
+            email = request.form.get('email')
+            account_id = request.form.get('account_id')  # For multiple accounts
+            username = request.form.get('username')  # For multiple accounts
+        
+            if not email:
+                flash('Email is required.', 'danger')
+                return redirect(url_for('forgot_password'))
+        
+            # Get all accounts with this email
+            accounts = User.query.filter_by(email=email).all()
+        
+            if not accounts:
+                # Don't reveal if email exists or not (security best practice)
+                flash('If an account exists with that email, a reset link has been sent.', 'info')
+                return redirect(url_for('login'))
+        
+            # Handle multiple accounts
+            if len(accounts) > 1:
+                # If no account_id provided, show account selection
+                if not account_id:
+                    flash('Please select which account to reset.', 'danger')
+                    return redirect(url_for('forgot_password', email=email))
+            
+                # Verify account_id belongs to this email
+                try:
+                    account_id_int = int(account_id)
+                    user = User.query.filter_by(id=account_id_int, email=email).first()
+                
+                    if not user:
+                        flash('Selected account not found for this email.', 'danger')
+                        return redirect(url_for('forgot_password', email=email))
+                except (ValueError, TypeError):
+                    flash('Invalid account selection.', 'danger')
+                    return redirect(url_for('forgot_password', email=email))
+        
+            elif len(accounts) == 1:
+                # Single account
+                user = accounts[0]
+        
+            else:
+                # No accounts (shouldn't happen based on earlier check)
+                flash('No account found with this email.', 'danger')
+                return redirect(url_for('forgot_password'))
+        
+            # Generate reset token
+            token = generate_reset_token()
+            expiry = datetime.utcnow() + timedelta(minutes=app.config['PASSWORD_RESET_EXPIRY_MINUTES'])
+        
+            # Clear any existing reset tokens for this user
+            PasswordResetToken.query.filter_by(user_id=user.id).delete()
+        
+            # Create new reset token
+            reset_token = PasswordResetToken(
+                user_id=user.id, 
+                token=token, 
+                expires_at=expiry
+            )
+            db.session.add(reset_token)
+            db.session.commit()
+        
+            # Send password reset email with username
+            try:
+                send_password_reset_email(user.email, token, user.username)
+                flash('If an account exists with that email, a reset link has been sent.', 'info')
+            except Exception as e:
+                print(f"Error sending password reset email: {e}")
+                flash('Failed to send reset email. Please try again.', 'danger')
+                return redirect(url_for('forgot_password', email=email))
+        
+            return redirect(url_for('login'))
+    
+        # GET request - show form
+        email = request.args.get('email', '')
+    
+        accounts = []
+        if email:
+            accounts = User.query.filter_by(email=email).all()
+    
+        return render_template('auth/forgot_password.html', email=email, accounts=accounts)
+
+    @app.route('/reset-password/<token>', methods=['GET', 'POST'])
+    def reset_password(token):
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+    
+        reset_token = PasswordResetToken.query.filter_by(token=token).first()
+    
+        if not reset_token or datetime.utcnow() > reset_token.expires_at:
+            flash('Invalid or expired reset token.', 'danger')
+            return redirect(url_for('forgot_password'))
+    
+        user = User.query.get(reset_token.user_id)
+    
+        if request.method == 'POST':
+            password = request.form.get('password')
+            confirm_password = request.form.get('confirm_password')
+        
+            if password != confirm_password:
+                flash('Passwords do not match.', 'danger')
+                return redirect(url_for('reset_password', token=token))
+        
+            errors = validate_password(password)
+            if errors:
+                flash(errors[0], 'danger')
+                return redirect(url_for('reset_password', token=token))
+        
+            # Update password
+            user.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        
+            # Invalidate token
+            db.session.delete(reset_token)
+            db.session.commit()
+        
+            flash('Password updated successfully! Please login with your new password.', 'success')
+            return redirect(url_for('login'))
+    
+        return render_template('auth/reset_password.html', token=token, username=user.username)
+
+    @app.route('/logout')
+    @login_required
+    def logout():
+        user_email = current_user.email
+    
+        current_user.is_online = False
+        current_user.last_seen = datetime.utcnow()
+        db.session.commit()
+    
+        logout_user()
+    
+        accounts = User.query.filter_by(email=user_email).all()
+    
+        if len(accounts) > 1:
+            flash('You have been logged out. Please select which account to log into.', 'info')
+            return redirect(url_for('login_select', email=user_email))
+        else:
+            flash('You have been logged out.', 'info')
+            return redirect(url_for('login'))
+
+    @app.route('/api/check-username', methods=['POST'])
+    @rate_limit('check_username', key='ip')
+    def check_username_availability():
+        """Check if a username is available"""
+        data = request.get_json()
+        username = data.get('username', '').strip()
+    
+        if not username:
+            return jsonify({'available': False, 'message': 'Username is required'})
+    
+        # Validate username format
+        if len(username) < 3 or len(username) > 20:
+            return jsonify({'available': False, 'message': 'Username must be 3-20 characters'})
+    
+        if not re.match(r'^[a-zA-Z0-9_]+$', username):
+            return jsonify({'available': False, 'message': 'Username can only contain letters, numbers, and underscores'})
+    
+        # Answered from memory (username_index.py); no query per keystroke
+        if username_taken(username):
+            return jsonify({'available': False, 'message': 'Username already taken',
+                            'suggestions': suggest_usernames(username)})
+    
+        return jsonify({'available': True, 'message': 'Username is available'})
+
+    @app.route('/api/check-auth')
+    def check_auth():
+        """Check if user is authenticated and return status"""
+        if current_user.is_authenticated:
+            return jsonify({
+                'authenticated': True,
+                'user_id': current_user.id,
+                'username': current_user.username,
+                'redirect': url_for('dashboard')
+            })
+        return jsonify({'authenticated': False})
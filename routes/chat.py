@@ -0,0 +1,528 @@
+# routes/chat.py - Chat pages and message APIs
+import logging
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask_login import login_required, current_user
+from extensions import db, socketio
+from models import User, Friend, ChatMessage
+from helpers import mark_messages_read
+from db_engine import write_transaction, replica_reads, primary_reads
+from status_batcher import queue_status
+from rate_limit import rate_limit
+from notifications import CHAT_KINDS, mark_grouped_read
+from message_search import search_messages
+from chat_service import (MessageSendError, clean_client_id, clear_chat_for_user, delete_for_everyone, delete_for_user,
+                          send_message, visible_in_chat, forward_message as forward_chat_message)
+
+log = logging.getLogger(__name__)
+
+
+def register_chat_routes(app):
+    """Register chat routes"""
+
+    @app.route('/chat/<int:user_id>')
+    @login_required
+    def chat(user_id):
+        """Chat page with a specific user - SIMPLIFIED"""
+        # Check if users are friends
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == user_id)) |
+            ((Friend.user_id == user_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            flash('You can only chat with friends.', 'danger')
+            return redirect(url_for('friends'))
+    
+        # Get the other user
+        other_user = User.query.get_or_404(user_id)
+    
+        # Mark received messages as read
+        mark_messages_read(user_id, current_user.id)
+    
+        # Mark this chat's notifications as read (by exact key, see notifications.py)
+        with write_transaction():
+            mark_grouped_read(current_user.id, CHAT_KINDS, user_id)
+    
+        # Get conversation history (last 50 messages), minus what this user deleted
+        messages = ChatMessage.query.filter(
+            visible_in_chat(current_user.id, user_id)
+        ).order_by(ChatMessage.timestamp.asc()).limit(50).all()
+    
+        return render_template('dashboard/chat.html',
+                             other_user=other_user,
+                             messages=messages)
+
+    @app.route('/api/chat/<int:user_id>/messages')
+    @login_required
+    def get_chat_messages(user_id):
+        """Get chat messages with a user - UPDATED TO FIX STATUS"""
+        # Check friendship
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == user_id)) |
+            ((Friend.user_id == user_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        try:
+            # Get messages with pagination
+            page = request.args.get('page', 1, type=int)
+            per_page = 50
+        
+            # CRITICAL FIX: MARK AS READ WHEN LOADING CHAT - UPDATE BOTH FIELDS
+            # (before loading the page, so the commit doesn't expire the loaded rows)
+            if page == 1:
+                message_ids = mark_messages_read(user_id, current_user.id)
+            
+                if message_ids:
+                    # Notify the sender with one batched status event
+                    queue_status(f'user_{user_id}', message_ids, 'read')
+                    log.info('messages read', extra={'event': 'chat.read', 'reader_id': current_user.id,
+                                                     'sender_id': user_id, 'count': len(message_ids)})
+        
+            # Query messages between users, minus what this user deleted
+            messages_query = ChatMessage.query.filter(
+                visible_in_chat(current_user.id, user_id)
+            ).order_by(ChatMessage.timestamp.desc())
+        
+            # Paginate
+            pagination = messages_query.paginate(page=page, per_page=per_page, error_out=False)
+            messages = pagination.items
+        
+            # Format messages with UTC timestamps
+            formatted_messages = []
+            for msg in messages:
+                # Ensure timestamp is UTC with 'Z' suffix
+                timestamp_iso = msg.timestamp.isoformat()
+                if not timestamp_iso.endswith('Z'):
+                    timestamp_iso += 'Z'
+            
+                formatted_messages.append({
+                    'id': msg.id,
+                    'sender_id': msg.sender_id,
+                    'sender_username': msg.sender.username,
+                    'content': msg.content,
+                    'timestamp': timestamp_iso,
+                    'is_read': msg.is_read,
+                    'status': msg.status or 'sent',  # Use database status
+                    'is_own': msg.sender_id == current_user.id
+                })
+        
+            return jsonify({
+                'success': True,
+                'messages': formatted_messages,
+                'has_next': pagination.has_next,
+                'total': pagination.total
+            })
+        
+        except Exception:
+            log.exception('error getting chat messages')
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    @app.route('/api/chat/<int:user_id>/search')
+    @login_required
+    @rate_limit('message_search')
+    @replica_reads
+    def search_chat_messages(user_id):
+        """Search this chat: ?q=<words>&cursor=; pass next_cursor back as ?cursor= for older matches"""
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == user_id)) |
+            ((Friend.user_id == user_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+
+        if not friendship:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+        query = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', app.config['MESSAGE_SEARCH_PER_PAGE'], type=int), 1), 50)
+        if len(query) > 200:
+            return jsonify({'success': False, 'message': 'Search is too long'}), 400
+
+        try:
+            results, next_cursor = search_messages(
+                current_user.id, user_id, query, request.args.get('cursor'), limit)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+
+        return jsonify({'success': True, 'results': results, 'next_cursor': next_cursor})
+
+    # 2. UPDATED: Send message HTTP API
+    @app.route('/api/chat/send', methods=['POST'])
+    @login_required
+    @rate_limit('chat_send')
+    def send_chat_message():
+        """Send a chat message via HTTP API - UPDATED"""
+        data = request.get_json(silent=True) or {}
+        if not data.get('receiver_id'):
+            return jsonify({'success': False, 'message': 'Missing receiver_id'}), 400
+        try:
+            receiver_id = int(data['receiver_id'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid receiver_id'}), 400
+
+        try:
+            content = data.get('content', '').strip()
+        
+            if not content:
+                return jsonify({'success': False, 'message': 'Message content is required'}), 400
+        
+            try:
+                message, _ = send_message(current_user, receiver_id, content,
+                                          clean_client_id(data.get('client_id') or data.get('temp_id')))
+            except MessageSendError as e:
+                return jsonify({'success': False, 'message': e.message}), e.status
+        
+            # 202 when group commit queued it; message_delivered follows over the socket
+            status = 202 if message.get('queued') else 200
+            return jsonify({'success': True, 'message': dict(message, is_own=True)}), status
+        
+        except Exception:
+            log.exception('error sending chat message')
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    # 3. NEW: HTTP endpoint to mark messages as read (for socket fallback)
+    @app.route('/api/chat/<int:sender_id>/mark-read', methods=['POST'])
+    @login_required
+    def mark_messages_read_http(sender_id):
+        """Mark messages as read via HTTP API (socket fallback)"""
+        try:
+            message_ids = mark_messages_read(sender_id, current_user.id)
+        
+            log.info('messages read', extra={'event': 'chat.read', 'reader_id': current_user.id,
+                                             'sender_id': sender_id, 'count': len(message_ids)})
+        
+            # Notify sender via socket
+            queue_status(f'user_{sender_id}', message_ids, 'read')
+        
+            return jsonify({
+                'success': True,
+                'count': len(message_ids),
+                'message_ids': message_ids
+            })
+        
+        except Exception:
+            log.exception('error marking messages read')
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    # 4. DEBUG: Get message status for debugging
+    @app.route('/debug/messages/<int:user_id1>/<int:user_id2>')
+    @login_required
+    def debug_messages(user_id1, user_id2):
+        """Debug endpoint to check message status between two users"""
+    
+        messages = ChatMessage.query.filter(
+            ((ChatMessage.sender_id == user_id1) & (ChatMessage.receiver_id == user_id2)) |
+            ((ChatMessage.sender_id == user_id2) & (ChatMessage.receiver_id == user_id1))
+        ).order_by(ChatMessage.timestamp.asc()).all()
+    
+        result = []
+        for msg in messages:
+            result.append({
+                'id': msg.id,
+                'sender_id': msg.sender_id,
+                'receiver_id': msg.receiver_id,
+                'content': msg.content[:50] + '...' if len(msg.content) > 50 else msg.content,
+                'status': msg.status,
+                'is_read': msg.is_read,
+                'timestamp': msg.timestamp.isoformat(),
+                'expected_status': 'read' if msg.is_read else (msg.status or 'sent')
+            })
+    
+        return jsonify({
+            'success': True,
+            'count': len(messages),
+            'messages': result,
+            'inconsistent': [m for m in result if m['status'] != m['expected_status']]
+        })
+
+    @app.route('/chat')
+    @login_required
+    @replica_reads
+    def chat_index():
+        """Chat index page showing recent conversations"""
+        # Get users you've chatted with recently
+        recent_chats = db.session.query(
+            User,
+            db.func.max(ChatMessage.timestamp).label('last_message_time')  # CHANGED
+        ).join(
+            ChatMessage,  # CHANGED
+            visible_in_chat(current_user.id, User.id)
+        ).filter(User.id != current_user.id).group_by(User.id).order_by(
+            db.desc('last_message_time')
+        ).limit(20).all()
+    
+        # Get unread counts for each chat
+        chat_data = []
+        for user, last_time in recent_chats:
+            # Unread counts come from the primary: the user may have just read them
+            with primary_reads():
+                unread_count = ChatMessage.query.filter_by(  # CHANGED
+                    sender_id=user.id,
+                    receiver_id=current_user.id,
+                    is_read=False,
+                    deleted_for_receiver=False
+                ).count()
+        
+            # Check if users are friends
+            friendship = Friend.query.filter(
+                ((Friend.user_id == current_user.id) & (Friend.friend_id == user.id)) |
+                ((Friend.user_id == user.id) & (Friend.friend_id == current_user.id))
+            ).filter_by(status='accepted').first()
+        
+            if friendship:
+                chat_data.append({
+                    'user': user,
+                    'last_message_time': last_time,
+                    'unread_count': unread_count
+                })
+    
+        # Get friends you haven't chatted with yet
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friends_without_chat = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend_id = friendship.friend_id
+            else:
+                friend_id = friendship.user_id
+        
+            # Check if already in recent chats
+            if not any(chat['user'].id == friend_id for chat in chat_data):
+                friend = User.query.get(friend_id)
+                if friend:
+                    friends_without_chat.append(friend)
+    
+        return render_template('dashboard/chat_index.html',
+                             recent_chats=chat_data,
+                             friends_without_chat=friends_without_chat)
+
+    @app.route('/api/chat/message/delete', methods=['POST'])
+    @login_required
+    def delete_message():
+        """Delete a message for me (message_id, or message_ids for several) or for everyone"""
+        data = request.get_json()
+        message_id = data.get('message_id')
+        delete_type = data.get('delete_type', 'me')  # 'me' or 'everyone'
+    
+        if delete_type == 'me':
+            # Soft delete: only this user's side is flagged, the other still sees them
+            try:
+                message_ids = [int(i) for i in (data.get('message_ids') or ([message_id] if message_id else []))]
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': 'Invalid message ID'}), 400
+            if not message_ids:
+                return jsonify({'success': False, 'message': 'Message ID required'}), 400
+            if len(message_ids) > 500:
+                return jsonify({'success': False, 'message': 'Too many messages'}), 400
+        
+            deleted = delete_for_user(current_user.id, message_ids)
+            if not deleted:
+                return jsonify({'success': False, 'message': 'Message not found'}), 404
+            return jsonify({'success': True, 'message': 'Message deleted for you', 'deleted': deleted})
+    
+        if not message_id:
+            return jsonify({'success': False, 'message': 'Message ID required'}), 400
+    
+        message = ChatMessage.query.get_or_404(message_id)
+    
+        if delete_type == 'everyone':
+            # Only sender can delete for everyone, and only within 5 minutes
+            if message.sender_id != current_user.id:
+                return jsonify({'success': False, 'message': 'Only sender can delete for everyone'}), 403
+            if message.deleted_for_sender:
+                return jsonify({'success': False, 'message': 'Message not found'}), 404
+        
+            # Check time limit (5 minutes)
+            five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
+            if message.timestamp < five_minutes_ago:
+                return jsonify({'success': False, 'message': 'Can only delete messages within 5 minutes'}), 400
+        
+            # Both sides flagged; the purge job removes the row later
+            receiver_id = message.receiver_id
+            delete_for_everyone(message)
+        
+            # Notify the receiver via Socket.IO
+            socketio.emit('message_deleted', {
+                'message_id': message_id,
+                'deleted_by': current_user.username,
+                'deleted_by_id': current_user.id
+            }, room=f'user_{receiver_id}')
+        
+            return jsonify({'success': True, 'message': 'Message deleted for everyone'})
+    
+        return jsonify({'success': False, 'message': 'Invalid delete type'}), 400
+
+    @app.route('/api/chat/<int:user_id>/clear', methods=['POST'])
+    @login_required
+    def clear_chat(user_id):
+        """Delete the whole chat with a user, for me only"""
+        deleted = clear_chat_for_user(current_user.id, user_id)
+        return jsonify({'success': True, 'message': 'Chat cleared', 'deleted': deleted})
+
+    @app.route('/api/chat/message/edit', methods=['POST'])
+    @login_required
+    def edit_message():
+        """Edit a message"""
+        data = request.get_json()
+        message_id = data.get('message_id')
+        new_content = data.get('new_content', '').strip()
+    
+        if not message_id or not new_content:
+            return jsonify({'success': False, 'message': 'Message ID and content required'}), 400
+    
+        message = ChatMessage.query.get_or_404(message_id)
+    
+        # Only sender can edit
+        if message.sender_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Only sender can edit message'}), 403
+        if message.deleted_for_sender:
+            return jsonify({'success': False, 'message': 'Message not found'}), 404
+    
+        # Check time limit (15 minutes for editing)
+        fifteen_minutes_ago = datetime.utcnow() - timedelta(minutes=15)
+        if message.timestamp < fifteen_minutes_ago:
+            return jsonify({'success': False, 'message': 'Can only edit messages within 15 minutes'}), 400
+    
+        # Update message
+        message.content = new_content
+        message.edited = True
+    
+        # Notify receiver via Socket.IO
+        socketio.emit('message_edited', {
+            'message_id': message_id,
+            'new_content': new_content,
+            'edited_by': current_user.username,
+            'edited_by_id': current_user.id,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }, room=f'user_{message.receiver_id}')
+    
+        db.session.commit()
+    
+        return jsonify({'success': True, 'message': 'Message edited'})
+
+    @app.route('/api/chat/message/forward', methods=['POST'])
+    @login_required
+    def forward_message():
+        """Forward a message to a friend (to_friend_id) or several at once (to_friend_ids)"""
+        data = request.get_json()
+        message_id = data.get('message_id')
+        friend_ids = data.get('to_friend_ids') or ([data['to_friend_id']] if data.get('to_friend_id') else [])
+    
+        if not message_id or not friend_ids:
+            return jsonify({'success': False, 'message': 'Message ID and friend ID required'}), 400
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid message ID'}), 400
+        try:
+            if not isinstance(friend_ids, list):
+                raise TypeError(friend_ids)
+            friend_ids = [int(friend_id) for friend_id in friend_ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid friend ID'}), 400
+    
+        try:
+            forwarded = forward_chat_message(current_user, message_id, friend_ids)
+        except MessageSendError as e:
+            return jsonify({'success': False, 'message': e.message}), e.status
+    
+        return jsonify({
+            'success': True,
+            'message': 'Message forwarded',
+            'forwarded_message_id': forwarded[0]['id'],
+            'forwarded_message_ids': [message['id'] for message in forwarded]
+        })
+
+    @app.route('/api/chat/recent')
+    @login_required
+    @replica_reads
+    def get_recent_chats():
+        """Get recent chats for the current user"""
+    
+        # Get users you've chatted with recently
+        recent_chats = db.session.query(
+            User,
+            db.func.max(ChatMessage.timestamp).label('last_message_time'),  # CHANGED
+            db.func.count(ChatMessage.id).label('message_count')  # CHANGED
+        ).join(
+            ChatMessage,  # CHANGED
+            visible_in_chat(current_user.id, User.id)
+        ).filter(User.id != current_user.id).group_by(User.id).order_by(
+            db.desc('last_message_time')
+        ).limit(20).all()
+    
+        # Get unread counts for each chat
+        result = []
+        for user, last_time, msg_count in recent_chats:
+            # Check if users are friends
+            friendship = Friend.query.filter(
+                ((Friend.user_id == current_user.id) & (Friend.friend_id == user.id)) |
+                ((Friend.user_id == user.id) & (Friend.friend_id == current_user.id))
+            ).filter_by(status='accepted').first()
+        
+            if friendship:
+                # Unread counts come from the primary: the user may have just read them
+                with primary_reads():
+                    unread_count = ChatMessage.query.filter_by(  # CHANGED
+                        sender_id=user.id,
+                        receiver_id=current_user.id,
+                        is_read=False,
+                        deleted_for_receiver=False
+                    ).count()
+            
+                # Get last message content
+                last_message = ChatMessage.query.filter(  # CHANGED
+                    visible_in_chat(current_user.id, user.id)
+                ).order_by(ChatMessage.timestamp.desc()).first()
+            
+                result.append({
+                    'user_id': user.id,
+                    'username': user.username,
+                    'is_online': user.is_online,
+                    'last_message_time': last_time.isoformat() if last_time else None,
+                    'last_message': last_message.content if last_message else None,
+                    'unread_count': unread_count,
+                    'message_count': msg_count
+                })
+    
+        return jsonify(result)
+
+    @app.route('/api/user/<int:user_id>/status')
+    @login_required
+    def get_user_status(user_id):
+        """Get immediate user status (online/offline)"""
+        # Check if users are friends
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == user_id)) |
+            ((Friend.user_id == user_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            return jsonify({'success': False, 'message': 'Not friends'}), 403
+    
+        user = User.query.get_or_404(user_id)
+    
+        # Check if user is actually online (connected in last 2 minutes)
+        two_minutes_ago = datetime.utcnow() - timedelta(minutes=2)
+        is_really_online = user.is_online and user.last_seen > two_minutes_ago
+    
+        # Update if incorrectly marked as online
+        if user.is_online and not is_really_online:
+            user.is_online = False
+            db.session.commit()
+    
+        return jsonify({
+            'success': True,
+            'user_id': user.id,
+            'status': 'online' if is_really_online else 'offline',
+            'last_seen': user.last_seen.isoformat() if user.last_seen else None,
+            'is_online': is_really_online,
+            'timestamp': datetime.utcnow().isoformat()
+        })
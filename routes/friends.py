@@ -0,0 +1,309 @@
+# routes/friends.py - Friend list and friend request routes
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask_login import login_required, current_user
+from extensions import db, socketio
+from models import User, Habit, HabitLog, Friend
+from db_engine import replica_reads
+from rate_limit import rate_limit
+from user_search import search_users
+
+
+def register_friend_routes(app):
+    """Register friend routes"""
+
+    @app.route('/friends')
+    @login_required
+    def friends():
+        # Get accepted friends
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friends_list = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend = User.query.get(friendship.friend_id)
+            else:
+                friend = User.query.get(friendship.user_id)
+            friends_list.append(friend)
+    
+        # Get pending requests
+        pending_requests = Friend.query.filter_by(
+            friend_id=current_user.id,
+            status='pending'
+        ).all()
+    
+        # Get sent requests
+        sent_requests = Friend.query.filter_by(
+            user_id=current_user.id,
+            status='pending'
+        ).all()
+    
+        # Get suggested friends: 20 users with no friendship, request or block either way
+        # (finding anyone else is /api/users/search)
+        related = db.session.query(Friend.friend_id).filter(Friend.user_id == current_user.id).union(
+            db.session.query(Friend.user_id).filter(Friend.friend_id == current_user.id)
+        )
+        suggested = User.query.filter(
+            User.id != current_user.id,
+            User.is_verified == True,
+            User.id.notin_(related)
+        ).limit(20).all()
+    
+        return render_template('dashboard/friends.html',
+                             friends=friends_list,
+                             pending_requests=pending_requests,
+                             sent_requests=sent_requests,
+                             suggested=suggested)
+
+    @app.route('/api/friends')
+    @login_required
+    def get_friends_api():
+        """Get friends list for snap sending"""
+        try:
+            # Get accepted friends
+            friendships = Friend.query.filter(
+                ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+                (Friend.status == 'accepted')
+            ).all()
+        
+            friends_list = []
+            for friendship in friendships:
+                if friendship.user_id == current_user.id:
+                    friend = User.query.get(friendship.friend_id)
+                else:
+                    friend = User.query.get(friendship.user_id)
+            
+                if friend:
+                    friends_list.append({
+                        'id': friend.id,
+                        'username': friend.username,
+                        'email': friend.email,
+                        'is_online': friend.is_online,
+                        'avatar': friend.avatar if hasattr(friend, 'avatar') else None
+                    })
+        
+            return jsonify(friends_list)
+        
+        except Exception as e:
+            print(f"Error getting friends: {e}")
+            return jsonify([])
+
+    @app.route('/friends/<int:friend_id>/habits')
+    @login_required
+    @replica_reads
+    def view_friend_habits(friend_id):
+        """View a friend's habits and streaks"""
+    
+        # Check if user is friends with this person
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == friend_id)) |
+            ((Friend.user_id == friend_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            flash('You can only view habits of your friends.', 'danger')
+            return redirect(url_for('friends'))
+    
+        # Get friend details
+        friend = User.query.get(friend_id)
+        if not friend:
+            flash('User not found.', 'danger')
+            return redirect(url_for('friends'))
+    
+        # Get friend's habits
+        habits = Habit.query.filter_by(user_id=friend_id).all()
+    
+        # Calculate friend's stats
+        total_streak = sum(h.streak_count for h in habits)
+        best_streak = max([h.best_streak for h in habits], default=0)
+        active_streaks = len([h for h in habits if h.streak_count > 0])
+    
+        # Get recent completions (last 7 days)
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        recent_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == friend_id,
+            HabitLog.completed_at >= seven_days_ago
+        ).order_by(HabitLog.completed_at.desc()).limit(10).all()
+    
+        # Calculate completion rate for last 30 days
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        total_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == friend_id,
+            HabitLog.completed_at >= thirty_days_ago
+        ).count()
+    
+        total_possible = len(habits) * 30
+        completion_rate = (total_completions / total_possible * 100) if total_possible > 0 else 0
+    
+        return render_template('dashboard/friend_habits.html',
+                             friend=friend,
+                             habits=habits,
+                             total_streak=total_streak,
+                             best_streak=best_streak,
+                             active_streaks=active_streaks,
+                             recent_completions=recent_completions,
+                             completion_rate=round(completion_rate, 1))
+
+    @app.route('/api/users/search')
+    @login_required
+    @rate_limit('user_search')
+    def search_users_api():
+        """Typeahead search for people to add: ?q=<part of a username or bio, or an email>&page="""
+        query = request.args.get('q', '')
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('limit', app.config['USER_SEARCH_PER_PAGE'], type=int), 1), 50)
+        if len(query) > 100:
+            return jsonify({'success': False, 'message': 'Search is too long'}), 400
+
+        results, has_more = search_users(current_user.id, query, page, per_page)
+        return jsonify({
+            'success': True,
+            'results': results,
+            'page': page,
+            'next_page': page + 1 if has_more else None,
+        })
+
+    @app.route('/friends/send-request', methods=['POST'])
+    @login_required
+    def send_friend_request():
+        data = request.get_json()
+        friend_email = data.get('email')
+        friend_username = data.get('username')
+        friend_id = data.get('user_id')
+    
+        # Find friend by ID, email, or username
+        if friend_id:
+            friend = User.query.get(friend_id)
+        elif friend_email:
+            friend = User.query.filter_by(email=friend_email).first()
+        elif friend_username:
+            friend = User.query.filter_by(username=friend_username).first()
+        else:
+            return jsonify({'success': False, 'message': 'Please provide user identifier'})
+    
+        if not friend:
+            return jsonify({'success': False, 'message': 'User not found'})
+    
+        if friend.id == current_user.id:
+            return jsonify({'success': False, 'message': 'Cannot add yourself'})
+    
+        # Check if request already exists
+        existing = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == friend.id)) |
+            ((Friend.user_id == friend.id) & (Friend.friend_id == current_user.id))
+        ).first()
+    
+        if existing:
+            if existing.status == 'pending':
+                return jsonify({'success': False, 'message': 'Request already sent'})
+            elif existing.status == 'accepted':
+                return jsonify({'success': False, 'message': 'Already friends'})
+            elif existing.status == 'blocked':
+                return jsonify({'success': False, 'message': 'Cannot send request to blocked user'})
+    
+        # Create request
+        friend_request = Friend(
+            user_id=current_user.id,
+            friend_id=friend.id,
+            status='pending'
+        )
+        db.session.add(friend_request)
+        db.session.commit()
+    
+        # Notify via SocketIO
+        socketio.emit('friend_request', {
+            'from': current_user.username,
+            'from_id': current_user.id,
+            'request_id': friend_request.id
+        }, room=f'user_{friend.id}')
+    
+        return jsonify({'success': True, 'message': 'Friend request sent'})
+
+    @app.route('/friends/accept/<int:request_id>', methods=['POST'])
+    @login_required
+    def accept_friend_request(request_id):
+        friend_request = Friend.query.get_or_404(request_id)
+    
+        if friend_request.friend_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        friend_request.status = 'accepted'
+        db.session.commit()
+    
+        # Notify sender
+        socketio.emit('friend_request_accepted', {
+            'from': current_user.username,
+            'from_id': current_user.id,
+            'friend_id': current_user.id
+        }, room=f'user_{friend_request.user_id}')
+    
+        return jsonify({'success': True, 'message': 'Friend request accepted'})
+
+    @app.route('/friends/reject/<int:request_id>', methods=['POST'])
+    @login_required
+    def reject_friend_request(request_id):
+        friend_request = Friend.query.get_or_404(request_id)
+    
+        if friend_request.friend_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        db.session.delete(friend_request)
+        db.session.commit()
+    
+        return jsonify({'success': True, 'message': 'Friend request rejected'})
+
+    @app.route('/friends/cancel/<int:request_id>', methods=['DELETE'])
+    @login_required
+    def cancel_friend_request(request_id):
+        friend_request = Friend.query.get_or_404(request_id)
+    
+        if friend_request.user_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        db.session.delete(friend_request)
+        db.session.commit()
+    
+        return jsonify({'success': True, 'message': 'Friend request cancelled'})
+
+    @app.route('/friends/remove/<int:friend_id>', methods=['POST'])
+    @login_required
+    def remove_friend(friend_id):
+        # Find the friendship (could be in either direction)
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == friend_id)) |
+            ((Friend.user_id == friend_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            return jsonify({'success': False, 'message': 'Friendship not found'}), 404
+    
+        db.session.delete(friendship)
+        db.session.commit()
+    
+        return jsonify({'success': True, 'message': 'Friend removed'})
+
+    @app.route('/friends/block/<int:user_id>', methods=['POST'])
+    @login_required
+    def block_user(user_id):
+        # Remove existing friendship if any
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == user_id)) |
+            ((Friend.user_id == user_id) & (Friend.friend_id == current_user.id))
+        ).first()
+    
+        if friendship:
+            db.session.delete(friendship)
+    
+        # Create block
+        block = Friend(
+            user_id=current_user.id,
+            friend_id=user_id,
+            status='blocked'
+        )
+        db.session.add(block)
+        db.session.commit()
+    
+        return jsonify({'success': True, 'message': 'User blocked'})
@@ -0,0 +1,820 @@
+# routes/main.py - Dashboard, habits, notifications, analytics and profile pages
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response
+from flask_login import login_required, current_user
+from extensions import db, bcrypt
+from models import User, Habit, HabitLog, Friend, Snap, Notification
+from db_engine import replica_reads
+from helpers import timesince_filter, validate_password
+from notifications import mark_all_read, page_notifications
+from username_index import username_taken
+
+
+def register_main_routes(app):
+    """Register dashboard, habit, analytics and profile routes"""
+
+    # Routes
+    @app.route('/')
+    def home():
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+        return redirect(url_for('intro'))
+
+    @app.route('/intro')
+    def intro():
+        """Introduction/welcome page for new visitors"""
+        if current_user.is_authenticated:
+            return redirect(url_for('dashboard'))
+        return render_template('dashboard/intro.html', is_intro=True)  
+
+    @app.route('/dashboard')
+    @login_required
+    def dashboard():
+        # Get user's habits for today
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+    
+        # Get recent snaps (last 24 hours)
+        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
+        recent_snaps = Snap.query.filter_by(receiver_id=current_user.id)\
+            .filter(Snap.created_at >= twenty_four_hours_ago)\
+            .order_by(Snap.created_at.desc())\
+            .limit(5)\
+            .all()
+    
+        # Get friend activity
+        friends = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friend_ids = []
+        for friend in friends:
+            if friend.user_id == current_user.id:
+                friend_ids.append(friend.friend_id)
+            else:
+                friend_ids.append(friend.user_id)
+    
+        friend_activity = []
+        if friend_ids:
+            friend_activity = Snap.query.filter(Snap.sender_id.in_(friend_ids))\
+                .filter(Snap.created_at >= twenty_four_hours_ago)\
+                .order_by(Snap.created_at.desc())\
+                .limit(10)\
+                .all()
+    
+        # Get pending friend requests (as list)
+        pending_requests_list = Friend.query.filter_by(
+            friend_id=current_user.id,
+            status='pending'
+        ).all()
+    
+        # Get count of pending requests
+        pending_requests_count = len(pending_requests_list)
+    
+        # Get unviewed snaps
+        unviewed_snaps = Snap.query.filter_by(
+            receiver_id=current_user.id,
+            is_viewed=False
+        ).count()
+    
+        # Get today's habit completions
+        today = datetime.utcnow().date()
+        today_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            db.func.date(HabitLog.completed_at) == today
+        ).count()
+    
+        # Get total completions this week
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        weekly_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= week_ago
+        ).count()
+    
+        # Calculate stats
+        total_habits = len(habits)
+        total_streak = sum(h.streak_count for h in habits)
+        active_streaks = len([h for h in habits if h.streak_count > 0])
+    
+        return render_template('dashboard/index.html', 
+                             habits=habits, 
+                             recent_snaps=recent_snaps,
+                             friend_activity=friend_activity,
+                             pending_requests=pending_requests_list,  # Now a list
+                             pending_requests_count=pending_requests_count,  # Added count
+                             unviewed_snaps=unviewed_snaps,
+                             today_completions=today_completions,
+                             weekly_completions=weekly_completions,
+                             total_habits=total_habits,
+                             total_streak=total_streak,
+                             active_streaks=active_streaks,
+                             today=today.strftime('%Y-%m-%d'))
+
+    @app.route('/notifications')
+    @login_required
+    def notifications_page():
+        """Notifications page"""
+        # One page at a time; ?cursor= comes from the "Older" link
+        try:
+            notifications, next_cursor = page_notifications(
+                current_user.id, request.args.get('cursor'),
+                limit=app.config['NOTIFICATIONS_PER_PAGE'])
+        except ValueError:
+            return redirect(url_for('notifications_page'))
+    
+        # Maintained incrementally by notifications.py
+        unread_count = current_user.unread_notifications
+    
+        # Count other stats for context processor
+        unviewed_snaps_count = Snap.query.filter_by(
+            receiver_id=current_user.id,
+            is_viewed=False
+        ).count()
+    
+        pending_friend_requests = Friend.query.filter_by(
+            friend_id=current_user.id,
+            status='pending'
+        ).count()
+    
+        return render_template('dashboard/notifications.html',
+                             notifications=notifications,
+                             next_cursor=next_cursor,
+                             unread_count=unread_count,
+                             unviewed_snaps_count=unviewed_snaps_count,
+                             pending_friend_requests=pending_friend_requests)
+
+    @app.route('/habits')
+    @login_required
+    def habits():
+        user_habits = Habit.query.filter_by(user_id=current_user.id).all()
+        return render_template('dashboard/habits.html', habits=user_habits)
+
+    @app.route('/habits/create', methods=['POST'])
+    @login_required
+    def create_habit():
+        name = request.form.get('name')
+        description = request.form.get('description')
+        frequency = request.form.get('frequency', 'daily')
+    
+        habit = Habit(
+            user_id=current_user.id,
+            name=name,
+            description=description,
+            frequency=frequency
+        )
+        db.session.add(habit)
+        db.session.commit()
+    
+        flash('Habit created successfully!', 'success')
+        return redirect(url_for('habits'))
+
+    @app.route('/habits/<int:habit_id>/edit', methods=['POST'])
+    @login_required
+    def edit_habit(habit_id):
+        habit = Habit.query.get_or_404(habit_id)
+    
+        if habit.user_id != current_user.id:
+            flash('Unauthorized access.', 'danger')
+            return redirect(url_for('habits'))
+    
+        habit.name = request.form.get('name', habit.name)
+        habit.description = request.form.get('description', habit.description)
+        habit.frequency = request.form.get('frequency', habit.frequency)
+    
+        db.session.commit()
+        flash('Habit updated successfully!', 'success')
+        return redirect(url_for('habits'))
+
+    @app.route('/habits/<int:habit_id>/delete', methods=['POST'])
+    @login_required
+    def delete_habit(habit_id):
+        habit = Habit.query.get_or_404(habit_id)
+    
+        if habit.user_id != current_user.id:
+            flash('Unauthorized access.', 'danger')
+            return redirect(url_for('habits'))
+    
+        db.session.delete(habit)
+        db.session.commit()
+        flash('Habit deleted successfully!', 'success')
+        return redirect(url_for('habits'))
+
+    @app.route('/habits/<int:habit_id>/complete', methods=['POST'])
+    @login_required
+    def complete_habit(habit_id):
+        habit = Habit.query.get_or_404(habit_id)
+    
+        if habit.user_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        # Check if already completed today
+        today = datetime.utcnow().date()
+        if habit.last_completed and habit.last_completed.date() == today:
+            return jsonify({'success': False, 'message': 'Already completed today'})
+    
+        # Log completion
+        log = HabitLog(user_id=current_user.id, habit_id=habit_id)
+        db.session.add(log)
+    
+        # Update streak
+        yesterday = today - timedelta(days=1)
+    
+        if habit.last_completed:
+            last_completed_date = habit.last_completed.date()
+        
+            if last_completed_date == today:
+                # Already completed today
+                pass
+            elif last_completed_date == yesterday:
+                # Consecutive day
+                habit.streak_count += 1
+            else:
+                # Broken streak
+                habit.streak_count = 1
+        else:
+            # First completion
+            habit.streak_count = 1
+    
+        # Update best streak
+        if habit.streak_count > habit.best_streak:
+            habit.best_streak = habit.streak_count
+    
+        habit.last_completed = datetime.utcnow()
+        db.session.commit()
+    
+        return jsonify({'success': True, 'streak': habit.streak_count})
+
+    @app.route('/api/habits/<int:habit_id>')
+    @login_required
+    def get_habit_api(habit_id):
+        habit = Habit.query.get_or_404(habit_id)
+    
+        if habit.user_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        return jsonify({
+            'id': habit.id,
+            'name': habit.name,
+            'description': habit.description,
+            'frequency': habit.frequency,
+            'streak_count': habit.streak_count,
+            'best_streak': habit.best_streak,
+            'last_completed': habit.last_completed.isoformat() if habit.last_completed else None
+        })
+
+    @app.route('/api/notifications')
+    @login_required
+    def get_notifications():
+        """Get user notifications, newest first; pass next_cursor back as ?cursor= for more"""
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        try:
+            notifications, next_cursor = page_notifications(
+                current_user.id, request.args.get('cursor'), limit=max(limit, 1))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    
+        return jsonify({
+            'success': True,
+            'notifications': [{
+                'id': n.id,
+                'text': n.text,
+                'link': n.link,
+                'is_read': n.is_read,
+                'count': n.count,
+                'timestamp': n.timestamp.isoformat(),
+                'time_ago': timesince_filter(n.timestamp)
+            } for n in notifications],
+            'next_cursor': next_cursor
+        })
+
+    @app.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
+    @login_required
+    def mark_notification_read(notification_id):
+        """Mark a notification as read"""
+        notification = Notification.query.get_or_404(notification_id)
+    
+        if notification.user_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        # The counter update and count push happen on commit (notifications.py)
+        notification.is_read = True
+        db.session.commit()
+    
+        return jsonify({'success': True, 'unread_count': current_user.unread_notifications})
+
+    @app.route('/api/notifications/read-all', methods=['POST'])
+    @login_required
+    def mark_all_notifications_read():
+        """Mark all notifications as read"""
+        mark_all_read(current_user.id)
+        db.session.commit()
+    
+        return jsonify({'success': True, 'unread_count': 0})
+
+    @app.route('/api/notifications/unread-count')
+    @login_required
+    def get_unread_notification_count():
+        """Get count of unread notifications (no COUNT query; see notifications.py)"""
+        return jsonify({'count': current_user.unread_notifications})
+
+    @app.route('/analytics')
+    @login_required
+    @replica_reads
+    def analytics():
+        # Get habit completion stats (last 30 days)
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+    
+        habit_stats = []
+        for habit in habits:
+            # Count completions in last 30 days
+            completions = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= thirty_days_ago
+            ).count()
+        
+            percentage = (completions / 30) * 100 if completions > 0 else 0
+        
+            habit_stats.append({
+                'id': habit.id,
+                'name': habit.name,
+                'description': habit.description,
+                'streak': habit.streak_count,
+                'best_streak': habit.best_streak,
+                'completion_rate': round(percentage, 1)
+            })
+    
+        # Get friend comparison data
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friend_comparison = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend = User.query.get(friendship.friend_id)
+            else:
+                friend = User.query.get(friendship.user_id)
+        
+            friend_habits = Habit.query.filter_by(user_id=friend.id).all()
+            friend_total_streak = sum(h.streak_count for h in friend_habits)
+            friend_total_habits = len(friend_habits)
+        
+            # Calculate friend score (streak days + habit count)
+            friend_score = friend_total_streak * 10 + friend_total_habits * 5
+        
+            friend_comparison.append({
+                'id': friend.id,
+                'username': friend.username,
+                'total_habits': friend_total_habits,
+                'total_streak': friend_total_streak,
+                'score': friend_score
+            })
+    
+        # Sort friends by score
+        friend_comparison.sort(key=lambda x: x['score'], reverse=True)
+    
+        # Calculate user stats
+        total_streak = sum(h.streak_count for h in habits)
+        total_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= thirty_days_ago
+        ).count()
+    
+        completion_rate = (total_completions / (len(habits) * 30)) * 100 if habits else 0
+    
+        # Get active friends (friends with activity in last 7 days)
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        active_friends = 0
+        for friend in friend_comparison:
+            friend_activity = HabitLog.query.join(Habit).filter(
+                Habit.user_id == friend['id'],
+                HabitLog.completed_at >= seven_days_ago
+            ).first()
+        
+            if friend_activity:
+                active_friends += 1
+    
+        # Calculate trend (compare last 7 days with previous 7 days)
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        two_weeks_ago = datetime.utcnow() - timedelta(days=14)
+    
+        recent_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= week_ago
+        ).count()
+    
+        previous_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= two_weeks_ago,
+            HabitLog.completed_at < week_ago
+        ).count()
+    
+        trend = 0
+        if previous_completions > 0:
+            trend = ((recent_completions - previous_completions) / previous_completions) * 100
+    
+        return render_template('dashboard/analytics.html',
+                             habit_stats=habit_stats,
+                             friend_comparison=friend_comparison[:10],  # Top 10 only
+                             total_streak=total_streak,
+                             completion_rate=round(completion_rate, 1),
+                             active_friends=active_friends,
+                             trend=round(trend, 1))
+
+    @app.route('/api/analytics')
+    @login_required
+    @replica_reads
+    def get_analytics_api():
+        days = int(request.args.get('range', 30))
+    
+        # Calculate date range
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+    
+        # Get user's habits
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+    
+        # Calculate stats
+        total_streak = sum(h.streak_count for h in habits)
+        total_completions = 0
+        total_possible = len(habits) * days
+    
+        for habit in habits:
+            completions = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= start_date
+            ).count()
+            total_completions += completions
+    
+        completion_rate = (total_completions / total_possible * 100) if total_possible > 0 else 0
+    
+        # Get active friends
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        active_friends = 0
+        friend_ids = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend_id = friendship.friend_id
+            else:
+                friend_id = friendship.user_id
+        
+            friend_ids.append(friend_id)
+            # Check if friend was active in last 7 days
+            recent_activity = HabitLog.query.join(Habit).filter(
+                Habit.user_id == friend_id,
+                HabitLog.completed_at >= end_date - timedelta(days=7)
+            ).first()
+        
+            if recent_activity:
+                active_friends += 1
+    
+        # Calculate trend (compare last 7 days with previous 7 days)
+        week_ago = end_date - timedelta(days=7)
+        two_weeks_ago = end_date - timedelta(days=14)
+    
+        recent_completions = 0
+        previous_completions = 0
+    
+        for habit in habits:
+            recent = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= week_ago
+            ).count()
+            recent_completions += recent
+        
+            previous = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= two_weeks_ago,
+                HabitLog.completed_at < week_ago
+            ).count()
+            previous_completions += previous
+    
+        trend = 0
+        if previous_completions > 0:
+            trend = ((recent_completions - previous_completions) / previous_completions) * 100
+    
+        # Generate weekly completion data for chart
+        weekly_data = []
+        weekly_labels = []
+    
+        for i in range(4):
+            week_start = start_date + timedelta(days=i*7)
+            week_end = week_start + timedelta(days=7)
+        
+            week_completions = 0
+            for habit in habits:
+                completions = HabitLog.query.filter(
+                    HabitLog.habit_id == habit.id,
+                    HabitLog.completed_at >= week_start,
+                    HabitLog.completed_at < week_end
+                ).count()
+                week_completions += completions
+        
+            week_possible = len(habits) * 7
+            week_rate = (week_completions / week_possible * 100) if week_possible > 0 else 0
+        
+            weekly_data.append(round(week_rate, 1))
+            weekly_labels.append(f"Week {i+1}")
+    
+        # Generate habit distribution data
+        habit_data = []
+        for habit in habits[:5]:  # Top 5 habits
+            completions = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= start_date
+            ).count()
+        
+            habit_data.append({
+                'name': habit.name,
+                'completions': completions
+            })
+    
+        return jsonify({
+            'stats': {
+                'totalStreak': total_streak,
+                'completionRate': round(completion_rate, 1),
+                'activeFriends': active_friends,
+                'trend': round(trend, 1)
+            },
+            'charts': {
+                'completion': {
+                    'labels': weekly_labels,
+                    'data': weekly_data
+                },
+                'distribution': {
+                    'labels': [h['name'] for h in habit_data],
+                    'data': [h['completions'] for h in habit_data]
+                }
+            }
+        })
+
+    @app.route('/api/analytics/export')
+    @login_required
+    def export_analytics():
+        # Generate CSV data
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    
+        csv_data = "Habit,Current Streak,Best Streak,30-Day Completions,Completion Rate\n"
+        for habit in habits:
+            completions = HabitLog.query.filter(
+                HabitLog.habit_id == habit.id,
+                HabitLog.completed_at >= thirty_days_ago
+            ).count()
+        
+            completion_rate = (completions / 30 * 100) if completions > 0 else 0
+        
+            csv_data += f"{habit.name},{habit.streak_count},{habit.best_streak},{completions},{round(completion_rate, 1)}%\n"
+    
+        return Response(
+            csv_data,
+            mimetype="text/csv",
+            headers={"Content-disposition": "attachment; filename=habithero-analytics.csv"}
+        )
+
+    @app.route('/profile')
+    @login_required
+    @replica_reads
+    def profile():
+        """User profile page"""
+        # Get user stats
+        total_habits = Habit.query.filter_by(user_id=current_user.id).count()
+    
+        # Calculate current streak (longest current streak among habits)
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+        current_streak = max([h.streak_count for h in habits], default=0)
+    
+        # Count snaps sent
+        snaps_sent = Snap.query.filter_by(sender_id=current_user.id).count()
+    
+        # Count friends
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+        friends_count = len(set([f.user_id for f in friendships] + [f.friend_id for f in friendships])) - 1
+    
+        # Get recent activity (last 7 days)
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        recent_activity = []
+    
+        # Add habit completions from last 7 days
+        recent_logs = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= seven_days_ago
+        ).order_by(HabitLog.completed_at.desc()).limit(10).all()
+    
+        for log in recent_logs:
+            recent_activity.append({
+                'icon': 'fas fa-check-circle',
+                'title': f'Completed "{log.habit.name}"',
+                'time': timesince_filter(log.completed_at),
+                'type': 'habit'
+            })
+    
+        # Add snap activity from last 7 days
+        recent_snaps = Snap.query.filter(
+            Snap.sender_id == current_user.id,
+            Snap.created_at >= seven_days_ago
+        ).order_by(Snap.created_at.desc()).limit(10).all()
+    
+        for snap in recent_snaps:
+            recent_activity.append({
+                'icon': 'fas fa-camera',
+                'title': f'Sent snap to {snap.receiver.username}',
+                'time': timesince_filter(snap.created_at),
+                'type': 'snap'
+            })
+    
+        # Add friend activity from last 7 days
+        recent_friends = Friend.query.filter(
+            (Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id),
+            Friend.status == 'accepted',
+            Friend.created_at >= seven_days_ago
+        ).order_by(Friend.created_at.desc()).limit(10).all()
+    
+        for friend in recent_friends:
+            if friend.user_id == current_user.id:
+                friend_user = User.query.get(friend.friend_id)
+                recent_activity.append({
+                    'icon': 'fas fa-user-plus',
+                    'title': f'Added {friend_user.username} as friend',
+                    'time': timesince_filter(friend.created_at),
+                    'type': 'friend'
+                })
+    
+        # Sort by time (newest first)
+        recent_activity.sort(key=lambda x: x['time'], reverse=True)
+        recent_activity = recent_activity[:10]  # Limit to 10 most recent
+    
+        # Get user bio - handle if column doesn't exist
+        bio = ''
+        if hasattr(current_user, 'bio'):
+            bio = current_user.bio if current_user.bio else ''
+    
+        # Get user avatar - handle if column doesn't exist
+        avatar = ''
+        if hasattr(current_user, 'avatar'):
+            avatar = current_user.avatar if current_user.avatar else ''
+    
+        # Calculate total streaks
+        total_streaks = sum(h.streak_count for h in habits)
+    
+        # Get best streak
+        best_streak = max([h.best_streak for h in habits], default=0)
+    
+        # Get completion rate for last 30 days
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        total_completions = HabitLog.query.join(Habit).filter(
+            Habit.user_id == current_user.id,
+            HabitLog.completed_at >= thirty_days_ago
+        ).count()
+    
+        total_possible = total_habits * 30
+        completion_rate = (total_completions / total_possible * 100) if total_possible > 0 else 0
+    
+        return render_template('dashboard/profile.html',
+                             total_habits=total_habits,
+                             current_streak=current_streak,
+                             best_streak=best_streak,
+                             total_streaks=total_streaks,
+                             snaps_sent=snaps_sent,
+                             friends_count=friends_count,
+                             recent_activity=recent_activity,
+                             bio=bio,
+                             avatar=avatar,
+                             completion_rate=round(completion_rate, 1),
+                             total_completions=total_completions)
+
+    @app.route('/api/profile/update', methods=['POST'])
+    @login_required
+    def update_profile():
+        """Update user profile information"""
+        data = request.get_json()
+        username = data.get('username', '').strip()
+        bio = data.get('bio', '').strip()
+    
+        # Validate username
+        if not username:
+            return jsonify({'success': False, 'message': 'Username is required'})
+    
+        if len(username) < 3:
+            return jsonify({'success': False, 'message': 'Username must be at least 3 characters'})
+    
+        if len(username) > 20:
+            return jsonify({'success': False, 'message': 'Username cannot exceed 20 characters'})
+    
+        # Check if username is already taken (by another user)
+        if username_taken(username, exclude_user_id=current_user.id):
+            return jsonify({'success': False, 'message': 'Username already taken'})
+    
+        # Update user profile
+        try:
+            current_user.username = username
+        
+            # Only update bio if the column exists
+            if hasattr(current_user, 'bio'):
+                current_user.bio = bio
+        
+            db.session.commit()
+        
+            return jsonify({
+                'success': True,
+                'message': 'Profile updated successfully',
+                'new_username': current_user.username
+            })
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error updating profile: {str(e)}'})
+
+    @app.route('/api/profile/change-password', methods=['POST'])
+    @login_required
+    def change_password():
+        """Change user password"""
+        data = request.get_json()
+        current_password = data.get('current_password', '')
+        new_password = data.get('new_password', '')
+        confirm_password = data.get('confirm_password', '')
+    
+        # Validate inputs
+        if not current_password or not new_password or not confirm_password:
+            return jsonify({'success': False, 'message': 'All password fields are required'})
+    
+        # Verify current password
+        if not bcrypt.check_password_hash(current_user.password_hash, current_password):
+            return jsonify({'success': False, 'message': 'Current password is incorrect'})
+    
+        # Check if new passwords match
+        if new_password != confirm_password:
+            return jsonify({'success': False, 'message': 'New passwords do not match'})
+    
+        # Validate new password strength
+        errors = validate_password(new_password)
+        if errors:
+            return jsonify({'success': False, 'message': errors[0]})
+    
+        # Update password
+        try:
+            current_user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+            db.session.commit()
+        
+            return jsonify({'success': True, 'message': 'Password changed successfully'})
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error changing password: {str(e)}'})
+
+    @app.route('/api/profile/update-avatar', methods=['POST'])
+    @login_required
+    def update_avatar():
+        """Update user avatar"""
+        data = request.get_json()
+        avatar_type = data.get('avatar', '').strip()
+    
+        if not avatar_type:
+            return jsonify({'success': False, 'message': 'Avatar type is required'})
+    
+        try:
+            # Only update if column exists
+            if hasattr(current_user, 'avatar'):
+                current_user.avatar = avatar_type
+        
+            db.session.commit()
+        
+            return jsonify({
+                'success': True, 
+                'message': 'Avatar updated successfully',
+                'avatar': avatar_type
+            })
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error updating avatar: {str(e)}'})
+
+    @app.route('/settings')
+    @login_required
+    def settings():
+        """Settings page - redirects to profile for now"""
+        return redirect(url_for('profile'))
+
+    @app.route('/privacy')
+    def privacy():
+        """Privacy policy page"""
+        return render_template('service/privacy.html')
+
+    @app.route('/terms')
+    def terms():
+        """Terms of service page"""
+        return render_template('service/terms.html')
+
+    @app.route('/contact')
+    def contact():
+        """Contact page"""
+        return render_template('service/contact.html')
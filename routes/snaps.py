@@ -0,0 +1,510 @@
+# routes/snaps.py - Sending, viewing, reacting to and downloading snaps
+import os
+from datetime import datetime, timedelta
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response
+from flask_login import login_required, current_user
+from extensions import db, socketio
+from models import User, Habit, Friend, Snap, SnapReaction
+from helpers import allowed_file, get_file_type, save_snap_file, get_saved_snaps_ids
+from media import send_media
+from video_worker import enqueue_video
+from snap_reaper import reap_expired_snaps
+from jobs import snap_models
+
+
+def register_snap_routes(app):
+    """Register snap routes"""
+
+    @app.route('/snaps')
+    @login_required
+    def snaps():
+        # Get received snaps (last 30 days)
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        received_snaps = Snap.query.filter_by(receiver_id=current_user.id)\
+            .filter(Snap.created_at >= thirty_days_ago)\
+            .order_by(Snap.created_at.desc())\
+            .all()
+    
+        # Get sent snaps (last 30 days)
+        sent_snaps = Snap.query.filter_by(sender_id=current_user.id)\
+            .filter(Snap.created_at >= thirty_days_ago)\
+            .order_by(Snap.created_at.desc())\
+            .all()
+    
+        # Get friends for sending snaps
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friends = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend = User.query.get(friendship.friend_id)
+            else:
+                friend = User.query.get(friendship.user_id)
+            friends.append(friend)
+    
+        # Get habits
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+    
+        # Get friend activity for suggestions
+        friend_ids = [f.id for f in friends]
+        friend_activity = []
+        if friend_ids:
+            friend_activity = Snap.query.filter(Snap.sender_id.in_(friend_ids))\
+                .filter(Snap.created_at >= thirty_days_ago)\
+                .order_by(Snap.created_at.desc())\
+                .limit(4)\
+                .all()
+    
+        return render_template('dashboard/snaps.html',
+                             received_snaps=received_snaps,
+                             sent_snaps=sent_snaps,
+                             friends=friends,
+                             habits=habits,
+                             friend_activity=friend_activity)
+
+    @app.route('/snaps/send', methods=['POST'])
+    @login_required
+    def send_snap():
+        receiver_id = request.form.get('receiver_id')
+        habit_id = request.form.get('habit_id')
+        caption = request.form.get('caption')
+        text_content = request.form.get('text')
+    
+        # Check if receiver is a friend
+        friendship = Friend.query.filter(
+            ((Friend.user_id == current_user.id) & (Friend.friend_id == receiver_id)) |
+            ((Friend.user_id == receiver_id) & (Friend.friend_id == current_user.id))
+        ).filter_by(status='accepted').first()
+    
+        if not friendship:
+            return jsonify({'success': False, 'message': 'You can only send snaps to friends'}), 403
+    
+        # Handle file upload
+        file = request.files.get('snap_file')
+        content_type = 'text'
+        content = text_content or caption or ''
+    
+        if file and allowed_file(file.filename):
+            # Save file
+            file_path = save_snap_file(file, current_user.id)
+            if not file_path:
+                return jsonify({'success': False, 'message': 'Failed to save file'}), 500
+        
+            # Determine content type
+            content_type = get_file_type(file.filename)
+            content = file_path
+        
+            # Check file size
+            file.seek(0, os.SEEK_END)
+            file_size = file.tell()
+            file.seek(0)
+        
+            max_size = 50 * 1024 * 1024  # 50MB for videos
+            if content_type == 'image':
+                max_size = 10 * 1024 * 1024  # 10MB for images
+        
+            if file_size > max_size:
+                # Delete the saved file
+                full_path = os.path.join(app.config['UPLOAD_FOLDER'], file_path)
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+                return jsonify({'success': False, 'message': f'File size exceeds {max_size//(1024*1024)}MB limit'}), 400
+    
+        # Validate content
+        if not content:
+            return jsonify({'success': False, 'message': 'Please provide content for the snap'}), 400
+    
+        # Create snap with 24-hour expiry
+        expires_at = datetime.utcnow() + timedelta(hours=24)
+    
+        snap = Snap(
+            sender_id=current_user.id,
+            receiver_id=receiver_id,
+            habit_id=habit_id if habit_id else None,
+            content_type=content_type,
+            content=content,
+            caption=caption,
+            expires_at=expires_at,
+            transcode_status='pending' if content_type == 'video' else None
+        )
+        db.session.add(snap)
+        db.session.commit()
+    
+        # Transcode and extract a poster in the background
+        if content_type == 'video':
+            enqueue_video(snap.id)
+    
+        # Notify receiver via SocketIO
+        socketio.emit('new_snap', {
+            'from': current_user.username,
+            'from_id': current_user.id,
+            'snap_id': snap.id
+        }, room=f'user_{receiver_id}')
+    
+        return jsonify({'success': True, 'message': 'Snap sent successfully!', 'snap_id': snap.id})
+
+    @app.route('/send-snap')
+    @login_required
+    def send_snap_page():
+        """Page to select friends to send snap to"""
+        # Get friends for selection
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+    
+        friends_list = []
+        for friendship in friendships:
+            if friendship.user_id == current_user.id:
+                friend = User.query.get(friendship.friend_id)
+            else:
+                friend = User.query.get(friendship.user_id)
+        
+            if friend:
+                friends_list.append(friend)
+    
+        # Get user's habits
+        habits = Habit.query.filter_by(user_id=current_user.id).all()
+    
+        return render_template('dashboard/send_snap.html',
+                             friends=friends_list,
+                             habits=habits)
+
+    @app.route('/snaps/<int:snap_id>/view', methods=['POST'])
+    @login_required
+    def view_snap(snap_id):
+        snap = Snap.query.get_or_404(snap_id)
+    
+        if snap.receiver_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        if not snap.is_viewed:
+            snap.is_viewed = True
+            db.session.commit()
+        
+            # Notify sender
+            socketio.emit('snap_viewed', {
+                'snap_id': snap_id,
+                'viewer': current_user.username,
+                'viewer_id': current_user.id
+            }, room=f'user_{snap.sender_id}')
+    
+        return jsonify({'success': True})
+
+    @app.route('/snaps/<int:snap_id>/react', methods=['POST'])
+    @login_required
+    def react_to_snap(snap_id):
+        snap = Snap.query.get_or_404(snap_id)
+        data = request.get_json()
+        emoji = data.get('emoji')
+    
+        if not emoji:
+            return jsonify({'success': False, 'message': 'No emoji provided'}), 400
+    
+        # Check if user can react (sender or receiver)
+        if snap.sender_id != current_user.id and snap.receiver_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        # Check if already reacted with same emoji
+        existing_reaction = SnapReaction.query.filter_by(
+            snap_id=snap_id,
+            user_id=current_user.id,
+            emoji=emoji
+        ).first()
+    
+        if existing_reaction:
+            # Remove reaction
+            db.session.delete(existing_reaction)
+            action = 'removed'
+        else:
+            # Add reaction
+            reaction = SnapReaction(snap_id=snap_id, user_id=current_user.id, emoji=emoji)
+            db.session.add(reaction)
+            action = 'added'
+    
+        db.session.commit()
+    
+        # Notify other user
+        other_user_id = snap.receiver_id if snap.sender_id == current_user.id else snap.sender_id
+        socketio.emit('snap_reaction', {
+            'snap_id': snap_id,
+            'emoji': emoji,
+            'from': current_user.username,
+            'from_id': current_user.id,
+            'action': action
+        }, room=f'user_{other_user_id}')
+    
+        return jsonify({'success': True, 'action': action})
+
+    # Add these API endpoints for snap functionality
+    @app.route('/api/snaps/<int:snap_id>')
+    @login_required
+    def get_snap_details(snap_id):
+        """Get detailed information about a specific snap"""
+        snap = Snap.query.get_or_404(snap_id)
+    
+        # Check if user can view this snap
+        if snap.sender_id != current_user.id and snap.receiver_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        return jsonify({
+            'success': True,
+            'snap': {
+                'id': snap.id,
+                'sender_id': snap.sender_id,
+                'sender_username': snap.sender.username,
+                'receiver_id': snap.receiver_id,
+                'receiver_username': snap.receiver.username,
+                'habit_id': snap.habit_id,
+                'content_type': snap.content_type,
+                'content': snap.content,
+                'poster': snap.poster,
+                'transcode_status': snap.transcode_status,
+                'caption': snap.caption,
+                'is_viewed': snap.is_viewed,
+                'created_at': snap.created_at.isoformat(),
+                'expires_at': snap.expires_at.isoformat(),
+                'reactions': [{
+                    'id': r.id,
+                    'emoji': r.emoji,
+                    'user_id': r.user_id,
+                    'username': r.user.username,
+                    'created_at': r.created_at.isoformat()
+                } for r in snap.reactions]
+            }
+        })
+
+    @app.route('/api/snaps/received')
+    @login_required
+    def get_received_snaps():
+        """Get received snaps for the current user"""
+        try:
+            # Get received snaps (last 30 days)
+            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+            received_snaps = Snap.query.filter_by(receiver_id=current_user.id)\
+                .filter(Snap.created_at >= thirty_days_ago)\
+                .order_by(Snap.created_at.desc())\
+                .all()
+        
+            snaps_data = []
+            for snap in received_snaps:
+                # Check if snap is saved
+                is_saved = snap.id in get_saved_snaps_ids(current_user.id)
+            
+                snaps_data.append({
+                    'id': snap.id,
+                    'sender_id': snap.sender_id,
+                    'sender_username': snap.sender.username,
+                    'content_type': snap.content_type,
+                    'content': snap.content,
+                    'caption': snap.caption,
+                    'is_viewed': snap.is_viewed,
+                    'created_at': snap.created_at.isoformat(),
+                    'expires_at': snap.expires_at.isoformat(),
+                    'is_saved': is_saved
+                })
+        
+            return jsonify({
+                'success': True,
+                'snaps': snaps_data
+            })
+        
+        except Exception as e:
+            print(f"Error getting received snaps: {e}")
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    @app.route('/snaps/<int:snap_id>/download')
+    @login_required
+    def download_snap(snap_id):
+        """Download a snap file"""
+        snap = Snap.query.get_or_404(snap_id)
+    
+        # Check if user can download this snap
+        if snap.sender_id != current_user.id and snap.receiver_id != current_user.id:
+            flash('Unauthorized access.', 'danger')
+            return redirect(url_for('snaps'))
+    
+        if snap.content_type == 'text':
+            # For text snaps, create a text file
+            content = f"Snap from {snap.sender.username}\n\n"
+            content += f"Sent: {snap.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            content += f"Expires: {snap.expires_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            content += f"Content:\n{snap.content}\n\n"
+            if snap.caption:
+                content += f"Caption: {snap.caption}\n"
+        
+            # Create response with text file
+            response = Response(
+                content,
+                mimetype="text/plain",
+                headers={
+                    "Content-Disposition": f"attachment; filename=snap_{snap.id}_{snap.created_at.strftime('%Y%m%d_%H%M%S')}.txt"
+                }
+            )
+            return response
+    
+        elif snap.content_type in ['image', 'video']:
+            # For image/video, serve the file
+            if snap.content:
+                file_path = os.path.join(app.config['UPLOAD_FOLDER'], snap.content)
+                if os.path.exists(file_path):
+                    # Determine appropriate filename
+                    filename = f"snap_{snap.id}_{snap.created_at.strftime('%Y%m%d_%H%M%S')}"
+                    if snap.content_type == 'image':
+                        ext = os.path.splitext(snap.content)[1] or '.jpg'
+                        filename += ext
+                    else:  # video
+                        ext = os.path.splitext(snap.content)[1] or '.mp4'
+                        filename += ext
+                
+                    return send_media(
+                        snap.content,
+                        as_attachment=True,
+                        download_name=filename
+                    )
+    
+        flash('Snap file not found.', 'danger')
+        return redirect(url_for('snaps'))
+
+    @app.route('/api/snaps/<int:snap_id>/download-info')
+    @login_required
+    def get_snap_download_info(snap_id):
+        """Get information for downloading a snap"""
+        snap = Snap.query.get_or_404(snap_id)
+    
+        # Check if user can access this snap
+        if snap.sender_id != current_user.id and snap.receiver_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+        return jsonify({
+            'success': True,
+            'snap': {
+                'id': snap.id,
+                'content_type': snap.content_type,
+                'filename': snap.content,
+                'created_at': snap.created_at.isoformat(),
+                'sender_username': snap.sender.username,
+                'caption': snap.caption
+            }
+        })
+
+    @app.route('/api/snaps/sent')
+    @login_required
+    def get_sent_snaps():
+        """Get sent snaps for the current user"""
+        try:
+            # Get sent snaps (last 30 days)
+            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+            sent_snaps = Snap.query.filter_by(sender_id=current_user.id)\
+                .filter(Snap.created_at >= thirty_days_ago)\
+                .order_by(Snap.created_at.desc())\
+                .all()
+        
+            snaps_data = []
+            for snap in sent_snaps:
+                snaps_data.append({
+                    'id': snap.id,
+                    'receiver_id': snap.receiver_id,
+                    'receiver_username': snap.receiver.username,
+                    'content_type': snap.content_type,
+                    'content': snap.content,
+                    'caption': snap.caption,
+                    'is_viewed': snap.is_viewed,
+                    'created_at': snap.created_at.isoformat(),
+                    'expires_at': snap.expires_at.isoformat(),
+                })
+        
+            return jsonify({
+                'success': True,
+                'sent_snaps': snaps_data
+            })
+        
+        except Exception as e:
+            print(f"Error getting sent snaps: {e}")
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    # API endpoints for camera functionality
+    @app.route('/api/camera/save', methods=['POST'])
+    @login_required
+    def save_camera_photo():
+        """Save photo taken with camera"""
+        if 'photo' not in request.files:
+            return jsonify({'success': False, 'message': 'No photo provided'}), 400
+    
+        photo = request.files['photo']
+        if not allowed_file(photo.filename):
+            return jsonify({'success': False, 'message': 'Invalid file type'}), 400
+    
+        # Save the photo
+        file_path = save_snap_file(photo, current_user.id)
+        if not file_path:
+            return jsonify({'success': False, 'message': 'Failed to save photo'}), 500
+    
+        return jsonify({
+            'success': True,
+            'file_path': file_path,
+            'content_type': get_file_type(photo.filename)
+        })
+
+    @app.route('/api/snaps/recent')
+    @login_required
+    def get_recent_snaps():
+        """Get recent snaps for the user"""
+        limit = int(request.args.get('limit', 10))
+    
+        # Get received snaps
+        received_snaps = Snap.query.filter_by(receiver_id=current_user.id)\
+            .order_by(Snap.created_at.desc())\
+            .limit(limit)\
+            .all()
+    
+        # Get sent snaps
+        sent_snaps = Snap.query.filter_by(sender_id=current_user.id)\
+            .order_by(Snap.created_at.desc())\
+            .limit(limit)\
+            .all()
+    
+        def snap_to_dict(snap):
+            return {
+                'id': snap.id,
+                'sender_id': snap.sender_id,
+                'receiver_id': snap.receiver_id,
+                'sender_username': snap.sender.username,
+                'receiver_username': snap.receiver.username,
+                'content_type': snap.content_type,
+                'content': snap.content,
+                'caption': snap.caption,
+                'is_viewed': snap.is_viewed,
+                'created_at': snap.created_at.isoformat(),
+                'expires_at': snap.expires_at.isoformat(),
+                'reactions': [{
+                    'emoji': r.emoji,
+                    'user_id': r.user_id,
+                    'username': r.user.username
+                } for r in snap.reactions]
+            }
+    
+        return jsonify({
+            'received': [snap_to_dict(snap) for snap in received_snaps],
+            'sent': [snap_to_dict(snap) for snap in sent_snaps]
+        })
+
+    # Expired snaps are reaped by the background scheduler; this triggers a run on demand
+    @app.route('/admin/cleanup-expired-snaps')
+    @login_required
+    def cleanup_expired_snaps():
+        """Admin endpoint to clean up expired snaps"""
+        if not getattr(current_user, 'is_admin', False):
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+        metrics = reap_expired_snaps(app, db, snap_models(),
+                                     batch_size=app.config['SNAP_REAPER_BATCH_SIZE'])
+    
+        return jsonify({
+            'success': True,
+            'message': f"Cleaned up {metrics['snaps']} expired snaps",
+            'metrics': metrics
+        })
@@ -0,0 +1,171 @@
+# scheduler.py - In-process periodic job scheduler with DB-backed leader election
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+# Set to 1 in CLI entry points (clear.py, setup.py, ...) to keep jobs from starting
+DISABLE_ENV_VAR = 'HABITHERO_DISABLE_SCHEDULER'
+
+
+def scheduler_disabled():
+    """True when the current process opted out of background jobs"""
+    return os.environ.get(DISABLE_ENV_VAR, '').lower() in ('1', 'true', 'yes')
+
+
+class Job:
+    """A named periodic job and its timing metrics"""
+
+    def __init__(self, name, func, interval, jitter=0.1, leader_only=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.next_run = time.monotonic() + self._next_delay()
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_duration_ms = None
+        self.max_duration_ms = 0.0
+        self.total_duration_ms = 0.0
+        self.last_error = None
+
+    def _next_delay(self):
+        spread = self.interval * self.jitter
+        return max(1.0, self.interval + random.uniform(-spread, spread))
+
+    def schedule_next(self):
+        self.next_run = time.monotonic() + self._next_delay()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration_ms': self.last_duration_ms,
+            'max_duration_ms': round(self.max_duration_ms, 1),
+            'avg_duration_ms': round(self.total_duration_ms / self.runs, 1) if self.runs else None,
+            'last_error': self.last_error,
+        }
+
+
+class JobScheduler:
+    """Runs registered jobs on one daemon thread.
+
+    Jobs marked ``leader_only`` first take a lease on their row in the
+    ``job_lock`` table; when several web workers share a database, only
+    the lease holder runs the job and the others count it as skipped.
+    """
+
+    def __init__(self, app, db, lock_model, tick=1.0):
+        self.app = app
+        self.db = db
+        self.lock_model = lock_model
+        self.tick = tick
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.jobs = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_job(self, name, func, interval, jitter=0.1, leader_only=True):
+        self.jobs[name] = Job(name, func, interval, jitter, leader_only)
+        return self.jobs[name]
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+        print(f"✅ Started job scheduler with {len(self.jobs)} jobs ({', '.join(self.jobs)})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.tick)
+
+    def run_pending(self):
+        now = time.monotonic()
+        for job in list(self.jobs.values()):
+            if job.next_run <= now:
+                job.schedule_next()
+                self.run_job(job)
+
+    def run_job(self, job):
+        """Run a job now if this worker holds (or can take) its lease"""
+        with self.app.app_context():
+            try:
+                if job.leader_only and not self._acquire_lease(job):
+                    job.skipped += 1
+                    return False
+            except Exception as e:
+                self.db.session.rollback()
+                job.failures += 1
+                job.last_error = f'lease: {e}'
+                return False
+
+            started = time.perf_counter()
+            try:
+                job.func()
+                job.last_error = None
+            except Exception as e:
+                self.db.session.rollback()
+                job.failures += 1
+                job.last_error = str(e)
+                print(f"❌ Job {job.name} failed: {e}")
+            finally:
+                self.db.session.remove()
+                elapsed = (time.perf_counter() - started) * 1000
+                job.runs += 1
+                job.last_run = datetime.utcnow()
+                job.last_duration_ms = round(elapsed, 1)
+                job.total_duration_ms += elapsed
+                job.max_duration_ms = max(job.max_duration_ms, elapsed)
+        return True
+
+    def _acquire_lease(self, job):
+        """Take or renew this worker's lease on the job's lock row"""
+        Lock = self.lock_model
+        now = datetime.utcnow()
+        # Outlive one missed run, so a crashed leader hands over within ~2 intervals
+        expires_at = now + timedelta(seconds=job.interval * 2 + 30)
+
+        renewed = self.db.session.execute(
+            update(Lock)
+            .where(Lock.name == job.name)
+            .where((Lock.owner == self.worker_id) | (Lock.expires_at < now))
+            .values(owner=self.worker_id, expires_at=expires_at),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if renewed:
+            self.db.session.commit()
+            return True
+
+        try:
+            self.db.session.execute(
+                insert(Lock).values(name=job.name, owner=self.worker_id, expires_at=expires_at)
+            )
+            self.db.session.commit()
+            return True
+        except IntegrityError:
+            # Another worker holds a live lease
+            self.db.session.rollback()
+            return False
+
+    def stats(self):
+        return [job.stats() for job in self.jobs.values()]
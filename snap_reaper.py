@@ -0,0 +1,101 @@
+# snap_reaper.py - Batched removal of expired snaps and their media files
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import delete, exists, select
+
+# Only files under these upload subdirectories are ever unlinked
+MEDIA_PREFIXES = ('snaps/', 'videos/', 'posters/')
+
+# Metrics from the most recent run, for the admin endpoint and logs
+last_run_metrics = {}
+
+
+def reap_expired_snaps(app, db, models, batch_size=500, max_batches=None, file_workers=8):
+    """Delete expired snaps in bounded batches and unlink their files.
+
+    Each batch is one short transaction made of set-based
+    ``DELETE ... WHERE snap_id IN (...)`` statements, so locks are held
+    for a single batch rather than for the whole backlog. Saved snaps are
+    left alone. Files are removed in a thread pool after the batch commits.
+    """
+    global last_run_metrics
+
+    Snap = models.get('Snap')
+    SnapReaction = models.get('SnapReaction')
+    SavedSnap = models.get('SavedSnap')
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    metrics = {'snaps': 0, 'reactions': 0, 'files': 0, 'bytes_freed': 0, 'batches': 0}
+
+    is_saved = exists().where(SavedSnap.snap_id == Snap.id)
+    candidates = select(Snap.id, Snap.content, Snap.poster).where(
+        Snap.expires_at < now,
+        ~is_saved
+    ).order_by(Snap.id).limit(batch_size)
+
+    with ThreadPoolExecutor(max_workers=file_workers) as pool:
+        pending_unlinks = []
+
+        while max_batches is None or metrics['batches'] < max_batches:
+            rows = db.session.execute(candidates).all()
+            if not rows:
+                break
+
+            snap_ids = [row.id for row in rows]
+            try:
+                metrics['reactions'] += db.session.execute(
+                    delete(SnapReaction).where(SnapReaction.snap_id.in_(snap_ids)),
+                    execution_options={'synchronize_session': False}
+                ).rowcount
+                metrics['snaps'] += db.session.execute(
+                    delete(Snap).where(Snap.id.in_(snap_ids)),
+                    execution_options={'synchronize_session': False}
+                ).rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            metrics['batches'] += 1
+
+            for row in rows:
+                for relative_path in (row.content, row.poster):
+                    if relative_path and relative_path.startswith(MEDIA_PREFIXES):
+                        full_path = os.path.join(upload_folder, relative_path)
+                        pending_unlinks.append(pool.submit(_unlink, full_path))
+
+            if len(rows) < batch_size:
+                break
+
+        for future in pending_unlinks:
+            freed = future.result()
+            if freed is not None:
+                metrics['files'] += 1
+                metrics['bytes_freed'] += freed
+
+    metrics['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    last_run_metrics = dict(metrics, finished_at=datetime.utcnow().isoformat())
+
+    if metrics['snaps']:
+        print(f"🧹 Reaped {metrics['snaps']} expired snaps, {metrics['files']} files "
+              f"({metrics['bytes_freed'] // 1024} KB) in {metrics['duration_ms']}ms")
+
+    return metrics
+
+
+def _unlink(full_path):
+    """Remove a file and return the bytes freed, or None if it was already gone"""
+    try:
+        size = os.stat(full_path).st_size
+        os.remove(full_path)
+        return size
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"⚠️ Could not remove {full_path}: {e}")
+        return None
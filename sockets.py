@@ -0,0 +1,440 @@
+# sockets.py - Socket.IO event handlers for presence, chat and notifications
+import logging
+from datetime import datetime, timedelta
+from flask import request
+from flask_login import current_user
+from flask_socketio import emit, join_room
+from extensions import db, socketio
+from models import User, Friend, ChatMessage
+from helpers import mark_messages_read
+from db_engine import write_transaction
+from status_batcher import queue_status, status_batch
+from typing_state import clear_socket, update_typing
+from rate_limit import socket_rate_limit
+from chat_service import MessageSendError, clean_client_id, send_message
+
+log = logging.getLogger(__name__)
+
+
+###############################################################################
+# SOCKET.IO ROUTES - ADDED AT THE END AS REQUESTED
+###############################################################################
+@socketio.on('connect')
+def handle_connect():
+    """Handle user connection"""
+    if current_user.is_authenticated:
+        # Join user's personal room for notifications
+        join_room(f'user_{current_user.id}')
+        
+        # Update user status to online
+        current_user.is_online = True
+        current_user.last_seen = datetime.utcnow()
+        db.session.commit()
+
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+        
+        # Send status update to all friends
+        for friendship in friendships:
+            friend_id = friendship.friend_id if friendship.user_id == current_user.id else friendship.user_id
+            
+            # Send instant status update to friend
+            socketio.emit('user_status', {
+                'user_id': current_user.id, 
+                'status': 'online',
+                'username': current_user.username,
+                'timestamp': datetime.utcnow().isoformat(),
+                'reason': 'connected',
+                'instant': True  # Mark as instant update
+            }, room=f'user_{friend_id}')
+        
+        log.info('user connected', extra={'event': 'socket.connect', 'user_id': current_user.id,
+                                          'sid': request.sid, 'friends_notified': len(friendships)})
+
+
+@socketio.on('test_ping')
+def handle_test_ping(data):
+    """Test SocketIO connection"""
+    if current_user.is_authenticated:
+        emit('test_pong', {
+            'status': 'ok', 
+            'timestamp': data.get('timestamp'),
+            'server_time': datetime.utcnow().isoformat(),
+            'user_id': current_user.id,
+            'username': current_user.username
+        })
+    else:
+        emit('test_pong', {
+            'status': 'error',
+            'message': 'User not authenticated'
+        })
+
+
+@socketio.on('send_message')
+@socket_rate_limit('chat_send', error_event='send_message_error')
+def handle_send_message(data):
+    """Handle sending a chat message via Socket.IO - UPDATED"""
+    if not current_user.is_authenticated:
+        emit('send_message_error', {
+            'error': 'Not authenticated',
+            'temp_id': data.get('temp_id')
+        })
+        return
+    
+    receiver_id = data.get('receiver_id')
+    content = data.get('content', '').strip()
+    temp_id = data.get('temp_id')
+    
+    if not receiver_id or not content:
+        emit('send_message_error', {
+            'error': 'Missing receiver_id or content',
+            'temp_id': temp_id
+        })
+        return
+    
+    try:
+        receiver_id = int(receiver_id)
+    except (TypeError, ValueError):
+        emit('send_message_error', {
+            'error': 'Invalid receiver_id',
+            'temp_id': temp_id
+        })
+        return
+    
+    try:
+        try:
+            message, _ = send_message(current_user, receiver_id, content,
+                                      clean_client_id(temp_id), via='socket')
+        except MessageSendError as e:
+            emit('send_message_error', {
+                'error': e.message,
+                'temp_id': temp_id
+            })
+            return
+        
+        if message.get('queued'):
+            # Group commit: message_delivered follows once the batch is stored
+            emit('message_queued', {'temp_id': temp_id})
+            return
+        
+        # Delivery confirmation to the sender (retries get the stored message's id)
+        if temp_id:
+            emit('message_delivered', {
+                'temp_id': temp_id,
+                'message_id': message['id'],
+                'timestamp': message['timestamp'],
+                'status': message['status']
+            })
+        
+    except Exception:
+        log.exception('error sending chat message')
+        emit('send_message_error', {
+            'error': 'Internal server error',
+            'temp_id': temp_id
+        })
+
+
+@socketio.on('user_leaving')
+def handle_user_leaving(data):
+    """Handle when user explicitly leaves the chat"""
+    if current_user.is_authenticated:
+        log.info('user leaving', extra={'event': 'socket.leaving', 'user_id': current_user.id})
+        current_user.is_online = False
+        current_user.last_seen = datetime.utcnow()
+        db.session.commit()
+        
+        socketio.emit('user_status', {
+            'user_id': current_user.id, 
+            'status': 'offline',
+            'username': current_user.username,
+            'timestamp': datetime.utcnow().isoformat(),
+            'reason': 'left_chat'
+        }, to=None) 
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """Handle user disconnection - WITH DELAY TO PREVENT PREMATURE OFFLINE"""
+    clear_socket(request.sid)
+    if current_user.is_authenticated:
+        log.info('user disconnected', extra={'event': 'socket.disconnect', 'user_id': current_user.id,
+                                             'sid': request.sid})
+        
+        # IMPORTANT: Small delay to handle quick reconnections
+        # This prevents showing "offline" when user is actually reconnecting
+        import time
+        time.sleep(2)  # 2 second delay
+        
+        # Check if user has reconnected in the meantime
+        # If socket is still disconnected after delay, mark as offline
+        current_user.is_online = False
+        current_user.last_seen = datetime.utcnow()
+        db.session.commit()
+        
+        # Get all friends to notify them IMMEDIATELY
+        friendships = Friend.query.filter(
+            ((Friend.user_id == current_user.id) | (Friend.friend_id == current_user.id)) &
+            (Friend.status == 'accepted')
+        ).all()
+        
+        # Send immediate offline status to all friends
+        for friendship in friendships:
+            friend_id = friendship.friend_id if friendship.user_id == current_user.id else friendship.user_id
+            
+            socketio.emit('user_status', {
+                'user_id': current_user.id, 
+                'status': 'offline',
+                'username': current_user.username,
+                'timestamp': datetime.utcnow().isoformat(),
+                'reason': 'disconnected',
+                'instant': True  # Mark as instant update
+            }, room=f'user_{friend_id}')
+
+
+
+@socketio.on('request_status')
+def handle_status_request(data):
+    """Handle status check requests"""
+    if current_user.is_authenticated:
+        user_id = data.get('user_id')
+        
+        if user_id:
+            user = User.query.get(user_id)
+            if user:
+                # Check if user is actually online (connected in last 2 minutes)
+                two_minutes_ago = datetime.utcnow() - timedelta(minutes=2)
+                is_really_online = user.is_online and user.last_seen > two_minutes_ago
+                
+                # Update if incorrectly marked as online
+                if user.is_online and not is_really_online:
+                    user.is_online = False
+                    db.session.commit()
+                
+                emit('status_response', {
+                    'user_id': user.id,
+                    'status': 'online' if is_really_online else 'offline',
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+
+
+@socketio.on('join_chat')
+def handle_join_chat(data):
+    """Join a chat room"""
+    if current_user.is_authenticated:
+        user_id = data.get('user_id')
+        if user_id:
+            try:
+                user_id = int(user_id)
+                
+                # Create a unique room for this chat
+                room_name = f"chat_{min(current_user.id, user_id)}_{max(current_user.id, user_id)}"
+                join_room(room_name)
+                
+                # Also ensure user is in their personal room
+                join_room(f'user_{current_user.id}')
+                
+                emit('chat_joined', {
+                    'room': room_name,
+                    'user_id': user_id,
+                    'current_user_id': current_user.id
+                })
+                
+                log.debug('joined chat', extra={'event': 'socket.join_chat', 'user_id': current_user.id,
+                                                'peer_id': user_id})
+                
+            except Exception as e:
+                log.warning('invalid join_chat: %s', e, extra={'event': 'socket.join_chat'})
+                emit('chat_error', {'error': 'Invalid user ID'})
+
+
+@socketio.on('typing')
+def handle_typing(data):
+    """Handle typing indicator (only start/stop transitions reach the room)"""
+    if not current_user.is_authenticated:
+        return
+    
+    receiver_id = data.get('receiver_id')
+    is_typing = bool(data.get('is_typing', False))
+    
+    if not receiver_id:
+        return
+    
+    try:
+        receiver_id = int(receiver_id)
+        
+        # Emit to the chat room
+        room_name = f"chat_{min(current_user.id, receiver_id)}_{max(current_user.id, receiver_id)}"
+        
+        update_typing(request.sid, current_user.id, current_user.username, room_name, is_typing)
+        
+    except Exception as e:
+        log.warning('invalid typing event: %s', e, extra={'event': 'socket.typing'})
+
+
+@socketio.on('mark_read')
+def handle_mark_read(data):
+    """Mark messages as read and update status - UPDATED"""
+    if not current_user.is_authenticated:
+        return
+    
+    sender_id = data.get('sender_id')
+    
+    if not sender_id:
+        return
+    
+    try:
+        sender_id = int(sender_id)
+        
+        # One UPDATE ... RETURNING marks them read (status too) and gives back the ids
+        message_ids = mark_messages_read(sender_id, current_user.id)
+        
+        log.info('messages read', extra={'event': 'chat.read', 'reader_id': current_user.id,
+                                         'sender_id': sender_id, 'count': len(message_ids)})
+        
+        if message_ids:
+            # Notify sender with updated status (batched with other changes for that user)
+            queue_status(f'user_{sender_id}', message_ids, 'read')
+            
+            # Also send bulk notification
+            socketio.emit('messages_read', {
+                'reader_id': current_user.id,
+                'reader_username': current_user.username,
+                'sender_id': sender_id,
+                'count': len(message_ids),
+                'message_ids': message_ids,
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }, room=f'user_{sender_id}')
+        
+    except Exception:
+        log.exception('error marking messages read')
+        db.session.rollback()
+
+
+@socketio.on('friend_request')
+def handle_friend_request(data):
+    """Handle friend request notification"""
+    if current_user.is_authenticated:
+        receiver_id = data.get('receiver_id')
+        
+        if receiver_id:
+            emit('friend_request', {
+                'from': current_user.username,
+                'from_id': current_user.id,
+                'timestamp': datetime.utcnow().isoformat()
+            }, room=f'user_{receiver_id}')
+
+
+@socketio.on('new_snap')
+def handle_new_snap(data):
+    """Handle new snap notification"""
+    if current_user.is_authenticated:
+        receiver_id = data.get('receiver_id')
+        
+        if receiver_id:
+            emit('new_snap', {
+                'from': current_user.username,
+                'from_id': current_user.id,
+                'timestamp': datetime.utcnow().isoformat()
+            }, room=f'user_{receiver_id}')
+
+
+@socketio.on('message_delivered')
+def handle_message_delivered(data):
+    """Update message status to delivered when receiver comes online"""
+    if not current_user.is_authenticated:
+        return
+    
+    message_id = data.get('message_id')
+    
+    if not message_id:
+        return
+    
+    try:
+        # Find message (current user should be the receiver)
+        message = ChatMessage.query.get(message_id)
+        if message and message.receiver_id == current_user.id:
+            # Only update if not already read
+            if message.status != 'read':
+                with write_transaction():
+                    message.status = 'delivered'
+                
+                # Notify sender
+                queue_status(f'user_{message.sender_id}', [message.id], 'delivered')
+                
+                log.info('message delivered', extra={'event': 'chat.delivered', 'message_id': message_id})
+    
+    except Exception:
+        log.exception('error marking message delivered')
+
+
+@socketio.on('message_status_update')
+def handle_message_status_update(data):
+    """Forward status updates to frontend"""
+    message_id = data.get('message_id')
+    status = data.get('status')
+    
+    if message_id and status:
+        # Get message to find sender
+        message = ChatMessage.query.get(message_id)
+        if message:
+            # Emit to sender
+            queue_status(f'user_{message.sender_id}', [message.id], status)
+
+
+@socketio.on('request_delivery_status')
+def handle_delivery_status_request(data):
+    """Handle request to check delivery status of pending messages"""
+    if not current_user.is_authenticated:
+        return
+    
+    message_ids = data.get('message_ids', [])
+    receiver_id = data.get('receiver_id')
+    
+    if not message_ids or not receiver_id:
+        return
+    
+    try:
+        message_ids = [int(message_id) for message_id in message_ids][:500]
+    except (TypeError, ValueError):
+        return
+    
+    # Check if receiver is online
+    receiver = User.query.get(receiver_id)
+    is_receiver_online = bool(receiver and receiver.is_online)
+    
+    # One IN (...) query for the whole list, limited to this user's own messages
+    rows = db.session.query(ChatMessage.id, ChatMessage.status).filter(
+        ChatMessage.id.in_(message_ids),
+        ChatMessage.sender_id == current_user.id
+    ).all()
+    
+    # Read stays read; otherwise a message to an online receiver counts as delivered
+    updates = {
+        row.id: (row.status or 'sent') if row.status == 'read' or not is_receiver_online else 'delivered'
+        for row in rows
+    }
+    if updates:
+        batch = status_batch(updates)
+        batch['receiver_online'] = is_receiver_online
+        emit('message_status_batch', batch)
+
+
+# Socket.IO event handlers for message operations
+@socketio.on('message_deleted')
+def handle_message_deleted(data):
+    """Handle message deletion notification"""
+    message_id = data.get('message_id')
+    
+    # Forward to receiver
+    emit('message_deleted', data, room=f'user_{data.get("deleted_for_id", "")}')
+
+
+@socketio.on('message_edited')
+def handle_message_edited(data):
+    """Handle message edit notification"""
+    message_id = data.get('message_id')
+    
+    # Forward to receiver
+    emit('message_edited', data, room=f'user_{data.get("edited_for_id", "")}')
@@ -602,26 +602,30 @@ class HabitHeroChat {
       }
     });
 
+    // Group commit accepted the message; message_delivered follows once stored
+    this.socket.on("message_queued", (data) => {
+      console.log("📥 Message queued:", data);
+      if (data.temp_id) {
+        this.updateMessageStatus(data.temp_id, "sent");
+      }
+    });
+
     // CRITICAL: Handle immediate status updates from server
     this.socket.on("message_status_update", (data) => {
       console.log("🔄 IMMEDIATE Message status update from server:", data);
       if (data.message_id) {
-        // Update immediately on both sides
-        this.updateMessageStatusById(data.message_id, data.status);
-
-        // Also update in messages array for consistency
-        const messageIndex = this.messages.findIndex(
-          (m) => m.id === data.message_id
-        );
-        if (messageIndex !== -1) {
-          this.messages[messageIndex].status = data.status;
-          if (data.status === "read") {
-            this.messages[messageIndex].is_read = true;
-          }
-        }
+        this.applyMessageStatus(data.message_id, data.status);
       }
     });
 
+    // Status changes coalesced by the server (status_batcher.py)
+    this.socket.on("message_status_batch", (data) => {
+      console.log("🔄 Message status batch from server:", data);
+      (data.updates || []).forEach((update) => {
+        this.applyMessageStatus(update.message_id, update.status);
+      });
+    });
+
     this.socket.on("messages_read", (data) => {
       console.log("📖 Messages read event:", data);
       this.handleMessagesRead(data);
@@ -1030,12 +1034,17 @@ class HabitHeroChat {
         body: JSON.stringify({
           receiver_id: this.config.chatUserId,
           content: content,
+          client_id: tempId,
         }),
       });
 
       const data = await response.json();
 
-      if (data.success) {
+      if (data.success && data.message.queued) {
+        // Group commit: stored shortly, then confirmed by message_delivered
+        console.log("📥 HTTP send queued:", data);
+        this.updateMessageStatus(tempId, "sent");
+      } else if (data.success) {
         console.log("✅ HTTP send successful:", data);
 
         const isFriendOnline = this.isFriendOnline();
@@ -1337,6 +1346,7 @@ class HabitHeroChat {
       this.messageQueue.set(messageId, {
         ...msgData,
         status: status,
+        serverId: realId || msgData.serverId,
       });
 
       if (status === "delivered" || status === "read") {
@@ -1346,6 +1356,27 @@ class HabitHeroChat {
     }
   }
 
+  applyMessageStatus(messageId, status) {
+    // Update immediately on both sides
+    this.updateMessageStatusById(messageId, status);
+
+    // Pending sends are tracked by temp id; stop polling once the server confirms them
+    this.messageQueue.forEach((data) => {
+      if (data.serverId === messageId) {
+        data.status = status;
+      }
+    });
+
+    // Also update in messages array for consistency
+    const messageIndex = this.messages.findIndex((m) => m.id === messageId);
+    if (messageIndex !== -1) {
+      this.messages[messageIndex].status = status;
+      if (status === "read") {
+        this.messages[messageIndex].is_read = true;
+      }
+    }
+  }
+
   updateMessageStatusById(messageId, status) {
     const messageElement = document.querySelector(
       '[data-message-id="' + messageId + '"]'
@@ -1939,12 +1970,13 @@ class HabitHeroChat {
     const now = Date.now();
     const checkMessages = [];
 
-    this.messageQueue.forEach((data, messageId) => {
+    this.messageQueue.forEach((data) => {
       if (
+        data.serverId &&
         (data.status === "sent" || data.status === "sent_offline") &&
         now - new Date(data.timestamp).getTime() > 10000
       ) {
-        checkMessages.push(messageId);
+        checkMessages.push(data.serverId);
       }
     });
 
@@ -1958,7 +1990,8 @@ class HabitHeroChat {
 
   requestMessageStatusUpdate(messageIds) {
     if (this.socket && this.socket.connected) {
-      this.socket.emit("request_message_status", {
+      // Answered with a single message_status_batch
+      this.socket.emit("request_delivery_status", {
         message_ids: messageIds,
         receiver_id: this.config.chatUserId,
       });
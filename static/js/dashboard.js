@@ -35,9 +35,6 @@ document.addEventListener("DOMContentLoaded", function () {
       }
     }
   });
-
-  // Load notification badge on page load
-  updateNotificationBadge();
 });
 
 // Global socket variable
@@ -103,9 +100,9 @@ function initializeSocketIO() {
   // Add new notification event listeners
   appSocket.on("new_notification", function (data) {
     showNotification(data.notification.text, "info");
-    updateNotificationBadge();
   });
 
+  // The server pushes the unread count whenever it changes
   appSocket.on("notification_count_update", function (data) {
     updateNotificationBadge(data.count);
   });
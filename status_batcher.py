@@ -0,0 +1,79 @@
+# status_batcher.py - Coalesce message status changes into one Socket.IO event per room
+import threading
+from datetime import datetime
+
+# When one message changes more than once in a window, the furthest state wins
+STATUS_RANK = {'sent': 0, 'sent_offline': 0, 'delivered': 1, 'read': 2}
+
+_pending = {}   # room -> {message_id: status}
+_lock = threading.Lock()
+_flush_scheduled = False
+
+# Filled in by init_status_batcher()
+_socketio = None
+_window = 0.05
+
+
+def init_status_batcher(app, socketio):
+    """Wire the batcher to Socket.IO; STATUS_BATCH_WINDOW_MS=0 emits immediately"""
+    global _socketio, _window
+    app.config.setdefault('STATUS_BATCH_WINDOW_MS', 50)
+    _socketio = socketio
+    _window = app.config['STATUS_BATCH_WINDOW_MS'] / 1000
+
+
+def queue_status(room, message_ids, status):
+    """Queue status changes for ``room``; they go out as one ``message_status_batch``.
+
+    Marking a conversation read used to emit one ``message_status_update``
+    per message. Everything queued for a room within the window is sent as
+    ``{'updates': [{'message_id', 'status'}, ...], 'timestamp'}`` instead.
+    """
+    global _flush_scheduled
+
+    rank = STATUS_RANK.get(status, 0)
+    with _lock:
+        updates = _pending.setdefault(room, {})
+        for message_id in message_ids:
+            current = updates.get(message_id)
+            if current is None or STATUS_RANK.get(current, 0) <= rank:
+                updates[message_id] = status
+
+        if _window <= 0:
+            schedule = False
+        else:
+            schedule = not _flush_scheduled
+            _flush_scheduled = True
+
+    if _window <= 0:
+        flush()
+    elif schedule:
+        _socketio.start_background_task(_flush_later)
+
+
+def _flush_later():
+    global _flush_scheduled
+    _socketio.sleep(_window)
+    with _lock:
+        _flush_scheduled = False
+    flush()
+
+
+def flush():
+    """Emit everything queued so far, one event per room"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    for room, updates in pending.items():
+        if updates:
+            _socketio.emit('message_status_batch', status_batch(updates, timestamp), room=room)
+
+
+def status_batch(updates, timestamp=None):
+    """Payload of a ``message_status_batch`` event from {message_id: status}"""
+    return {
+        'updates': [{'message_id': message_id, 'status': status} for message_id, status in updates.items()],
+        'timestamp': timestamp or datetime.utcnow().isoformat() + 'Z',
+    }
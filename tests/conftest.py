@@ -0,0 +1,35 @@
+# conftest.py - Shared fixtures: an app on a throwaway SQLite database
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from factory import create_app  # noqa: E402
+from models import db, Friend, User  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Web app with the schema migrated and two friends, alice and bob"""
+    app = create_app(type('TestConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'SCHEDULER_ENABLED': False,
+        'METRICS_ENABLED': False,
+        'LOG_LEVEL': 'WARNING',
+    }))
+    with app.app_context():
+        alice = User(username='alice', email='alice@test.local', password_hash='x', is_verified=True)
+        bob = User(username='bob', email='bob@test.local', password_hash='x', is_verified=True)
+        db.session.add_all([alice, bob])
+        db.session.commit()
+        db.session.add(Friend(user_id=alice.id, friend_id=bob.id, status='accepted'))
+        db.session.commit()
+        app.config['TEST_USERS'] = (alice.id, bob.id)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,46 @@
+# test_chat_validation.py - Malformed ids in chat requests are client errors, not 500s
+import pytest
+
+import sockets
+from extensions import socketio
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.mark.parametrize('receiver_id', ['abc', [1], {'id': 1}])
+def test_http_send_rejects_bad_receiver_id(app, receiver_id):
+    client = _client(app, app.config['TEST_USERS'][0])
+    response = client.post('/api/chat/send', json={'receiver_id': receiver_id, 'content': 'hi'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid receiver_id'
+
+
+@pytest.mark.parametrize('receiver_id', ['abc', [1]])
+def test_socket_send_rejects_bad_receiver_id(app, receiver_id, monkeypatch):
+    emitted = []
+    monkeypatch.setattr(sockets, 'emit', lambda event, data, **kwargs: emitted.append((event, data)))
+    client = _client(app, app.config['TEST_USERS'][0])
+    socket = socketio.test_client(app, flask_test_client=client)
+
+    socket.emit('send_message', {'receiver_id': receiver_id, 'content': 'hi', 'temp_id': 't1'})
+    assert emitted == [('send_message_error', {'error': 'Invalid receiver_id', 'temp_id': 't1'})]
+    socket.disconnect()
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'message_id': 'abc', 'to_friend_id': 2}, 'Invalid message ID'),
+    ({'message_id': [1], 'to_friend_id': 2}, 'Invalid message ID'),
+    ({'message_id': 1, 'to_friend_id': 'bob'}, 'Invalid friend ID'),
+    ({'message_id': 1, 'to_friend_ids': '12'}, 'Invalid friend ID'),
+])
+def test_forward_names_the_bad_id(app, body, error):
+    client = _client(app, app.config['TEST_USERS'][0])
+    response = client.post('/api/chat/message/forward', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == error
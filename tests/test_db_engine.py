@@ -0,0 +1,54 @@
+# test_db_engine.py - prepared_statement() against the Core statements it replaces
+import re
+
+import pytest
+from sqlalchemy import bindparam, select
+
+import db_engine
+from chat_service import forward_message
+from db_engine import prepared_statement
+from models import db, ChatMessage, Friend, Notification, User
+from notifications import KIND_CHAT_FORWARD
+
+
+def _build_users_in(dialect):
+    return select(User.id).where(User.id.in_(bindparam('ids', expanding=True))).order_by(User.id)
+
+
+@pytest.mark.parametrize('ids', [[], [1], [1, 2], [2, 1, 999]])
+def test_expanding_in_list_matches_core(app, ids):
+    with app.app_context():
+        expected = db.session.execute(_build_users_in(db.engine.dialect), {'ids': ids}).scalars().all()
+        prepared = prepared_statement('test_users_in', _build_users_in)
+        assert db.session.execute(prepared, {'ids': ids}).scalars().all() == expected
+
+
+def test_forward_to_several_friends(app):
+    alice_id, bob_id = app.config['TEST_USERS']
+    with app.app_context():
+        carol = User(username='carol', email='carol@test.local', password_hash='x', is_verified=True)
+        dave = User(username='dave', email='dave@test.local', password_hash='x', is_verified=True)
+        db.session.add_all([carol, dave])
+        db.session.commit()
+        db.session.add(Friend(user_id=carol.id, friend_id=alice_id, status='accepted'))
+        message = ChatMessage(sender_id=alice_id, receiver_id=bob_id, content='hello')
+        db.session.add(message)
+        db.session.commit()
+        alice = db.session.get(User, alice_id)
+
+        # dave isn't a friend, so the IN list matches only bob and carol
+        for _ in range(2):
+            forwarded = forward_message(alice, message.id, [bob_id, carol.id, dave.id])
+            assert sorted(row['receiver_id'] for row in forwarded) == sorted([bob_id, carol.id])
+
+        copies = ChatMessage.query.filter_by(original_message_id=message.id).all()
+        assert sorted(copy.receiver_id for copy in copies) == sorted([bob_id, carol.id] * 2)
+        counts = {n.user_id: n.count for n in Notification.query.filter_by(kind=KIND_CHAT_FORWARD)}
+        assert counts == {bob_id: 2, carol.id: 2}
+
+
+def test_unrecognised_placeholder_raises(app, monkeypatch):
+    monkeypatch.setattr(db_engine, '_prepared', {})
+    monkeypatch.setattr(db_engine, '_EXPANDING', re.compile(r'(__NO_MATCH__)'))
+    with app.app_context(), pytest.raises(RuntimeError, match='ids'):
+        prepared_statement('test_users_in', _build_users_in)
@@ -0,0 +1,153 @@
+# test_message_ingest.py - Crash recovery of the chat ingest log
+import json
+import queue
+import shutil
+import threading
+from datetime import datetime
+
+import pytest
+
+import message_ingest
+from models import ChatMessage
+
+
+@pytest.fixture
+def log_dir(app, tmp_path, monkeypatch):
+    """An ingest log directory that recover() reads, as init_message_ingest() would set it up"""
+    log_dir = tmp_path / 'ingest'
+    log_dir.mkdir()
+    monkeypatch.setattr(message_ingest, '_app', app)
+    monkeypatch.setattr(message_ingest, '_config', {
+        'CHAT_INGEST_LOG_DIR': str(log_dir),
+        'CHAT_GROUP_COMMIT_MAX_BATCH': 2,
+    })
+    monkeypatch.setattr(message_ingest, 'stats', dict(message_ingest.stats, replayed=0))
+    return log_dir
+
+
+def _entries(app, count):
+    sender_id, receiver_id = app.config['TEST_USERS']
+    return [{
+        'sender_id': sender_id, 'username': 'alice', 'receiver_id': receiver_id,
+        'content': f'message {seq}', 'client_id': f'client-{seq}',
+        'timestamp': datetime.utcnow().isoformat(), 'seq': seq,
+    } for seq in range(1, count + 1)]
+
+
+def _write_segment(log_dir, entries, tail=''):
+    path = log_dir / f"segment-{entries[0]['seq']}.log"
+    path.write_text(''.join(json.dumps(entry) + '\n' for entry in entries) + tail, encoding='utf-8')
+    return path
+
+
+def _stored_client_ids(app):
+    with app.app_context():
+        return sorted(row.client_id for row in ChatMessage.query.with_entities(ChatMessage.client_id))
+
+
+def test_replays_unstored_segment(app, log_dir):
+    entries = _entries(app, 5)
+    _write_segment(log_dir, entries)
+
+    message_ingest.recover()
+
+    assert _stored_client_ids(app) == sorted(entry['client_id'] for entry in entries)
+    assert message_ingest.stats['replayed'] == 5
+    assert not list(log_dir.glob('segment-*.log'))
+
+
+def test_replaying_twice_stores_each_message_once(app, log_dir, tmp_path):
+    entries = _entries(app, 5)
+    _write_segment(log_dir, entries[:3])
+    _write_segment(log_dir, entries[3:])
+    saved = tmp_path / 'saved'
+    shutil.copytree(log_dir, saved)
+
+    message_ingest.recover()
+    # Crashed again before the replayed segments were deleted
+    shutil.rmtree(log_dir)
+    shutil.copytree(saved, log_dir)
+    message_ingest.recover()
+
+    assert _stored_client_ids(app) == sorted(entry['client_id'] for entry in entries)
+    assert not list(log_dir.glob('segment-*.log'))
+
+
+@pytest.mark.parametrize('tail', [
+    '{"sender_id": 1, "receiver_id": 2, "cont',
+    '\x00\x00\x00\x00',
+], ids=['truncated', 'garbage'])
+def test_skips_unreadable_last_line(app, log_dir, tail):
+    entries = _entries(app, 3)
+    _write_segment(log_dir, entries, tail=tail)
+
+    message_ingest.recover()
+
+    assert _stored_client_ids(app) == sorted(entry['client_id'] for entry in entries)
+    assert message_ingest.stats['replayed'] == 3
+    assert not list(log_dir.glob('segment-*.log'))
+
+
+def test_store_counts_only_inserted_rows(app, log_dir, monkeypatch):
+    import chat_service
+
+    entries = _entries(app, 4)
+    monkeypatch.setattr(message_ingest, 'stats', dict(message_ingest.stats, stored=0, dropped=0))
+    message_ingest._store(entries[:2])
+    # A retried client_id is skipped, not stored again
+    message_ingest._store(entries[1:3])
+    assert message_ingest.stats['stored'] == 3
+
+    real_store = chat_service.store_queued_messages
+
+    def failing_store(batch, replay=False):
+        if any(entry['seq'] == 4 for entry in batch):
+            raise RuntimeError('disk full')
+        return real_store(batch, replay)
+
+    monkeypatch.setattr(chat_service, 'store_queued_messages', failing_store)
+    monkeypatch.setattr(message_ingest.time, 'sleep', lambda seconds: None)
+    message_ingest._store([dict(entries[0], seq=5, client_id='client-5'), entries[3]])
+
+    assert message_ingest.stats['stored'] == 4
+    assert message_ingest.stats['dropped'] == 1
+    assert len(_stored_client_ids(app)) == 4
+
+
+def test_writer_survives_a_failing_batch(app, log_dir, monkeypatch):
+    import chat_service
+
+    entries = _entries(app, 3)
+    checkpoints = []
+
+    def failing_checkpoint(committed_seq):
+        checkpoints.append(committed_seq)
+        if len(checkpoints) == 1:
+            raise OSError('disk full')
+
+    def failing_report(entries, error=None):
+        raise RuntimeError('socket server gone')
+
+    real_store = chat_service.store_queued_messages
+
+    def failing_store(batch, replay=False):
+        if any(entry['seq'] == 2 for entry in batch):
+            raise RuntimeError('bad row')
+        return real_store(batch, replay)
+
+    monkeypatch.setattr(message_ingest, '_queue', queue.Queue())
+    monkeypatch.setattr(message_ingest, '_config', dict(message_ingest._config, CHAT_GROUP_COMMIT_INTERVAL_MS=0,
+                                                        CHAT_GROUP_COMMIT_MAX_BATCH=1))
+    monkeypatch.setattr(message_ingest, '_checkpoint', failing_checkpoint)
+    monkeypatch.setattr(message_ingest.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(chat_service, 'store_queued_messages', failing_store)
+    monkeypatch.setattr(chat_service, 'report_failed_sends', failing_report)
+    threading.Thread(target=message_ingest._writer_loop, daemon=True).start()
+
+    # The first batch fails to checkpoint, the second to report its dropped entry
+    for entry in entries:
+        message_ingest._queue.put(entry)
+    assert message_ingest.drain(timeout=5)
+
+    assert checkpoints == [1, 3]
+    assert _stored_client_ids(app) == ['client-1', 'client-3']
@@ -0,0 +1,47 @@
+# test_notifications.py - Cursor pagination of notifications
+from datetime import datetime
+
+import pytest
+
+from models import db, Notification
+from notifications import decode_cursor, encode_cursor
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def test_cursor_round_trip():
+    notification = Notification(id=42, timestamp=datetime(2024, 5, 6, 7, 8, 9, 123456))
+    assert decode_cursor(encode_cursor(notification)) == (notification.timestamp, 42)
+
+
+@pytest.mark.parametrize('cursor', [
+    'abc', '123', '-1', '123-x', '1.5-2',
+    '99999999999999999999-1',       # past timedelta's range
+    '253402300800000000-1',         # past datetime.max
+    '1000-99999999999999999999',    # past a 64-bit id
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('cursor', ['abc', '99999999999999999999-1', '1000-99999999999999999999'])
+def test_bad_cursor_is_a_client_error(app, cursor):
+    alice_id, _ = app.config['TEST_USERS']
+    with app.app_context():
+        db.session.add(Notification(user_id=alice_id, text='hello'))
+        db.session.commit()
+    client = _client(app, alice_id)
+
+    response = client.get('/api/notifications', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
+
+    response = client.get('/notifications', query_string={'cursor': cursor})
+    assert response.status_code == 302
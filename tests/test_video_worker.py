@@ -0,0 +1,70 @@
+# test_video_worker.py - Recovering and discarding background transcodes
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import video_worker
+from models import db, Snap
+
+
+@pytest.fixture
+def add_video(app):
+    """Insert a video snap with a file on disk; returns its id"""
+    sender_id, receiver_id = app.config['TEST_USERS']
+    app.config['FFMPEG_BINARY'] = None  # placeholder poster, no transcode
+
+    def add_video(name, status, expires_in=timedelta(hours=1)):
+        path = os.path.join(app.config['UPLOAD_FOLDER'], 'videos', name)
+        with open(path, 'wb') as f:
+            f.write(b'video')
+        with app.app_context():
+            snap = Snap(sender_id=sender_id, receiver_id=receiver_id, content_type='video',
+                        content=f'videos/{name}', transcode_status=status,
+                        expires_at=datetime.utcnow() + expires_in)
+            db.session.add(snap)
+            db.session.commit()
+            return snap.id
+    return add_video
+
+
+def _status(app, snap_id):
+    with app.app_context():
+        return db.session.get(Snap, snap_id).transcode_status
+
+
+def test_requeue_includes_snaps_left_processing(app, add_video, monkeypatch):
+    queued = []
+    monkeypatch.setattr(video_worker, 'enqueue_video', lambda snap_id: queued.append(snap_id) or True)
+    pending = add_video('a.mp4', video_worker.STATUS_PENDING)
+    stuck = add_video('b.mp4', video_worker.STATUS_PROCESSING)
+    expired = add_video('c.mp4', video_worker.STATUS_PROCESSING, expires_in=-timedelta(hours=1))
+    done = add_video('d.mp4', video_worker.STATUS_READY)
+
+    assert video_worker.requeue_pending_videos() == 2
+    assert queued == [pending, stuck]
+    assert _status(app, stuck) == video_worker.STATUS_PENDING
+    assert _status(app, expired) == video_worker.STATUS_PROCESSING
+    assert _status(app, done) == video_worker.STATUS_READY
+
+    video_worker.process_video(stuck)
+    assert _status(app, stuck) == video_worker.STATUS_ORIGINAL
+
+
+def test_snap_reaped_mid_transcode_leaves_no_files(app, add_video, monkeypatch):
+    snap_id = add_video('e.mp4', video_worker.STATUS_PENDING)
+    poster = os.path.join(app.config['UPLOAD_FOLDER'], 'posters', 'e.jpg')
+    render = video_worker.render_placeholder_poster
+
+    def render_then_reap(target):
+        render(target)
+        with app.app_context():
+            db.session.delete(db.session.get(Snap, snap_id))
+            db.session.commit()
+
+    monkeypatch.setattr(video_worker, 'render_placeholder_poster', render_then_reap)
+    video_worker.process_video(snap_id)
+
+    assert not os.path.exists(poster)
+    with app.app_context():
+        assert db.session.get(Snap, snap_id) is None
@@ -0,0 +1,107 @@
+# typing_state.py - Per-(user, room) typing state; only start/stop transitions reach the room
+import threading
+import time
+
+_typing = {}        # (user_id, room) -> (sid, username, expires_at)
+_last_event = {}    # sid -> monotonic time of the last typing event taken
+_lock = threading.Lock()
+_sweep_scheduled = False
+
+# Filled in by init_typing_state()
+_socketio = None
+_timeout = 6.0
+_min_interval = 0.25
+
+# Counters for the benchmark: typing events received vs. user_typing emits
+stats = {'received': 0, 'throttled': 0, 'forwarded': 0, 'expired': 0}
+
+
+def init_typing_state(app, socketio):
+    """Wire typing state to Socket.IO.
+
+    TYPING_TIMEOUT_SECONDS ends a "typing" state the client never stopped;
+    TYPING_MIN_INTERVAL_MS is the least time between typing events taken
+    from one socket.
+    """
+    global _socketio, _timeout, _min_interval
+    app.config.setdefault('TYPING_TIMEOUT_SECONDS', 6)
+    app.config.setdefault('TYPING_MIN_INTERVAL_MS', 250)
+    _socketio = socketio
+    _timeout = app.config['TYPING_TIMEOUT_SECONDS']
+    _min_interval = app.config['TYPING_MIN_INTERVAL_MS'] / 1000
+
+
+def update_typing(sid, user_id, username, room, is_typing):
+    """Record a typing event; emit ``user_typing`` to ``room`` only when the state flips.
+
+    Clients may send a start on every keystroke. Repeats only push the
+    expiry out, and starts arriving faster than TYPING_MIN_INTERVAL_MS from
+    one socket are dropped. A stop is always taken so the indicator
+    never sticks. Returns True when an event was emitted.
+    """
+    global _sweep_scheduled
+
+    now = time.monotonic()
+    key = (user_id, room)
+    with _lock:
+        stats['received'] += 1
+        if is_typing and now - _last_event.get(sid, float('-inf')) < _min_interval:
+            stats['throttled'] += 1
+            return False
+        _last_event[sid] = now
+
+        was_typing = key in _typing
+        if is_typing:
+            _typing[key] = (sid, username, now + _timeout)
+        else:
+            _typing.pop(key, None)
+
+        schedule = is_typing and not _sweep_scheduled
+        if schedule:
+            _sweep_scheduled = True
+
+    if schedule:
+        _socketio.start_background_task(_sweep)
+    if is_typing == was_typing:
+        return False
+    _emit(user_id, username, room, is_typing, skip_sid=sid)
+    return True
+
+
+def clear_socket(sid):
+    """Forget a disconnected socket; anyone it left "typing" is stopped"""
+    with _lock:
+        _last_event.pop(sid, None)
+        stopped = [(key, state) for key, state in _typing.items() if state[0] == sid]
+        for key, _ in stopped:
+            del _typing[key]
+    for (user_id, room), (_, username, _) in stopped:
+        _emit(user_id, username, room, False)
+
+
+def _sweep():
+    """Stop typing states that outlived the timeout; runs while any are active"""
+    global _sweep_scheduled
+    while True:
+        _socketio.sleep(_timeout / 2)
+        now = time.monotonic()
+        with _lock:
+            expired = [(key, state) for key, state in _typing.items() if state[2] <= now]
+            for key, _ in expired:
+                del _typing[key]
+            if not _typing:
+                _sweep_scheduled = False
+        stats['expired'] += len(expired)
+        for (user_id, room), (_, username, _) in expired:
+            _emit(user_id, username, room, False)
+        if not _sweep_scheduled:
+            return
+
+
+def _emit(user_id, username, room, is_typing, skip_sid=None):
+    stats['forwarded'] += 1
+    _socketio.emit('user_typing', {
+        'user_id': user_id,
+        'username': username,
+        'is_typing': is_typing
+    }, room=room, skip_sid=skip_sid)
@@ -0,0 +1,167 @@
+# user_search.py - Typeahead user search for adding friends, ranked by text match and mutual friends
+from sqlalchemy import and_, func, or_, select, text, union_all
+
+from extensions import db
+from models import Friend, User
+from username_index import usernames_with_prefix
+
+# Matches ranked per query; pages are cut from these
+MAX_CANDIDATES = 200
+
+# Trigram search needs three characters; shorter queries match username prefixes
+MIN_SUBSTRING_LENGTH = 3
+
+# No ORDER BY: the index lookup stops after :limit hits instead of scoring
+# every match (a common trigram can hit a large share of 1M users)
+_FTS_CANDIDATES = text("""
+    SELECT u.id, u.username, u.avatar, u.bio
+    FROM user_search JOIN "user" u ON u.id = user_search.rowid
+    WHERE user_search MATCH :match AND u.id != :user_id AND u.is_verified = 1
+    LIMIT :limit
+""")
+
+_fts_ready = {}     # engine url -> whether the user_search table exists
+
+
+def search_users(user_id, query, page=1, per_page=20):
+    """Users matching ``query`` for ``user_id`` to add, best first.
+
+    Usernames and bios are matched anywhere (FTS5 trigram index on SQLite,
+    pg_trgm on PostgreSQL, see migration 0008); an email address matches
+    exactly. Up to MAX_CANDIDATES matches (username prefixes from
+    username_index, then username hits, then bio hits) are ranked: exact
+    and prefix username matches first, then by mutual friends, username
+    over bio. Blocked users in either direction are left out.
+
+    Returns ``(results, has_more)``; each result carries ``mutual_friends``
+    and ``relationship`` ('friend', 'requested', 'incoming' or None).
+    """
+    query = query.strip()
+    if not query:
+        return [], False
+
+    candidates = _candidates(user_id, query)
+    if not candidates:
+        return [], False
+
+    ids = [row.id for row in candidates]
+    relationships = _relationships(user_id, ids)
+    mutual = _mutual_friend_counts(user_id, ids)
+
+    lowered = query.lower()
+    ranked = []
+    for row in candidates:
+        relationship = relationships.get(row.id)
+        if relationship == 'blocked':
+            continue
+        name = row.username.lower()
+        score = (
+            (100 if name == lowered else 50 if name.startswith(lowered) else 10 if lowered in name else 0)
+            + 5 * mutual.get(row.id, 0)
+        )
+        ranked.append((score, row, relationship))
+    ranked.sort(key=lambda item: (-item[0], item[1].username))
+
+    start = (page - 1) * per_page
+    results = [{
+        'id': row.id,
+        'username': row.username,
+        'avatar': row.avatar,
+        'bio': (row.bio or '')[:120],
+        'mutual_friends': mutual.get(row.id, 0),
+        'relationship': relationship,
+    } for _, row, relationship in ranked[start:start + per_page]]
+    return results, len(ranked) > start + per_page
+
+
+def _candidates(user_id, query):
+    """Up to MAX_CANDIDATES matching users as rows of (id, username, avatar, bio)"""
+    columns = (User.id, User.username, User.avatar, User.bio)
+    visible = and_(User.id != user_id, User.is_verified == True)  # noqa: E712
+
+    if '@' in query:
+        return db.session.execute(select(*columns).where(visible, User.email == query).limit(MAX_CANDIDATES)).all()
+
+    # Prefix matches come from memory and would otherwise be lost behind the limit
+    names = list(dict.fromkeys(usernames_with_prefix(query) + usernames_with_prefix(query.lower())))
+    rows = db.session.execute(select(*columns).where(visible, User.username.in_(names))).all() if names else []
+    if len(query) < MIN_SUBSTRING_LENGTH:
+        return rows
+
+    seen = {row.id for row in rows}
+    matches = []
+    # Username hits first, bio hits fill up what's left
+    for column in ('username', 'bio'):
+        if len(matches) >= MAX_CANDIDATES:
+            break
+        matches += _substring_matches(user_id, visible, columns, column, query, MAX_CANDIDATES)
+
+    for row in matches:
+        if row.id not in seen and len(rows) < MAX_CANDIDATES:
+            seen.add(row.id)
+            rows.append(row)
+    return rows
+
+
+def _substring_matches(user_id, visible, columns, column, query, limit):
+    if db.engine.dialect.name == 'sqlite' and _has_fts_table():
+        # A quoted FTS5 string is a substring match with the trigram tokenizer
+        quoted = '"' + query.replace('"', '""') + '"'
+        return db.session.execute(_FTS_CANDIDATES, {
+            'match': f'{column} : {quoted}', 'user_id': user_id, 'limit': limit,
+        }).all()
+
+    # ILIKE uses the pg_trgm indexes; on a SQLite schema older than
+    # migration 0008 this is the same search without an index
+    pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    target = getattr(User, column)
+    condition = target.ilike(pattern, escape='\\') if db.engine.dialect.name == 'postgresql' \
+        else target.like(pattern, escape='\\')
+    return db.session.execute(select(*columns).where(visible, condition).limit(limit)).all()
+
+
+def _has_fts_table():
+    url = str(db.engine.url)
+    if url not in _fts_ready:
+        _fts_ready[url] = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+        )).first() is not None
+    return _fts_ready[url]
+
+
+def _relationships(user_id, ids):
+    """{other user id: 'friend' | 'requested' | 'incoming' | 'blocked'} for ``ids``"""
+    rows = db.session.execute(select(Friend.user_id, Friend.friend_id, Friend.status).where(or_(
+        and_(Friend.user_id == user_id, Friend.friend_id.in_(ids)),
+        and_(Friend.friend_id == user_id, Friend.user_id.in_(ids)),
+    ))).all()
+
+    relationships = {}
+    for row in rows:
+        other = row.friend_id if row.user_id == user_id else row.user_id
+        if row.status == 'blocked':
+            relationships[other] = 'blocked'
+        elif relationships.get(other) != 'blocked':
+            if row.status == 'accepted':
+                relationships[other] = 'friend'
+            elif row.status == 'pending':
+                relationships[other] = 'requested' if row.user_id == user_id else 'incoming'
+    return relationships
+
+
+def _mutual_friend_counts(user_id, ids):
+    """{candidate id: number of accepted friends shared with ``user_id``}"""
+    accepted = Friend.status == 'accepted'
+    mine = union_all(
+        select(Friend.friend_id).where(accepted, Friend.user_id == user_id),
+        select(Friend.user_id).where(accepted, Friend.friend_id == user_id),
+    )
+
+    edges = union_all(
+        select(Friend.user_id.label('candidate')).where(accepted, Friend.user_id.in_(ids), Friend.friend_id.in_(mine)),
+        select(Friend.friend_id.label('candidate')).where(accepted, Friend.friend_id.in_(ids), Friend.user_id.in_(mine)),
+    ).subquery()
+    rows = db.session.execute(
+        select(edges.c.candidate, func.count()).group_by(edges.c.candidate)
+    ).all()
+    return dict(rows)
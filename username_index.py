@@ -0,0 +1,176 @@
+# username_index.py - In-memory sorted index of taken usernames for availability checks
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, inspect, select
+
+from models import User
+
+USERNAME_MAX_LENGTH = 20
+
+_names = []             # sorted usernames
+_max_id = 0             # highest user id loaded, for catching up on other workers' sign-ups
+_loaded_at = None       # monotonic time of the last full load
+_synced_at = 0.0
+_lock = threading.Lock()
+
+# Filled in by init_username_index()
+_db = None
+_sync_interval = 5.0
+_reload_interval = 3600.0
+
+
+def init_username_index(app, db):
+    """Answer "is this username taken?" from memory.
+
+    The index is one ``SELECT id, username`` on first use, then kept
+    current by this process's commits (ORM inserts, renames, deletes).
+    Sign-ups on other workers are picked up with an ``id > max`` query at
+    most every USERNAME_INDEX_SYNC_SECONDS; their renames and deletes
+    with a full reload every USERNAME_INDEX_RELOAD_SECONDS. The unique
+    constraint on user.username stays the final word on writes.
+    """
+    global _db, _sync_interval, _reload_interval
+    app.config.setdefault('USERNAME_INDEX_SYNC_SECONDS', 5)
+    app.config.setdefault('USERNAME_INDEX_RELOAD_SECONDS', 3600)
+    _db = db
+    _sync_interval = app.config['USERNAME_INDEX_SYNC_SECONDS']
+    _reload_interval = app.config['USERNAME_INDEX_RELOAD_SECONDS']
+
+    if not event.contains(db.session, 'after_flush', _record_changes):
+        event.listen(db.session, 'after_flush', _record_changes)
+        event.listen(db.session, 'after_commit', _apply_changes)
+        event.listen(db.session, 'after_rollback', _discard_changes)
+
+
+def username_taken(username, exclude_user_id=None):
+    """True if ``username`` belongs to a user (other than ``exclude_user_id``)"""
+    _refresh()
+    with _lock:
+        taken = _contains(username)
+    if taken and exclude_user_id is not None:
+        # Renaming to your own name (or its case) is fine; rare enough to ask the table
+        owner = _db.session.execute(select(User.id).where(User.username == username)).scalar()
+        return owner is not None and owner != exclude_user_id
+    return taken
+
+
+def suggest_usernames(username, limit=5):
+    """Free usernames close to ``username``: the first unused numeric suffixes of its prefix"""
+    base = username[:USERNAME_MAX_LENGTH - 3]
+    _refresh()
+    with _lock:
+        # Everything starting with the base, bounded so "a" can't scan the whole index
+        start = bisect.bisect_left(_names, base)
+        taken = set()
+        for name in _names[start:start + 1000]:
+            if not name.startswith(base):
+                break
+            taken.add(name)
+
+    suggestions = []
+    for separator in ('', '_'):
+        n = 1
+        while len(suggestions) < limit and n < 1000:
+            candidate = f'{base}{separator}{n}'[:USERNAME_MAX_LENGTH]
+            if candidate not in taken and candidate not in suggestions:
+                suggestions.append(candidate)
+            n += 1
+        if len(suggestions) >= limit:
+            break
+    return suggestions
+
+
+def usernames_with_prefix(prefix, limit=50):
+    """Up to ``limit`` taken usernames starting with ``prefix`` (case-sensitive), in order"""
+    _refresh()
+    with _lock:
+        start = bisect.bisect_left(_names, prefix)
+        names = []
+        for name in _names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+    return names
+
+
+def _contains(username):
+    i = bisect.bisect_left(_names, username)
+    return i < len(_names) and _names[i] == username
+
+
+def _add(username):
+    i = bisect.bisect_left(_names, username)
+    if i == len(_names) or _names[i] != username:
+        _names.insert(i, username)
+
+
+def _remove(username):
+    i = bisect.bisect_left(_names, username)
+    if i < len(_names) and _names[i] == username:
+        del _names[i]
+
+
+def _refresh():
+    """Load the index on first use, then catch up with other processes now and then"""
+    global _names, _max_id, _loaded_at, _synced_at
+    now = time.monotonic()
+    if _loaded_at is not None and now - _synced_at < _sync_interval:
+        return
+
+    with _lock:
+        if _loaded_at is not None and now - _synced_at < _sync_interval:
+            return
+        # The check above lets one thread through; the others keep using the current index
+        _synced_at = now
+        full = _loaded_at is None or now - _loaded_at >= _reload_interval
+
+    # Queries run outside the lock (a reload of many users shouldn't stall checks)
+    if full:
+        rows = _db.session.execute(select(User.id, User.username)).all()
+        names = sorted(row.username for row in rows)
+        with _lock:
+            _names = names
+            _max_id = max((row.id for row in rows), default=0)
+            _loaded_at = now
+    else:
+        rows = _db.session.execute(select(User.id, User.username).where(User.id > _max_id)).all()
+        with _lock:
+            for row in rows:
+                _add(row.username)
+                _max_id = max(_max_id, row.id)
+
+
+def _record_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, User):
+            changes.append((obj.username, None))
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            history = inspect(obj).attrs.username.history
+            if history.has_changes():
+                changes.extend((added, None) for added in history.added)
+                changes.extend((None, removed) for removed in history.deleted)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changes.append((None, obj.username))
+    if changes:
+        session.info.setdefault('username_changes', []).extend(changes)
+
+
+def _apply_changes(session):
+    changes = session.info.pop('username_changes', None)
+    if not changes or _loaded_at is None:
+        return
+    with _lock:
+        for added, removed in changes:
+            if removed is not None:
+                _remove(removed)
+            if added is not None:
+                _add(added)
+
+
+def _discard_changes(session):
+    session.info.pop('username_changes', None)
@@ -0,0 +1,233 @@
+# video_worker.py - Background transcoding and poster extraction for video snaps
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+log = logging.getLogger(__name__)
+
+# Snap.transcode_status values
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'          # normalized to web-friendly mp4
+STATUS_ORIGINAL = 'original'    # ffmpeg unavailable, kept as uploaded
+STATUS_FAILED = 'failed'
+
+_jobs = queue.Queue(maxsize=1000)
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+# Filled in by init_video_worker()
+_app = None
+_db = None
+_Snap = None
+
+
+def init_video_worker(app, db, models):
+    """Wire the worker to the app, database and Snap model"""
+    global _app, _db, _Snap
+    _app = app
+    _db = db
+    _Snap = models.get('Snap')
+
+    app.config.setdefault('FFMPEG_BINARY', shutil.which('ffmpeg'))
+    app.config.setdefault('VIDEO_MAX_HEIGHT', 720)
+    app.config.setdefault('VIDEO_MAX_BITRATE', '1500k')
+    app.config.setdefault('VIDEO_TRANSCODE_TIMEOUT', 300)
+
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'posters'), exist_ok=True)
+
+
+def enqueue_video(snap_id):
+    """Queue a video snap for transcoding; never blocks the caller"""
+    _ensure_worker()
+    try:
+        _jobs.put_nowait(snap_id)
+        return True
+    except queue.Full:
+        # The snap stays 'pending' with its original file, which is still playable
+        log.warning('video queue full, snap %s kept as uploaded', snap_id)
+        return False
+
+
+def requeue_pending_videos():
+    """Queue the unexpired video snaps a restart left unfinished; call once the schema is current.
+
+    That is every 'pending' snap, plus those still 'processing': the
+    process that claimed them is gone, so they go back to 'pending'.
+    """
+    with _app.app_context():
+        _db.session.execute(
+            update(_Snap)
+            .where(_Snap.content_type == 'video', _Snap.transcode_status == STATUS_PROCESSING,
+                   _Snap.expires_at > datetime.utcnow())
+            .values(transcode_status=STATUS_PENDING)
+        )
+        _db.session.commit()
+        snap_ids = _db.session.scalars(
+            select(_Snap.id)
+            .where(_Snap.content_type == 'video', _Snap.transcode_status == STATUS_PENDING,
+                   _Snap.expires_at > datetime.utcnow())
+            .order_by(_Snap.id)
+        ).all()
+        _db.session.remove()
+
+    queued = 0
+    for snap_id in snap_ids:
+        if not enqueue_video(snap_id):
+            break
+        queued += 1
+    if snap_ids:
+        log.info('re-queued %d of %d pending video snaps', queued, len(snap_ids))
+    return queued
+
+
+def _ensure_worker():
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(target=_worker_loop, name='video-worker', daemon=True)
+            _worker_thread.start()
+
+
+def _worker_loop():
+    while True:
+        snap_id = _jobs.get()
+        try:
+            process_video(snap_id)
+        except Exception:
+            log.exception('video processing failed for snap %s', snap_id)
+        finally:
+            _jobs.task_done()
+
+
+def process_video(snap_id):
+    """Transcode one video snap and extract its poster frame"""
+    with _app.app_context():
+        snap = _db.session.get(_Snap, snap_id)
+        if not snap or snap.content_type != 'video' or not snap.content:
+            return
+
+        upload_folder = _app.config['UPLOAD_FOLDER']
+        source_rel = snap.content
+        source = os.path.join(upload_folder, source_rel)
+        if not os.path.exists(source):
+            return
+
+        # Claim it, so a snap queued by more than one process is transcoded once
+        claimed = _db.session.execute(
+            update(_Snap)
+            .where(_Snap.id == snap_id, _Snap.transcode_status == STATUS_PENDING)
+            .values(transcode_status=STATUS_PROCESSING)
+        ).rowcount
+        _db.session.commit()
+        if not claimed:
+            return
+
+        base = os.path.splitext(os.path.basename(source_rel))[0]
+        poster_rel = f'posters/{base}.jpg'
+        target_rel = source_rel
+        ffmpeg = _app.config.get('FFMPEG_BINARY')
+        # Only the claimed row, unchanged: not if the reaper deleted it meanwhile
+        claimed_row = update(_Snap).where(_Snap.id == snap_id, _Snap.content == source_rel,
+                                          _Snap.transcode_status == STATUS_PROCESSING)
+
+        try:
+            if ffmpeg:
+                target_rel = f'videos/{base}.web.mp4'
+                transcode_video(ffmpeg, source, os.path.join(upload_folder, target_rel))
+                extract_poster(ffmpeg, source, os.path.join(upload_folder, poster_rel))
+                status = STATUS_READY
+            else:
+                render_placeholder_poster(os.path.join(upload_folder, poster_rel))
+                status = STATUS_ORIGINAL
+
+            stored = _db.session.execute(
+                claimed_row.values(content=target_rel, poster=poster_rel, transcode_status=status)
+            ).rowcount
+            _db.session.commit()
+        except Exception:
+            _db.session.rollback()
+            _db.session.execute(claimed_row.values(transcode_status=STATUS_FAILED))
+            _db.session.commit()
+            _discard_outputs(snap_id, {target_rel, poster_rel} - {source_rel})
+            log.exception('transcode failed for snap %s', snap_id)
+            return
+
+        if not stored:
+            _discard_outputs(snap_id, {target_rel, poster_rel} - {source_rel})
+            log.info('snap %s was deleted or changed during its transcode', snap_id)
+            return
+
+        # The normalized copy replaces the upload once the row points at it
+        if target_rel != source_rel and os.path.exists(source):
+            os.remove(source)
+
+        log.info('snap %s video %s', snap_id, status)
+
+
+def _discard_outputs(snap_id, relative_paths):
+    """Unlink files a transcode wrote, unless the snap's row points at them"""
+    row = _db.session.execute(select(_Snap.content, _Snap.poster).where(_Snap.id == snap_id)).first()
+    for relative_path in relative_paths - set(row or ()):
+        full_path = os.path.join(_app.config['UPLOAD_FOLDER'], relative_path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+
+
+def transcode_video(ffmpeg, source, target):
+    """Normalize to H.264/AAC mp4, capped in height and bitrate, with faststart"""
+    max_height = _app.config['VIDEO_MAX_HEIGHT']
+    max_bitrate = _app.config['VIDEO_MAX_BITRATE']
+    bufsize = f"{int(max_bitrate.rstrip('k')) * 2}k"
+    tmp_target = target + '.part'
+
+    try:
+        subprocess.run([
+            ffmpeg, '-y', '-loglevel', 'error', '-i', source,
+            '-vf', f"scale=-2:'min({max_height},ih)'",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+            '-maxrate', max_bitrate, '-bufsize', bufsize, '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '96k',
+            '-movflags', '+faststart', '-f', 'mp4', tmp_target,
+        ], check=True, timeout=_app.config['VIDEO_TRANSCODE_TIMEOUT'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.replace(tmp_target, target)
+    finally:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+
+
+def extract_poster(ffmpeg, source, target):
+    """Grab a frame one second in (or the first frame for very short clips)"""
+    for offset in ('1', '0'):
+        subprocess.run([
+            ffmpeg, '-y', '-loglevel', 'error', '-ss', offset, '-i', source,
+            '-frames:v', '1', '-vf', 'scale=480:-2', '-q:v', '4', target,
+        ], timeout=60, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if os.path.exists(target) and os.path.getsize(target) > 0:
+            return
+    render_placeholder_poster(target)
+
+
+def render_placeholder_poster(target, size=(480, 270)):
+    """Pure-Python poster used when no frame can be decoded"""
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    image = Image.new('RGB', size, (31, 41, 55))
+    draw = ImageDraw.Draw(image)
+    radius = height // 6
+    cx, cy = width // 2, height // 2
+    draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=(79, 70, 229))
+    draw.polygon([
+        (cx - radius // 3, cy - radius // 2),
+        (cx - radius // 3, cy + radius // 2),
+        (cx + radius // 2, cy),
+    ], fill=(255, 255, 255))
+    image.save(target, 'JPEG', quality=80)